@@ -7,11 +7,150 @@ class Settings:
     # Gemini API 配置
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "gemini-2.5-flash")
+    # 一般不需修改；壓力測試時可指向本機的模擬伺服器
+    GEMINI_API_BASE_URL: str = os.getenv(
+        "GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com/v1beta"
+    )
+    GEMINI_TIMEOUT: float = float(os.getenv("GEMINI_TIMEOUT", "15"))
+
+    # Gemini HTTP 連線池配置
+    GEMINI_HTTP_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_HTTP_MAX_CONNECTIONS", "20"))
+    GEMINI_HTTP_MAX_KEEPALIVE: int = int(os.getenv("GEMINI_HTTP_MAX_KEEPALIVE", "10"))
+    GEMINI_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("GEMINI_HTTP_KEEPALIVE_EXPIRY", "30"))
+    # 啟用 HTTP/2 需要安裝 httpx[http2]
+    GEMINI_HTTP2: bool = os.getenv("GEMINI_HTTP2", "false").lower() == "true"
+
+    # Gemini 流量控制配置：併發視窗會在 MIN 與 MAX 之間自動調整，RPS 設 0 代表不限速
+    GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+    GEMINI_MIN_CONCURRENCY: int = int(os.getenv("GEMINI_MIN_CONCURRENCY", "1"))
+    GEMINI_RATE_LIMIT_RPS: float = float(os.getenv("GEMINI_RATE_LIMIT_RPS", "5"))
+    GEMINI_RATE_LIMIT_BURST: float = float(os.getenv("GEMINI_RATE_LIMIT_BURST", "10"))
+
+    # Gemini 重試配置：指數退避加隨機抖動，DEADLINE 為含所有重試的總時限（秒）
+    GEMINI_RETRY_MAX_ATTEMPTS: int = int(os.getenv("GEMINI_RETRY_MAX_ATTEMPTS", "3"))
+    GEMINI_RETRY_BASE_DELAY: float = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5"))
+    GEMINI_RETRY_MAX_DELAY: float = float(os.getenv("GEMINI_RETRY_MAX_DELAY", "4"))
+    GEMINI_RETRY_STATUSES: str = os.getenv("GEMINI_RETRY_STATUSES", "429,500,502,503,504")
+    GEMINI_RETRY_DEADLINE: float = float(os.getenv("GEMINI_RETRY_DEADLINE", "30"))
+    # 對沖請求：超過近期 p95 延遲（至少 MIN_DELAY 秒）仍未回應時再送一次
+    GEMINI_HEDGE_ENABLED: bool = os.getenv("GEMINI_HEDGE_ENABLED", "false").lower() == "true"
+    GEMINI_HEDGE_MIN_DELAY: float = float(os.getenv("GEMINI_HEDGE_MIN_DELAY", "1.0"))
+
+    # Gemini 斷路器：最近 WINDOW 次呼叫的失敗率或慢呼叫比例超過門檻就暫停呼叫 OPEN_SECONDS 秒
+    GEMINI_CIRCUIT_ENABLED: bool = os.getenv("GEMINI_CIRCUIT_ENABLED", "true").lower() == "true"
+    GEMINI_CIRCUIT_FAILURE_RATE: float = float(os.getenv("GEMINI_CIRCUIT_FAILURE_RATE", "0.5"))
+    GEMINI_CIRCUIT_SLOW_CALL_SECONDS: float = float(os.getenv("GEMINI_CIRCUIT_SLOW_CALL_SECONDS", "10"))
+    GEMINI_CIRCUIT_SLOW_CALL_RATE: float = float(os.getenv("GEMINI_CIRCUIT_SLOW_CALL_RATE", "0.8"))
+    GEMINI_CIRCUIT_WINDOW: int = int(os.getenv("GEMINI_CIRCUIT_WINDOW", "20"))
+    # 至少累積幾次呼叫才開始判斷，避免剛啟動時一兩次失敗就打開
+    GEMINI_CIRCUIT_MIN_CALLS: int = int(os.getenv("GEMINI_CIRCUIT_MIN_CALLS", "10"))
+    GEMINI_CIRCUIT_OPEN_SECONDS: float = float(os.getenv("GEMINI_CIRCUIT_OPEN_SECONDS", "30"))
+    # half_open 時放行幾個試探請求，全部成功才恢復
+    GEMINI_CIRCUIT_HALF_OPEN_CALLS: int = int(os.getenv("GEMINI_CIRCUIT_HALF_OPEN_CALLS", "2"))
+
+    # Gemini prompt 預算（估算的 token 數，0 代表不限制）：超過時截斷使用者輸入與參考資料
+    GEMINI_MAX_INPUT_TOKENS: int = int(os.getenv("GEMINI_MAX_INPUT_TOKENS", "2000"))
+    GEMINI_MAX_CONTEXT_TOKENS: int = int(os.getenv("GEMINI_MAX_CONTEXT_TOKENS", "1500"))
+    # generationConfig.maxOutputTokens（2.5 系列的 thinking token 也算在內）
+    GEMINI_MAX_OUTPUT_TOKENS: int = int(os.getenv("GEMINI_MAX_OUTPUT_TOKENS", "0"))
+    # 依使用者累計 token 用量，最多記錄幾位使用者
+    GEMINI_USAGE_MAX_USERS: int = int(os.getenv("GEMINI_USAGE_MAX_USERS", "10000"))
+    # Gemini context caching：system instruction 建立為 cachedContent，之後的請求只引用名稱
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+    GEMINI_CONTEXT_CACHE_TTL: int = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    # Gemini 只接受超過最低 token 數的 cachedContent，較短的 system instruction 不建立快取
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+
+    # 多 worker 部署：WEB_CONCURRENCY 是 gunicorn 與 uvicorn 共用的 worker 數環境變數
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    # 跨 worker 共用狀態（backend: sqlite 或 memory）：LINE token 與換發鎖，以及下列 sqlite 後端的預設檔案
+    SHARED_STATE_BACKEND: str = os.getenv("SHARED_STATE_BACKEND", "sqlite")
+    SHARED_STATE_PATH: str = os.getenv("SHARED_STATE_PATH", "care_state.sqlite3")
+    # SQLite 被其他 worker 鎖住時最多等幾毫秒（在 event loop 上等待），逾時改用程序內的記憶體後端
+    SHARED_STATE_BUSY_TIMEOUT_MS: int = int(os.getenv("SHARED_STATE_BUSY_TIMEOUT_MS", "50"))
+    # 超過一個 worker 時，快取、對話記憶與去重預設改用共用的 sqlite 檔案
+    _PER_PROCESS_BACKEND: str = "sqlite" if WEB_CONCURRENCY > 1 else "memory"
+
+    # Gemini 回應快取配置（backend: memory 或 sqlite）
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_BACKEND: str = os.getenv("RESPONSE_CACHE_BACKEND", _PER_PROCESS_BACKEND)
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_SQLITE_PATH: str = os.getenv("RESPONSE_CACHE_SQLITE_PATH", SHARED_STATE_PATH)
+
+    # 對話記憶配置（backend: memory 或 sqlite）
+    CONVERSATION_BACKEND: str = os.getenv("CONVERSATION_BACKEND", _PER_PROCESS_BACKEND)
+    CONVERSATION_MAX_TURNS: int = int(os.getenv("CONVERSATION_MAX_TURNS", "10"))
+    CONVERSATION_TOKEN_BUDGET: int = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "2000"))
+    # 閒置超過此秒數的對話會被清除
+    CONVERSATION_IDLE_TTL: float = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+    CONVERSATION_MAX_USERS: int = int(os.getenv("CONVERSATION_MAX_USERS", "10000"))
+    CONVERSATION_SQLITE_PATH: str = os.getenv("CONVERSATION_SQLITE_PATH", SHARED_STATE_PATH)
 
     # Line Messaging API 配置
     LINE_CHANNEL_ID: str = os.getenv("LINE_CHANNEL_ID")
     LINE_CHANNEL_SECRET: str = os.getenv("LINE_CHANNEL_SECRET")
+    # 一般不需修改；壓力測試時可指向本機的模擬伺服器
+    LINE_API_BASE_URL: str = os.getenv("LINE_API_BASE_URL", "https://api.line.me")
     # 可選：如果不想使用動態 token，可設定 long-lived token
     LINE_CHANNEL_ACCESS_TOKEN: str = os.getenv("LINE_CHANNEL_ACCESS_TOKEN", "")
+    # 其他 worker 正在換發 token 時，最多等待幾秒再自行換發
+    LINE_TOKEN_REFRESH_LOCK_TIMEOUT: float = float(os.getenv("LINE_TOKEN_REFRESH_LOCK_TIMEOUT", "15"))
+    # 在 token 到期前 5 分鐘緩衝之外，再提早多少秒於背景換發
+    LINE_TOKEN_RENEW_BEFORE: int = int(os.getenv("LINE_TOKEN_RENEW_BEFORE", "3600"))
+    # reply token 約一分鐘內有效；超過這個秒數或回覆時 token 已失效，改用 push 依 user_id 送出
+    LINE_REPLY_TOKEN_TTL: float = float(os.getenv("LINE_REPLY_TOKEN_TTL", "55"))
+    LINE_PUSH_FALLBACK_ENABLED: bool = os.getenv("LINE_PUSH_FALLBACK_ENABLED", "true").lower() == "true"
+    # 同一位使用者在這段時間內的 push 訊息合併成一個請求（最多五則）
+    LINE_PUSH_BATCH_WINDOW: float = float(os.getenv("LINE_PUSH_BATCH_WINDOW", "0.5"))
+    # 事件排入佇列後顯示聊天室載入動畫（秒數需為 5 到 60 之間 5 的倍數）
+    LINE_LOADING_ANIMATION_ENABLED: bool = os.getenv("LINE_LOADING_ANIMATION_ENABLED", "true").lower() == "true"
+    LINE_LOADING_SECONDS: int = int(os.getenv("LINE_LOADING_SECONDS", "20"))
+
+    # Webhook 背景工作佇列配置
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "4"))
+    WEBHOOK_QUEUE_MAXSIZE: int = int(os.getenv("WEBHOOK_QUEUE_MAXSIZE", "100"))
+    # 單一使用者最多可佔用幾個佇列位置（0 代表不限制），超過的訊息直接捨棄
+    WEBHOOK_QUEUE_MAX_PER_USER: int = int(os.getenv("WEBHOOK_QUEUE_MAX_PER_USER", "10"))
+    # 關閉服務時等待佇列清空的秒數
+    WEBHOOK_DRAIN_TIMEOUT: float = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))
+
+    # 每位使用者的 Gemini 提問速率限制（token bucket，每個 worker 各自計算）：
+    # 超過時回覆請使用者稍候，不呼叫 Gemini；問候與緊急訊息不受限制
+    USER_RATE_LIMIT_ENABLED: bool = os.getenv("USER_RATE_LIMIT_ENABLED", "true").lower() == "true"
+    USER_RATE_LIMIT_PER_MINUTE: float = float(os.getenv("USER_RATE_LIMIT_PER_MINUTE", "6"))
+    USER_RATE_LIMIT_BURST: float = float(os.getenv("USER_RATE_LIMIT_BURST", "5"))
+    USER_RATE_LIMIT_MAX_USERS: int = int(os.getenv("USER_RATE_LIMIT_MAX_USERS", "10000"))
+
+    # Webhook 事件去重配置（backend: memory 或 sqlite）
+    WEBHOOK_DEDUP_ENABLED: bool = os.getenv("WEBHOOK_DEDUP_ENABLED", "true").lower() == "true"
+    WEBHOOK_DEDUP_BACKEND: str = os.getenv("WEBHOOK_DEDUP_BACKEND", _PER_PROCESS_BACKEND)
+    WEBHOOK_DEDUP_TTL: float = float(os.getenv("WEBHOOK_DEDUP_TTL", "600"))
+    WEBHOOK_DEDUP_MAX_ENTRIES: int = int(os.getenv("WEBHOOK_DEDUP_MAX_ENTRIES", "10000"))
+    WEBHOOK_DEDUP_SQLITE_PATH: str = os.getenv("WEBHOOK_DEDUP_SQLITE_PATH", SHARED_STATE_PATH)
+
+    # 本地醫療院所索引（開放資料 CSV，檔案不存在時停用）
+    FACILITY_DATA_PATH: str = os.getenv("FACILITY_DATA_PATH", "data/facilities.csv")
+    # 空間索引網格大小（度），0.01 度約 1 公里
+    FACILITY_GRID_CELL_SIZE: float = float(os.getenv("FACILITY_GRID_CELL_SIZE", "0.01"))
+    # 查到院所時最多帶入幾筆
+    FACILITY_CONTEXT_LIMIT: int = int(os.getenv("FACILITY_CONTEXT_LIMIT", "5"))
+    # context：把查到的院所放進 Gemini prompt；direct：直接回覆查詢結果，不呼叫 Gemini
+    FACILITY_ANSWER_MODE: str = os.getenv("FACILITY_ANSWER_MODE", "context")
+    # 使用者分享位置時回覆最近的幾間院所，以及搜尋半徑（公里）
+    FACILITY_NEARBY_LIMIT: int = int(os.getenv("FACILITY_NEARBY_LIMIT", "5"))
+    FACILITY_NEARBY_MAX_KM: float = float(os.getenv("FACILITY_NEARBY_MAX_KM", "10"))
+
+    # 意圖路由：問候、道謝、緊急狀況等直接回覆，不呼叫 Gemini
+    INTENT_ROUTER_ENABLED: bool = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+    # 關鍵字至少要佔訊息多少比例才視為罐頭意圖（緊急狀況不受此限制）
+    INTENT_MIN_COVERAGE: float = float(os.getenv("INTENT_MIN_COVERAGE", "0.6"))
+
+    # Event loop 延遲與阻塞偵測（預設關閉，建議在 staging 開啟）
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    # event loop 被卡住超過幾秒就記錄當下的 stack
+    LOOP_MONITOR_BLOCK_THRESHOLD: float = float(os.getenv("LOOP_MONITOR_BLOCK_THRESHOLD", "0.25"))
+    LOOP_MONITOR_MAX_REPORTS: int = int(os.getenv("LOOP_MONITOR_MAX_REPORTS", "20"))
 
 settings = Settings()
\ No newline at end of file
@@ -0,0 +1,150 @@
+"""
+Event loop 延遲與阻塞呼叫偵測（預設關閉，LOOP_MONITOR_ENABLED=true 開啟）
+- 取樣 task：每 interval 秒 sleep 一次，實際醒來時間比預期晚多少就是 event loop 延遲（lag）
+- 看門狗 thread：取樣 task 超過 block_threshold 秒沒有更新心跳，代表 event loop 被同步呼叫卡住，
+  此時從另一個 thread 擷取 event loop thread 當下的 stack，直接指出是哪一行在阻塞
+每次阻塞只記錄一次，結果可從 /diagnostics/loop 與 /metrics 查看。
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = registry.histogram(
+    "care_event_loop_lag_seconds",
+    "Delay between when the loop monitor expected to wake up and when it actually did",
+)
+BLOCKED_CALLS = registry.counter(
+    "care_event_loop_blocked_total",
+    "Times the event loop was blocked longer than LOOP_MONITOR_BLOCK_THRESHOLD",
+)
+
+# 只保留最後幾層 stack，足以定位阻塞的呼叫
+STACK_DEPTH = 15
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class LoopMonitor:
+    def __init__(self, interval: float, block_threshold: float, max_reports: int, window: int = 1000):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self._lags: Deque[float] = deque(maxlen=window)
+        self._reports: Deque[Dict[str, Any]] = deque(maxlen=max(1, max_reports))
+
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = 0.0
+        # 已回報過的心跳時間，避免同一次阻塞被重複記錄
+        self._reported_heartbeat = 0.0
+
+        self._samples = 0
+        self._max_lag = 0.0
+        self._blocked = 0
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._sample_loop(), name="loop-monitor")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"Event loop monitor started (interval={self.interval}s, "
+            f"block_threshold={self.block_threshold}s)"
+        )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=self.interval * 2 + 1)
+            self._watchdog = None
+
+    async def _sample_loop(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self._samples += 1
+            self._lags.append(lag)
+            if lag > self._max_lag:
+                self._max_lag = lag
+            LOOP_LAG.labels().observe(lag)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(min(self.interval, self.block_threshold / 2)):
+            heartbeat = self._heartbeat
+            blocked_for = time.monotonic() - heartbeat - self.interval
+            if blocked_for < self.block_threshold or heartbeat == self._reported_heartbeat:
+                continue
+            self._reported_heartbeat = heartbeat
+            self._report_block(blocked_for)
+
+    def _report_block(self, blocked_for: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = traceback.format_stack(frame)[-STACK_DEPTH:] if frame is not None else []
+        self._blocked += 1
+        BLOCKED_CALLS.inc()
+        self._reports.append({
+            "detected_at": time.time(),
+            "blocked_seconds": round(blocked_for, 4),
+            "stack": [line.rstrip() for line in stack],
+        })
+        logger.warning(
+            f"Event loop blocked for more than {blocked_for:.3f}s:\n" + "".join(stack)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._lags)
+        return {
+            "enabled": self.is_running,
+            "interval": self.interval,
+            "block_threshold": self.block_threshold,
+            "samples": self._samples,
+            "lag_p50": _percentile(ordered, 0.50),
+            "lag_p95": _percentile(ordered, 0.95),
+            "lag_p99": _percentile(ordered, 0.99),
+            "lag_max": self._max_lag,
+            "blocked": self._blocked,
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {**self.stats(), "blocking_calls": list(self._reports)}
+
+
+loop_monitor = LoopMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL,
+    block_threshold=settings.LOOP_MONITOR_BLOCK_THRESHOLD,
+    max_reports=settings.LOOP_MONITOR_MAX_REPORTS,
+)
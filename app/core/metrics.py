@@ -0,0 +1,162 @@
+"""
+行程內（in-process）指標彙整，輸出 Prometheus 文字格式
+只用整數累加與二分搜尋找 bucket，不加鎖（所有觀測都在同一個 event loop 中發生），
+放在 webhook → Gemini → LINE 的熱路徑上也幾乎沒有額外成本。
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple, Union
+
+# 從 0.5ms 到 30s，涵蓋簽名驗證（微秒等級）到 Gemini 回覆（數秒）
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Number = Union[int, float]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: Number) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # 最後一格是 +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class HistogramFamily:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+
+    def labels(self, *values: str) -> Histogram:
+        child = self._children.get(values)
+        if child is None:
+            child = Histogram(self.buckets)
+            self._children[values] = child
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for values, child in sorted(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+                )
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class CounterFamily:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Number] = {}
+
+    def inc(self, *values: str, amount: Number = 1) -> None:
+        self._values[values] = self._values.get(values, 0) + amount
+
+    def get(self, *values: str) -> Number:
+        return self._values.get(values, 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._families: List[Union[HistogramFamily, CounterFamily]] = []
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> HistogramFamily:
+        family = HistogramFamily(name, documentation, labelnames, buckets)
+        self._families.append(family)
+        return family
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> CounterFamily:
+        family = CounterFamily(name, documentation, labelnames)
+        self._families.append(family)
+        return family
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families:
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(prefix: str, documentation: str, stats: Dict[str, object]) -> str:
+    """把 stats() 回傳的數值欄位轉成 gauge，非數值欄位（例如 backend 名稱）略過"""
+    lines: List[str] = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.histogram(
+    "care_stage_duration_seconds",
+    "Latency of each processing stage between webhook receipt and LINE reply",
+    ("stage",),
+)
+ERRORS = registry.counter(
+    "care_errors_total",
+    "Errors by component and status code",
+    ("component", "status_code"),
+)
+
+
+@contextmanager
+def observe_stage(stage: str) -> Iterator[None]:
+    histogram = STAGE_LATENCY.labels(stage)
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started_at)
+
+
+def record_error(component: str, status_code: Union[int, str, None]) -> None:
+    ERRORS.inc(component, "none" if status_code is None else str(status_code))
@@ -0,0 +1,141 @@
+"""
+服務的延遲建立（依賴注入）
+import app.main 時不建立 Gemini / LINE 服務、不讀取院所資料，也不載入 linebot SDK 的 model
+（linebot.v3 的 import 約佔原本啟動時間的七成）。每個 get_* 第一次被呼叫時才建立實例，之後重複使用：
+- 路由以 Depends(get_*) 取得，測試可用 app.dependency_overrides 替換
+- 路由以外的程式碼（例如 event handler）直接呼叫 get_*
+- lifespan 啟動後以 start_warm_up() 在背景 thread 預熱；webhook 會先 await wait_until_warm()，
+  不會在 event loop 中與預熱 thread 同時 import linebot（並行 import 同一個套件可能拿到初始化到一半的模組）
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional, TypeVar
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.services.facility_index import FacilityIndex
+    from app.services.gemini_service import GeminiService
+    from app.services.line.fast_parser import FastWebhookParser
+    from app.services.line.message_service import LineMessageService
+    from app.services.line.token_manager import LineTokenManager
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# warm_up 在 thread 中執行，與 event loop 同時取用時不能建立兩份
+_lock = threading.RLock()
+_warm = threading.Event()
+_warm_up_task: Optional[asyncio.Future] = None
+# 預熱失敗後多久內不再由請求觸發重試（各服務仍會在第一次使用時各自建立）
+WARM_UP_RETRY_BACKOFF = 30.0
+_retry_at = 0.0
+
+
+def _lazy(factory: Callable[[], T]) -> Callable[[], T]:
+    instance = []
+
+    @functools.wraps(factory)
+    def get() -> T:
+        if not instance:
+            with _lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    # 測試或重新載入設定時清除已建立的實例
+    get.cache_clear = instance.clear
+    return get
+
+
+@_lazy
+def get_webhook_parser() -> "FastWebhookParser":
+    from app.services.line.fast_parser import FastWebhookParser
+
+    # 直接在原始 bytes 上驗證簽名，且只為會處理的事件建立 SDK model
+    return FastWebhookParser(settings.LINE_CHANNEL_SECRET, handled_message_types=("text", "location"))
+
+
+@_lazy
+def get_facility_index() -> "FacilityIndex":
+    from app.services.facility_index import create_facility_index
+
+    return create_facility_index()
+
+
+@_lazy
+def get_gemini_service() -> "GeminiService":
+    from app.services.gemini_service import GeminiService
+
+    return GeminiService()
+
+
+@_lazy
+def get_line_token_manager() -> "LineTokenManager":
+    from app.services.line.token_manager import LineTokenManager
+
+    # 建立時會讀取共用狀態中的 token，不在 import 時執行
+    return LineTokenManager()
+
+
+@_lazy
+def get_line_message_service() -> "LineMessageService":
+    from app.services.line.message_service import LineMessageService
+
+    return LineMessageService()
+
+
+def warm_up() -> None:
+    """載入 linebot SDK 並建立所有延遲建立的服務（阻塞，請在 thread 中執行）"""
+    started_at = time.perf_counter()
+    try:
+        import linebot.v3.messaging  # noqa: F401
+        import linebot.v3.webhooks  # noqa: F401
+
+        get_webhook_parser()
+        get_facility_index()
+        get_gemini_service()
+        get_line_message_service()
+    except Exception as e:
+        global _retry_at
+        # 預熱失敗不影響服務，第一個請求會再嘗試建立並回報實際的錯誤
+        _retry_at = time.monotonic() + WARM_UP_RETRY_BACKOFF
+        logger.error(f"Service warm-up failed, retrying in {WARM_UP_RETRY_BACKOFF:.0f}s: {e}", exc_info=True)
+        return
+    _warm.set()
+    logger.info(f"Services warmed up in {time.perf_counter() - started_at:.2f}s")
+
+
+def is_warm() -> bool:
+    return _warm.is_set()
+
+
+def _is_pending(task: Optional[asyncio.Future]) -> bool:
+    # 只看目前 event loop 的預熱（測試中每個 TestClient 可能使用不同的 loop）
+    return task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop()
+
+
+def start_warm_up() -> asyncio.Future:
+    """在背景 thread 執行 warm_up()，不阻塞 event loop"""
+    global _warm_up_task
+    if not _is_pending(_warm_up_task):
+        _warm_up_task = asyncio.ensure_future(asyncio.to_thread(warm_up))
+    return _warm_up_task
+
+
+async def wait_until_warm() -> None:
+    """
+    等待背景預熱完成；沒有進行中的預熱時（例如未經 lifespan 的測試）在背景 thread 重新預熱。
+    上次預熱失敗後 WARM_UP_RETRY_BACKOFF 秒內不再重試，避免每個請求都重跑一次失敗的預熱。
+    """
+    if _warm.is_set():
+        return
+    if not _is_pending(_warm_up_task):
+        if time.monotonic() < _retry_at:
+            return
+        start_warm_up()
+    await asyncio.shield(_warm_up_task)
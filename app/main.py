@@ -1,7 +1,50 @@
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.dependencies import get_line_token_manager, start_warm_up
+from app.routers.ai import router as ai_router
 from app.routers.line.webhook import router as line_router
-from app.routers.system import router as system_router
+from app.routers.system import check_shared_state, router as system_router
+from app.services.http_pool import gemini_http_pool
+from app.services.job_queue import webhook_job_queue
+from app.services.line import line_messaging_client, line_push_batcher
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 啟動：建立共用 HTTP 連線池、webhook 背景 worker，並在背景換發 LINE token
+    await gemini_http_pool.startup()
+    await webhook_job_queue.start()
+    get_line_token_manager().start_background_refresh()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    # 多 worker 部署時每個 worker 都會各自執行 lifespan；共用狀態無法使用時 token 與快取會退回各自為政
+    if not check_shared_state():
+        logger.error(f"Worker {os.getpid()}: shared state backend '{settings.SHARED_STATE_BACKEND}' is unavailable")
+    logger.info(f"Worker {os.getpid()} started (WEB_CONCURRENCY={settings.WEB_CONCURRENCY})")
+    app.state.started = True
+    # Gemini / LINE 服務與 linebot SDK 在背景 thread 預先建立，不延後開始接受請求；完成前 /ready 回傳 503
+    warm_up_task = start_warm_up()
+    yield
+    if not warm_up_task.done():
+        await warm_up_task
+    # 先標示為未就緒，讓 /ready 在排空佇列期間回傳 503
+    app.state.started = False
+    await loop_monitor.stop()
+    # 關閉：先等待佇列中的事件處理完畢，再關閉連線池
+    await webhook_job_queue.shutdown(timeout=settings.WEBHOOK_DRAIN_TIMEOUT)
+    await line_push_batcher.close()
+    await get_line_token_manager().stop_background_refresh()
+    await gemini_http_pool.shutdown()
+    await line_messaging_client.close()
+
 
 # main 只負責建立 app 並掛各模組 router
 app = FastAPI(
@@ -15,6 +58,7 @@ app = FastAPI(
     
     * **LINE Bot 服務**：透過 LINE Messaging API 提供 AI 智慧對話
     * **AI 智能回覆**：使用 Google Gemini AI 提供健康醫療諮詢
+    * **AI 串流回覆**：`/ai/stream` 讓非 LINE 前端即時顯示生成中的回覆
     
     ### 技術規格
     
@@ -30,6 +74,7 @@ app = FastAPI(
     license_info={
         "name": "MIT",
     },
+    lifespan=lifespan,
 )
 # main 來決定整個系統的 endpoint 要掛哪個前綴
 app.include_router(system_router)
@@ -38,3 +83,8 @@ app.include_router(
     prefix="/line",
     tags=["LINE Bot"],
 )  # 為啥要寫 prefix 在 line：因為 webhook 裡只管 /callback
+app.include_router(
+    ai_router,
+    prefix="/ai",
+    tags=["AI"],
+)
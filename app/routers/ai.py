@@ -0,0 +1,56 @@
+"""
+AI 串流路由層
+提供非 LINE 前端使用的串流端點，Gemini 產生一段就立即送出一段
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.dependencies import get_gemini_service
+from app.schemas import AIRequest, ErrorResponse
+from app.services.gemini_service import GeminiService, GeminiUnavailableError
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post(
+    "/stream",
+    summary="串流 AI 回覆",
+    description="以 text/plain 分段串流 Gemini 的回覆，前端可在生成過程中即時顯示",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/plain": {}}},
+        502: {"model": ErrorResponse, "description": "Gemini 服務錯誤"},
+        503: {"model": ErrorResponse, "description": "Gemini 斷路器開啟中（降級模式）"},
+    },
+)
+async def stream(request: AIRequest, gemini_service: GeminiService = Depends(get_gemini_service)):
+    chunks = gemini_service.stream_response(request.user_input)
+
+    # 先取得第一段，讓 Gemini 的錯誤可以用正常的 HTTP 狀態碼回報
+    try:
+        first_chunk = await chunks.__anext__()
+    except StopAsyncIteration:
+        first_chunk = ""
+    except GeminiUnavailableError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    async def body():
+        if first_chunk:
+            yield first_chunk
+        try:
+            async for chunk in chunks:
+                yield chunk
+        except ValueError as e:
+            # 已經開始回應，無法再改狀態碼，只能記錄並結束串流
+            logger.error(f"Gemini stream interrupted: {e}")
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8")
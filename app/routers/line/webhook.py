@@ -2,28 +2,74 @@
 LINE Bot Webhook 路由層
 負責接收來自 LINE 平台的 Webhook 請求、驗證簽名並分發事件
 """
-from fastapi import APIRouter, Request, Header, HTTPException
-from linebot.v3.webhooks import MessageEvent, TextMessageContent
-from linebot.v3.webhook import WebhookParser
-from linebot.v3.exceptions import InvalidSignatureError
-from app.services.line import handle_text_message_async
+from fastapi import APIRouter, Depends, Request, Header, HTTPException
+from app.dependencies import get_webhook_parser, wait_until_warm
+from app.services.line import (
+    event_deduplicator,
+    handle_location_message_async,
+    handle_text_message_async,
+    line_loading_indicator,
+)
+from app.services.line.fast_parser import FastWebhookParser
+from app.services.job_queue import webhook_job_queue
 from app.core.config import settings
+from app.core.metrics import record_error
+from collections import OrderedDict
+import asyncio
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
-# 初始化路由器和 webhook 解析器
+# 初始化路由器；webhook 解析器由 get_webhook_parser 延遲建立
 router = APIRouter()
-parser = WebhookParser(settings.LINE_CHANNEL_SECRET)
+
+
+def _user_key(event):
+    # 群組或聊天室中沒有 user_id 時，退而以事件來源物件區分
+    return getattr(event.source, "user_id", None) or id(event.source)
+
+
+def _handler_for(event):
+    """依訊息類型選擇處理函式；不處理的事件回傳 None"""
+    # 以 type 欄位判斷，不需要為了 isinstance 在 import 時載入 linebot 的 model
+    if getattr(event, "type", None) != "message":
+        return None
+    message_type = getattr(event.message, "type", None)
+    if message_type == "text":
+        return handle_text_message_async
+    if message_type == "location":
+        return handle_location_message_async
+    return None
+
+
+async def _dispatch_inline(jobs) -> None:
+    """同一批事件依使用者分組：不同使用者並行（最多 WEBHOOK_WORKERS 組），同一使用者依序處理"""
+    lanes = OrderedDict()
+    for handler, event in jobs:
+        lanes.setdefault(_user_key(event), []).append((handler, event))
+
+    semaphore = asyncio.Semaphore(settings.WEBHOOK_WORKERS)
+
+    async def run_lane(lane_jobs):
+        async with semaphore:
+            for handler, event in lane_jobs:
+                await handler(event)
+
+    await asyncio.gather(*(run_lane(lane_jobs) for lane_jobs in lanes.values()))
 
 
 @router.post("/callback")
-async def callback(request: Request, x_line_signature: str = Header(None)):
+async def callback(
+    request: Request,
+    x_line_signature: str = Header(None),
+    parser: FastWebhookParser = Depends(get_webhook_parser),
+):
     """
     LINE Bot Webhook 回調端點
     
     此端點接收來自 LINE 平台的所有事件通知（消息、追蹤、取消追蹤等）
+    驗證簽名後只將事件放入背景工作佇列，立即回傳 OK，實際處理由 worker 完成
     
     Args:
         request: FastAPI Request 對象
@@ -33,36 +79,74 @@ async def callback(request: Request, x_line_signature: str = Header(None)):
         str: 返回 "OK" 表示成功接收
     
     Raises:
-        HTTPException: 當簽名驗證失敗或缺少簽名時
+        HTTPException: 當簽名驗證失敗或缺少簽名時（400）；佇列已滿、有事件未能排入時（503）
     """
+    # 預熱完成前先等待（不阻塞 event loop），之後 linebot 已載入，以下的 import 只是查表
+    await wait_until_warm()
+    from linebot.v3.exceptions import InvalidSignatureError
+
     # 驗證是否包含 X-Line-Signature header
     if x_line_signature is None:
         logger.error("Missing X-Line-Signature header")
+        record_error("webhook", 400)
         raise HTTPException(status_code=400, detail="Missing X-Line-Signature header")
     
-    # 獲取請求 body
+    # 獲取請求 body（保持 bytes，不需要 decode）
     body = await request.body()
-    body_decoded = body.decode("utf-8")
+    rejected = 0
     
     try:
         # 驗證簽名並解析事件
-        events = parser.parse(body_decoded, x_line_signature)
-        
-        # 異步處理每個事件
+        events = parser.parse(body, x_line_signature)
+
+        # 篩出要處理的文字與位置消息事件
+        jobs = []
         for event in events:
-            # 處理文字消息事件
-            if isinstance(event, MessageEvent) and isinstance(event.message, TextMessageContent):
-                await handle_text_message_async(event)
+            handler = _handler_for(event)
+            if handler is None:
+                continue
+            # LINE 重送的事件已經處理過，直接略過
+            if event_deduplicator.is_duplicate(event):
+                continue
+            jobs.append((handler, event))
+
+        if webhook_job_queue.is_running:
+            # 交給背景 worker：不同使用者並行處理，同一使用者依序處理
+            for handler, event in jobs:
+                key = _user_key(event)
+                if not webhook_job_queue.submit(handler, event, key=key):
+                    if webhook_job_queue.key_is_full(key):
+                        # 單一使用者佔用的位置已達上限：直接捨棄，不讓 LINE 重送，也不影響同一批的其他使用者
+                        logger.warning(f"Dropped event from {key}: too many pending messages")
+                        continue
+                    # 佇列已滿：取消去重紀錄，讓 LINE 重送時能再處理這則訊息
+                    event_deduplicator.forget(event)
+                    rejected += 1
+                    continue
+                if handler is handle_text_message_async:
+                    # 文字訊息要等 Gemini，先讓使用者看到載入動畫
+                    line_loading_indicator.trigger(getattr(event.source, "user_id", None))
+        else:
+            # 佇列未啟動（例如未經 lifespan 的測試環境）時直接處理
+            await _dispatch_inline(jobs)
         
-        logger.info("Webhook events processed successfully")
+        logger.info("Webhook events accepted successfully")
         
     except InvalidSignatureError:
         logger.error("Invalid signature - possible security breach attempt")
+        record_error("webhook", 400)
         raise HTTPException(status_code=400, detail="Invalid signature")
     
     except Exception as e:
         logger.error(f"Unexpected error in webhook: {e}", exc_info=True)
         # LINE 平台仍然期望收到 200 OK，否則會重試
         # 因此即使內部處理失敗，我們也返回 OK
+
+    if rejected:
+        # 回傳 5xx 讓 LINE 重送（需在 LINE Developers 啟用 webhook redelivery）；
+        # 已排入佇列的事件已記錄在去重紀錄中，重送時不會重複處理
+        logger.error(f"Webhook queue full, {rejected} event(s) rejected; asking LINE to redeliver")
+        record_error("webhook", 503)
+        raise HTTPException(status_code=503, detail="Webhook queue is full, please retry")
     
     return "OK"
@@ -1,6 +1,32 @@
-from fastapi import APIRouter
+import os
 
-from app.schemas import HealthResponse, RootResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import registry, render_gauges
+from app.dependencies import is_warm
+from app.schemas import (
+    HealthResponse,
+    LoopDiagnosticsResponse,
+    ReadinessResponse,
+    RootResponse,
+    StatsResponse,
+)
+from app.services.circuit_breaker import OPEN, gemini_circuit_breaker
+from app.services.context_cache import gemini_context_cache
+from app.services.conversation_store import conversation_store
+from app.services.http_pool import gemini_http_pool
+from app.services.intent_router import intent_router
+from app.services.job_queue import webhook_job_queue
+from app.services.line.deduplicator import event_deduplicator
+from app.services.line.push_batcher import line_push_batcher
+from app.services.rate_control import gemini_rate_controller
+from app.services.response_cache import response_cache
+from app.services.retry_policy import gemini_hedger, gemini_retry_policy
+from app.services.shared_state import shared_state
+from app.services.token_usage import gemini_prompt_budget, gemini_token_usage
+from app.services.user_rate_limiter import user_rate_limiter
 
 
 router = APIRouter(tags=["系統"])
@@ -20,8 +46,93 @@ async def root():
     "/health",
     response_model=HealthResponse,
     summary="健康檢查",
-    description="回傳服務狀態",
+    description="回傳服務狀態與 Gemini 斷路器狀態（closed / half_open / open）",
 )
 async def health():
-    return {"status": "Welcome to CARE Backend!"}
+    # 斷路器開啟時服務仍可回應（降級回覆），只標示 degraded，不回傳錯誤狀態碼
+    circuit_state = gemini_circuit_breaker.state
+    return {
+        "status": "Welcome to CARE Backend!",
+        "gemini_circuit": circuit_state,
+        "degraded": circuit_state == OPEN,
+    }
+
+
+def check_shared_state() -> bool:
+    try:
+        return shared_state.ping()
+    except Exception:
+        return False
+
+
+@router.get(
+    "/ready",
+    response_model=ReadinessResponse,
+    summary="就緒檢查",
+    description="此 worker 完成啟動且共用狀態可用時回傳 200，否則 503；供負載平衡器或部署平台判斷是否導入流量",
+    responses={503: {"model": ReadinessResponse, "description": "此 worker 尚未就緒"}},
+)
+async def ready(request: Request):
+    checks = {
+        "startup": getattr(request.app.state, "started", False),
+        "webhook_queue": webhook_job_queue.is_running,
+        "shared_state": check_shared_state(),
+        "services": is_warm(),
+    }
+    body = {"ready": all(checks.values()), "worker_pid": os.getpid(), "checks": checks}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+def _collect_stats() -> dict:
+    return {
+        "webhook_queue": webhook_job_queue.stats(),
+        "webhook_dedup": event_deduplicator.stats(),
+        "gemini_http_pool": gemini_http_pool.stats(),
+        "response_cache": response_cache.stats(),
+        "gemini_rate_control": gemini_rate_controller.stats(),
+        "gemini_retry": {**gemini_retry_policy.stats(), "hedging": gemini_hedger.stats()},
+        "gemini_circuit": gemini_circuit_breaker.stats(),
+        "gemini_tokens": {
+            **gemini_token_usage.stats(),
+            **gemini_prompt_budget.stats(),
+            "context_cache": gemini_context_cache.stats(),
+        },
+        "conversation_store": conversation_store.stats(),
+        "intent_router": intent_router.stats(),
+        "user_rate_limit": user_rate_limiter.stats(),
+        "line_push": line_push_batcher.stats(),
+        "shared_state": shared_state.stats(),
+    }
+
 
+@router.get(
+    "/stats",
+    response_model=StatsResponse,
+    summary="執行期統計",
+    description="回傳佇列、連線池與快取的即時統計，用於調整設定",
+)
+async def stats():
+    return _collect_stats()
+
+
+@router.get(
+    "/metrics",
+    response_class=PlainTextResponse,
+    summary="Prometheus 指標",
+    description="以 Prometheus 文字格式輸出各階段延遲直方圖、錯誤計數與執行期統計",
+)
+async def metrics():
+    body = registry.render()
+    for section, values in _collect_stats().items():
+        body += render_gauges(f"care_{section}", f"Runtime statistic from /stats ({section})", values)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.get(
+    "/diagnostics/loop",
+    response_model=LoopDiagnosticsResponse,
+    summary="Event loop 診斷",
+    description="回傳 event loop 延遲百分位數與最近幾次阻塞呼叫的 stack（需開啟 LOOP_MONITOR_ENABLED）",
+)
+async def loop_diagnostics():
+    return loop_monitor.report()
@@ -1,3 +1,5 @@
+from typing import Any, Dict, List
+
 from pydantic import BaseModel, Field
 #pydantic 是來做資料驗證的還有資料管理的，比一般的python class 好一點的是為自動檢查是否符合規則
 #EX json 傳回來的是字串，像是有一欄是age就要把json的字串轉成int
@@ -33,6 +35,28 @@ class HealthResponse(BaseModel):
         description="服務狀態訊息",
         json_schema_extra={"example": "Welcome to CARE Backend!"}
     )
+    gemini_circuit: str = Field(
+        ...,
+        description="Gemini 斷路器狀態：closed（正常）、half_open（試探恢復中）、open（暫停呼叫）",
+        json_schema_extra={"example": "closed"}
+    )
+    degraded: bool = Field(
+        ...,
+        description="是否處於降級模式（改用快取或固定回覆）",
+        json_schema_extra={"example": False}
+    )
+
+class ReadinessResponse(BaseModel):
+    """就緒檢查回應模型（每個 worker 各自回報）"""
+    ready: bool = Field(..., description="此 worker 是否可以接收流量")
+    worker_pid: int = Field(..., description="回應此請求的 worker 程序 ID")
+    checks: Dict[str, bool] = Field(
+        ...,
+        description="各項檢查結果：startup（lifespan 已完成）、webhook_queue、shared_state、services（延遲建立的服務已預熱）",
+        json_schema_extra={
+            "example": {"startup": True, "webhook_queue": True, "shared_state": True, "services": True}
+        }
+    )
 
 class RootResponse(BaseModel):
     """根路徑回應模型"""
@@ -41,3 +65,34 @@ class RootResponse(BaseModel):
         description="歡迎訊息",
         json_schema_extra={"example": "CARE Backend Running"}
     )
+
+class StatsResponse(BaseModel):
+    """執行期統計回應模型"""
+    webhook_queue: Dict[str, Any] = Field(..., description="Webhook 背景工作佇列統計")
+    webhook_dedup: Dict[str, Any] = Field(..., description="Webhook 重送事件去重統計")
+    gemini_http_pool: Dict[str, Any] = Field(..., description="Gemini HTTP 連線重用統計")
+    response_cache: Dict[str, Any] = Field(..., description="Gemini 回應快取命中統計")
+    gemini_rate_control: Dict[str, Any] = Field(..., description="Gemini 併發視窗與排隊等待統計")
+    gemini_retry: Dict[str, Any] = Field(..., description="Gemini 重試與對沖請求統計")
+    gemini_circuit: Dict[str, Any] = Field(..., description="Gemini 斷路器狀態與拒絕次數")
+    gemini_tokens: Dict[str, Any] = Field(..., description="Gemini token 用量、輸入截斷次數與 context caching 統計")
+    conversation_store: Dict[str, Any] = Field(..., description="對話記憶使用量統計")
+    intent_router: Dict[str, Any] = Field(..., description="意圖路由命中率（不需呼叫 Gemini 的訊息比例）")
+    user_rate_limit: Dict[str, Any] = Field(..., description="每位使用者速率限制的放行與限流次數")
+    line_push: Dict[str, Any] = Field(..., description="reply token 過期改用 push 的批次合併統計")
+    shared_state: Dict[str, Any] = Field(..., description="跨 worker 共用狀態的後端與換發鎖競爭次數")
+
+class LoopDiagnosticsResponse(BaseModel):
+    """Event loop 診斷回應模型"""
+    enabled: bool = Field(..., description="是否已開啟偵測（LOOP_MONITOR_ENABLED）")
+    interval: float = Field(..., description="取樣間隔（秒）")
+    block_threshold: float = Field(..., description="判定為阻塞的秒數")
+    samples: int = Field(..., description="已取樣次數")
+    lag_p50: float = Field(..., description="最近取樣的 event loop 延遲 p50（秒）")
+    lag_p95: float = Field(..., description="最近取樣的 event loop 延遲 p95（秒）")
+    lag_p99: float = Field(..., description="最近取樣的 event loop 延遲 p99（秒）")
+    lag_max: float = Field(..., description="啟動以來最大的 event loop 延遲（秒）")
+    blocked: int = Field(..., description="偵測到的阻塞次數")
+    blocking_calls: List[Dict[str, Any]] = Field(
+        ..., description="最近幾次阻塞發生時 event loop thread 的 stack"
+    )
@@ -0,0 +1,202 @@
+"""
+斷路器（circuit breaker）
+Gemini 故障時，每則訊息仍要等到逾時才失敗，會佔住 worker 與連線。
+斷路器以最近 window_size 次呼叫的結果判斷服務是否健康：
+- closed：正常呼叫；失敗率或慢呼叫比例超過門檻時轉為 open
+- open：直接拋出 CircuitOpenError，不再呼叫；open_duration 秒後轉為 half_open
+- half_open：只放行少量試探呼叫，全部成功才回到 closed，任一失敗就再次 open
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# 讓 /metrics 的 gauge 也能呈現狀態
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """斷路器開啟中，呼叫被直接拒絕"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate_threshold: float = 0.5,
+        slow_call_threshold: float = 10.0,
+        slow_call_rate_threshold: float = 0.8,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        open_duration: float = 30.0,
+        half_open_max_calls: int = 2,
+        is_failure: Optional[Callable[[BaseException], bool]] = None,
+        enabled: bool = True,
+    ):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = max(1, minimum_calls)
+        self.open_duration = open_duration
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        # 哪些錯誤代表服務不健康（例如 4xx 設定錯誤不應該讓斷路器打開）
+        self.is_failure = is_failure or (lambda error: True)
+        self.enabled = enabled
+
+        # 最近的呼叫結果：(是否失敗, 是否過慢)
+        self._window: Deque[Tuple[bool, bool]] = deque(maxlen=max(1, window_size))
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_opened_at = 0.0
+        self._half_open_calls = 0
+        self._half_open_successes = 0
+
+        self._rejected = 0
+        self._opened = 0
+
+    @property
+    def state(self) -> str:
+        # open 的冷卻時間過了就進入 half_open，在讀取狀態時順便轉換
+        now = time.monotonic()
+        if self._state == OPEN and now - self._opened_at >= self.open_duration:
+            self._transition(HALF_OPEN)
+        elif self._state == HALF_OPEN and now - self._half_opened_at >= self.open_duration:
+            # 試探呼叫遲遲沒有結果（例如被中斷），釋放名額重新試探，避免卡在 half_open
+            self._half_opened_at = now
+            self._half_open_calls = self._half_open_successes
+        return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._opened += 1
+        elif state == HALF_OPEN:
+            self._half_opened_at = time.monotonic()
+            self._half_open_calls = 0
+            self._half_open_successes = 0
+        elif state == CLOSED:
+            self._window.clear()
+
+    def allow(self) -> bool:
+        """是否可以送出呼叫；half_open 時會佔用一個試探名額"""
+        if not self.enabled:
+            return True
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+        self._rejected += 1
+        return False
+
+    def retry_after(self) -> float:
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self.open_duration - (time.monotonic() - self._opened_at))
+
+    def record(self, failed: bool, duration: float) -> None:
+        if not self.enabled:
+            return
+        slow = duration >= self.slow_call_threshold
+        if self._state == HALF_OPEN:
+            if failed or slow:
+                self._transition(OPEN)
+                return
+            self._half_open_successes += 1
+            if self._half_open_successes >= self.half_open_max_calls:
+                self._transition(CLOSED)
+            return
+        if self._state == OPEN:
+            # 開啟前就送出的呼叫，結果不影響目前狀態
+            return
+
+        self._window.append((failed, slow))
+        if len(self._window) < self.minimum_calls:
+            return
+        failures = sum(1 for failed_call, _ in self._window if failed_call)
+        slow_calls = sum(1 for _, slow_call in self._window if slow_call)
+        if (
+            failures / len(self._window) >= self.failure_rate_threshold
+            or slow_calls / len(self._window) >= self.slow_call_rate_threshold
+        ):
+            self._transition(OPEN)
+
+    async def run(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        透過斷路器執行 func
+
+        Raises:
+            CircuitOpenError: 斷路器開啟中
+        """
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+        started_at = time.monotonic()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            # 被上層的整體期限取消，視為過慢的失敗呼叫
+            self.record(True, time.monotonic() - started_at)
+            raise
+        except Exception as e:
+            self.record(self.is_failure(e), time.monotonic() - started_at)
+            raise
+        self.record(False, time.monotonic() - started_at)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        failures = sum(1 for failed, _ in self._window if failed)
+        return {
+            "enabled": self.enabled,
+            "state": state,
+            "state_code": STATE_CODES[state],
+            "window_calls": len(self._window),
+            "window_failure_rate": failures / len(self._window) if self._window else 0.0,
+            "opened": self._opened,
+            "rejected": self._rejected,
+            "retry_after_seconds": self.retry_after(),
+        }
+
+
+def _is_gemini_outage(error: BaseException) -> bool:
+    # gemini_service 會 import 這個模組，在呼叫時才取得 GeminiAPIError
+    from app.services.gemini_service import GeminiAPIError
+
+    # 逾時、連線失敗（status_code 為 None）與 5xx 才代表 Gemini 不健康；4xx 多半是設定或請求問題。
+    # 其他例外（例如被安全機制擋下、200 卻沒有 content 的回應）是個別請求的問題，不算故障
+    if not isinstance(error, GeminiAPIError):
+        return False
+    return error.status_code is None or error.status_code >= 500
+
+
+gemini_circuit_breaker = CircuitBreaker(
+    name="gemini",
+    failure_rate_threshold=settings.GEMINI_CIRCUIT_FAILURE_RATE,
+    slow_call_threshold=settings.GEMINI_CIRCUIT_SLOW_CALL_SECONDS,
+    slow_call_rate_threshold=settings.GEMINI_CIRCUIT_SLOW_CALL_RATE,
+    window_size=settings.GEMINI_CIRCUIT_WINDOW,
+    minimum_calls=settings.GEMINI_CIRCUIT_MIN_CALLS,
+    open_duration=settings.GEMINI_CIRCUIT_OPEN_SECONDS,
+    half_open_max_calls=settings.GEMINI_CIRCUIT_HALF_OPEN_CALLS,
+    is_failure=_is_gemini_outage,
+    enabled=settings.GEMINI_CIRCUIT_ENABLED,
+)
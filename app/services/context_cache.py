@@ -0,0 +1,151 @@
+"""
+Gemini context caching
+固定不變的 system instruction 建立為 cachedContent 後，每次請求只帶 cachedContent 名稱，
+Gemini 不必重新處理這段 prompt，命中的部分也以較低的費率計算（usageMetadata.cachedContentTokenCount）。
+- cachedContent 名稱存在共用狀態中，多個 worker 共用同一份快取
+- Gemini 對 cachedContent 有最低 token 數限制，較短的 system instruction 直接略過，照常放在請求中
+- 建立失敗時暫停 RETRY_BACKOFF 秒再嘗試，期間的請求不使用快取
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.metrics import record_error
+from app.services.conversation_store import estimate_tokens
+from app.services.http_pool import HttpClientPool, gemini_http_pool
+from app.services.shared_state import shared_state as default_shared_state
+
+logger = logging.getLogger(__name__)
+
+STATE_KEY_PREFIX = "gemini:cached_content:"
+# 建立失敗後多久再嘗試
+RETRY_BACKOFF = 300.0
+# 在 Gemini 端實際過期前就停止使用，避免送出已過期的名稱
+EXPIRY_MARGIN = 60.0
+
+
+class GeminiContextCache:
+    def __init__(
+        self,
+        http_pool: Optional[HttpClientPool] = None,
+        state=None,
+        enabled: bool = True,
+        ttl: int = 3600,
+        min_tokens: int = 1024,
+    ):
+        self.http_pool = http_pool or gemini_http_pool
+        self.state = state or default_shared_state
+        self.enabled = enabled
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.api_url = f"{settings.GEMINI_API_BASE_URL}/cachedContents"
+        self._lock = asyncio.Lock()
+        self._retry_at = 0.0
+        self._name: Optional[str] = None
+
+        self._hits = 0
+        self._created = 0
+        self._failures = 0
+        self._invalidated = 0
+        self._skipped_too_small = 0
+
+    @staticmethod
+    def _state_key(model_name: str, system_instruction: str) -> str:
+        digest = hashlib.sha256(f"{model_name}\n{system_instruction}".encode("utf-8")).hexdigest()
+        return f"{STATE_KEY_PREFIX}{digest[:32]}"
+
+    def eligible(self, system_instruction: str) -> bool:
+        return self.enabled and estimate_tokens(system_instruction) >= self.min_tokens
+
+    async def get_name(self, api_key: str, model_name: str, system_instruction: str) -> Optional[str]:
+        """
+        取得 system instruction 對應的 cachedContent 名稱，必要時建立
+
+        Returns:
+            Optional[str]: cachedContent 名稱；不使用快取時為 None（請求照常帶 systemInstruction）
+        """
+        if not self.eligible(system_instruction):
+            if self.enabled:
+                self._skipped_too_small += 1
+            return None
+
+        key = self._state_key(model_name, system_instruction)
+        name = self.state.get(key)
+        if name:
+            self._hits += 1
+            self._name = name
+            return name
+        if time.monotonic() < self._retry_at:
+            return None
+
+        async with self._lock:
+            # 等待鎖的期間可能已由其他請求（或其他 worker）建立
+            name = self.state.get(key)
+            if name:
+                self._hits += 1
+                self._name = name
+                return name
+            name = await self._create(api_key, model_name, system_instruction)
+            if name is None:
+                return None
+            self.state.set(key, name, ttl=max(1.0, self.ttl - EXPIRY_MARGIN))
+            self._name = name
+            return name
+
+    async def _create(self, api_key: str, model_name: str, system_instruction: str) -> Optional[str]:
+        status_code = None
+        try:
+            response = await self.http_pool.client.post(
+                self.api_url,
+                params={"key": api_key},
+                json={
+                    "model": f"models/{model_name}",
+                    "systemInstruction": {"parts": [{"text": system_instruction}]},
+                    "ttl": f"{self.ttl}s",
+                },
+            )
+            status_code = response.status_code
+            if response.status_code != 200:
+                raise ValueError(f"Status {response.status_code}, Response: {response.text}")
+            name = response.json()["name"]
+        except (httpx.HTTPError, ValueError, KeyError) as e:
+            self._failures += 1
+            self._retry_at = time.monotonic() + RETRY_BACKOFF
+            record_error("gemini_context_cache", status_code)
+            logger.warning(f"Failed to create Gemini cachedContent, retrying in {RETRY_BACKOFF:.0f}s: {e}")
+            return None
+
+        self._created += 1
+        logger.info(f"Created Gemini cachedContent {name} (ttl {self.ttl}s)")
+        return name
+
+    def invalidate(self, model_name: str, system_instruction: str) -> None:
+        """cachedContent 已失效（例如被刪除或過期）時清除記錄，下一個請求會重新建立"""
+        self._invalidated += 1
+        self._name = None
+        self.state.delete(self._state_key(model_name, system_instruction))
+        logger.warning("Gemini cachedContent rejected, falling back to inline system instruction")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "min_tokens": self.min_tokens,
+            "active": self._name is not None,
+            "hits": self._hits,
+            "created": self._created,
+            "failures": self._failures,
+            "invalidated": self._invalidated,
+            "skipped_too_small": self._skipped_too_small,
+        }
+
+
+gemini_context_cache = GeminiContextCache(
+    enabled=settings.GEMINI_CONTEXT_CACHE_ENABLED,
+    ttl=settings.GEMINI_CONTEXT_CACHE_TTL,
+    min_tokens=settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+)
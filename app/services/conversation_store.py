@@ -0,0 +1,251 @@
+"""
+對話記憶
+依 user_id 保存最近幾輪對話，讓 Gemini 能理解上下文，使用者不必每次重複說明。
+每位使用者只保留固定輪數（ring buffer），送出前再依 token 預算裁切，
+閒置太久的使用者會被淘汰，記憶體用量不會隨使用者數量無限成長。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List
+
+from app.core.config import settings
+from app.services.shared_state import LazySQLite, local_fallback
+
+logger = logging.getLogger(__name__)
+
+USER_ROLE = "user"
+MODEL_ROLE = "model"
+
+
+def estimate_tokens(text: str) -> int:
+    # 粗估：中文字約 1 字 1 token，英數約 4 字元 1 token
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return (len(text) - ascii_chars) + ascii_chars // 4 + 1
+
+
+class Turn:
+    __slots__ = ("role", "text", "tokens", "created_at")
+
+    def __init__(self, role: str, text: str, tokens: int, created_at: float):
+        self.role = role
+        self.text = text
+        self.tokens = tokens
+        self.created_at = created_at
+
+
+class _Conversation:
+    __slots__ = ("turns", "last_active")
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[Turn] = deque(maxlen=max_turns)
+        self.last_active = time.monotonic()
+
+
+def _trim_to_budget(turns: List[Turn], token_budget: int) -> List[Turn]:
+    """從最新的一輪往回取，直到超出 token 預算；並確保第一筆是使用者的發言"""
+    kept: List[Turn] = []
+    used = 0
+    for turn in reversed(turns):
+        if used + turn.tokens > token_budget:
+            break
+        kept.append(turn)
+        used += turn.tokens
+    kept.reverse()
+    # Gemini 的多輪 contents 需由 user 開頭
+    while kept and kept[0].role != USER_ROLE:
+        kept.pop(0)
+    return kept
+
+
+class ConversationStore:
+    def __init__(
+        self,
+        max_turns: int,
+        token_budget: int,
+        idle_ttl: float,
+        max_users: int,
+        sweep_interval: float = 60.0,
+    ):
+        self.max_turns = max(2, max_turns)
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.max_users = max(1, max_users)
+        self.sweep_interval = sweep_interval
+
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self._evicted = 0
+
+    def get_history(self, user_id: str) -> List[Turn]:
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            return []
+        if time.monotonic() - conversation.last_active > self.idle_ttl:
+            del self._conversations[user_id]
+            self._evicted += 1
+            return []
+        return _trim_to_budget(list(conversation.turns), self.token_budget)
+
+    def append(self, user_id: str, role: str, text: str) -> None:
+        now = time.monotonic()
+        conversation = self._conversations.get(user_id)
+        if conversation is None:
+            conversation = _Conversation(self.max_turns)
+            self._conversations[user_id] = conversation
+        conversation.turns.append(Turn(role, text, estimate_tokens(text), time.time()))
+        conversation.last_active = now
+        self._conversations.move_to_end(user_id)
+
+        # 超過使用者上限時淘汰最久沒互動的使用者
+        while len(self._conversations) > self.max_users:
+            self._conversations.popitem(last=False)
+            self._evicted += 1
+
+        if now - self._last_sweep > self.sweep_interval:
+            self.evict_idle()
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        self._last_sweep = now
+        evicted = 0
+        # OrderedDict 依最後互動時間排序，從最舊的開始檢查即可
+        while self._conversations:
+            user_id, conversation = next(iter(self._conversations.items()))
+            if now - conversation.last_active <= self.idle_ttl:
+                break
+            del self._conversations[user_id]
+            evicted += 1
+        self._evicted += evicted
+        return evicted
+
+    def clear(self, user_id: str) -> None:
+        self._conversations.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "users": len(self._conversations),
+            "turns": sum(len(c.turns) for c in self._conversations.values()),
+            "evicted_users": self._evicted,
+        }
+
+
+class SQLiteConversationStore:
+    def __init__(
+        self,
+        path: str,
+        max_turns: int,
+        token_budget: int,
+        idle_ttl: float,
+        sweep_interval: float = 60.0,
+    ):
+        self.path = path
+        self.max_turns = max(2, max_turns)
+        self.token_budget = token_budget
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+
+        self._lock = threading.Lock()
+        self._db = LazySQLite(path, [
+            "CREATE TABLE IF NOT EXISTS conversation_turns ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "role TEXT NOT NULL, text TEXT NOT NULL, tokens INTEGER NOT NULL, "
+            "created_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_conversation_turns_user "
+            "ON conversation_turns (user_id, id)",
+        ])
+        # 檔案忙碌時暫用：該次回覆只會看到本程序內的對話
+        self._fallback = ConversationStore(max_turns, token_budget, idle_ttl, settings.CONVERSATION_MAX_USERS)
+        self._last_sweep = time.monotonic()
+        self._evicted = 0
+
+    @local_fallback
+    def get_history(self, user_id: str) -> List[Turn]:
+        with self._lock:
+            rows = self._db.conn.execute(
+                "SELECT role, text, tokens, created_at FROM conversation_turns "
+                "WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+                (user_id, self.max_turns),
+            ).fetchall()
+        if not rows or time.time() - rows[0][3] > self.idle_ttl:
+            return []
+        turns = [Turn(*row) for row in reversed(rows)]
+        return _trim_to_budget(turns, self.token_budget)
+
+    @local_fallback
+    def append(self, user_id: str, role: str, text: str) -> None:
+        with self._lock:
+            self._db.conn.execute(
+                "INSERT INTO conversation_turns (user_id, role, text, tokens, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (user_id, role, text, estimate_tokens(text), time.time()),
+            )
+            # 只保留最近 max_turns 輪
+            self._db.conn.execute(
+                "DELETE FROM conversation_turns WHERE user_id = ? AND id NOT IN ("
+                "SELECT id FROM conversation_turns WHERE user_id = ? "
+                "ORDER BY id DESC LIMIT ?)",
+                (user_id, user_id, self.max_turns),
+            )
+
+        if time.monotonic() - self._last_sweep > self.sweep_interval:
+            self.evict_idle()
+
+    @local_fallback
+    def evict_idle(self) -> int:
+        self._last_sweep = time.monotonic()
+        cutoff = time.time() - self.idle_ttl
+        with self._lock:
+            stale = [
+                row[0]
+                for row in self._db.conn.execute(
+                    "SELECT user_id FROM conversation_turns "
+                    "GROUP BY user_id HAVING MAX(created_at) < ?",
+                    (cutoff,),
+                ).fetchall()
+            ]
+            self._db.conn.executemany(
+                "DELETE FROM conversation_turns WHERE user_id = ?",
+                [(user_id,) for user_id in stale],
+            )
+        self._evicted += len(stale)
+        return len(stale)
+
+    @local_fallback
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            self._db.conn.execute("DELETE FROM conversation_turns WHERE user_id = ?", (user_id,))
+
+    @local_fallback
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users, turns = self._db.conn.execute(
+                "SELECT COUNT(DISTINCT user_id), COUNT(*) FROM conversation_turns"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "users": users,
+            "turns": turns,
+            "evicted_users": self._evicted,
+        }
+
+
+def create_conversation_store():
+    if settings.CONVERSATION_BACKEND == "sqlite":
+        return SQLiteConversationStore(
+            settings.CONVERSATION_SQLITE_PATH,
+            max_turns=settings.CONVERSATION_MAX_TURNS,
+            token_budget=settings.CONVERSATION_TOKEN_BUDGET,
+            idle_ttl=settings.CONVERSATION_IDLE_TTL,
+        )
+    return ConversationStore(
+        max_turns=settings.CONVERSATION_MAX_TURNS,
+        token_budget=settings.CONVERSATION_TOKEN_BUDGET,
+        idle_ttl=settings.CONVERSATION_IDLE_TTL,
+        max_users=settings.CONVERSATION_MAX_USERS,
+    )
+
+
+conversation_store = create_conversation_store()
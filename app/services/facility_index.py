@@ -0,0 +1,402 @@
+"""
+本地醫療院所索引
+從政府開放資料的醫療院所 CSV 載入，在回覆前先查本地資料，
+讓「哪裡有眼科」「最近的診所」這類問題有可靠依據，不必完全依賴 Gemini。
+
+- 空間索引：經緯度切成固定大小的網格，最近鄰搜尋只需由近到遠檢查周圍幾格
+- 反向索引：縣市、鄉鎮市區、診療科別、機構種類 -> 院所編號，查詢時取交集
+- 名稱索引：機構名稱的二字元組（bigram）-> 院所編號，用來找出訊息中提到的院所
+
+CSV 欄位（中英文欄名皆可，缺少經緯度的院所仍可被文字查詢）：
+    醫事機構代碼/id, 醫事機構名稱/name, 醫事機構種類/type, 電話/phone, 地址/address,
+    診療科別/departments（以逗號、頓號或空白分隔）, 緯度/lat, 經度/lng
+"""
+import csv
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+COLUMN_ALIASES = {
+    "id": ("醫事機構代碼", "機構代碼", "id", "code"),
+    "name": ("醫事機構名稱", "機構名稱", "name"),
+    "kind": ("醫事機構種類", "型態別", "type", "kind"),
+    "phone": ("電話", "phone"),
+    "address": ("地址", "address"),
+    "departments": ("診療科別", "科別", "departments"),
+    "lat": ("緯度", "lat", "latitude"),
+    "lng": ("經度", "lng", "lon", "longitude"),
+}
+
+_DEPARTMENT_SEPARATORS = re.compile(r"[,，、;；/\s]+")
+# 「106台北市大安區...」、「新竹縣竹北市...」：略過郵遞區號，取出縣市與鄉鎮市區
+_AREA_PATTERN = re.compile(r"^\d*(.{2}[縣市])(.{1,3}?[鄉鎮市區])?")
+# 機構種類用這幾個字判斷，讓「醫院」「診所」也能當查詢條件
+_KIND_TERMS = ("醫學中心", "醫院", "診所", "衛生所", "藥局")
+
+
+def normalize_place(text: str) -> str:
+    return text.replace("臺", "台").strip()
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class Facility:
+    __slots__ = ("id", "name", "kind", "phone", "address", "departments", "lat", "lng")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        kind: str = "",
+        phone: str = "",
+        address: str = "",
+        departments: Sequence[str] = (),
+        lat: Optional[float] = None,
+        lng: Optional[float] = None,
+    ):
+        self.id = id
+        self.name = name
+        self.kind = kind
+        self.phone = phone
+        self.address = address
+        self.departments = tuple(departments)
+        self.lat = lat
+        self.lng = lng
+
+    @property
+    def has_location(self) -> bool:
+        return self.lat is not None and self.lng is not None
+
+    def describe(self, distance_km: Optional[float] = None) -> str:
+        parts = [self.name]
+        if distance_km is not None:
+            parts.append(f"距離約 {distance_km:.1f} 公里")
+        if self.address:
+            parts.append(f"地址：{self.address}")
+        if self.phone:
+            parts.append(f"電話：{self.phone}")
+        if self.departments:
+            parts.append(f"科別：{'、'.join(self.departments[:8])}")
+        return "｜".join(parts)
+
+
+class GridIndex:
+    """固定大小網格的空間索引，cell_size 以經緯度為單位（0.01 度約 1 公里）"""
+
+    def __init__(self, cell_size: float = 0.01):
+        self.cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], List[int]] = {}
+        self._points: Dict[int, Tuple[float, float]] = {}
+        self._bounds: Optional[Tuple[int, int, int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lng / self.cell_size))
+
+    def add(self, item: int, lat: float, lng: float) -> None:
+        cell = self._cell(lat, lng)
+        self._cells.setdefault(cell, []).append(item)
+        self._points[item] = (lat, lng)
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[0], cell[1], cell[1])
+        else:
+            min_i, max_i, min_j, max_j = self._bounds
+            self._bounds = (min(min_i, cell[0]), max(max_i, cell[0]), min(min_j, cell[1]), max(max_j, cell[1]))
+
+    def _ring(self, center: Tuple[int, int], radius: int) -> Iterable[Tuple[int, int]]:
+        ci, cj = center
+        if radius == 0:
+            yield center
+            return
+        for j in range(cj - radius, cj + radius + 1):
+            yield ci - radius, j
+            yield ci + radius, j
+        for i in range(ci - radius + 1, ci + radius):
+            yield i, cj - radius
+            yield i, cj + radius
+
+    def _rings_to_cover(self, center: Tuple[int, int]) -> int:
+        # 查詢點到資料範圍最遠那一格的距離，超過就不可能再找到任何點
+        min_i, max_i, min_j, max_j = self._bounds
+        ci, cj = center
+        return max(abs(ci - min_i), abs(ci - max_i), abs(cj - min_j), abs(cj - max_j))
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 5,
+        max_km: Optional[float] = None,
+        accept=None,
+    ) -> List[Tuple[int, float]]:
+        """
+        由近到遠逐圈檢查網格，找出最近的 k 個點
+
+        Args:
+            accept: 可選的篩選函式（item -> bool），例如只找有某科別的院所
+
+        Returns:
+            List[Tuple[int, float]]: (item, 距離公里) 依距離排序
+        """
+        if not self._points or k <= 0:
+            return []
+        center = self._cell(lat, lng)
+        # 經度一度的距離隨緯度縮小，用較小的值估算「下一圈至少多遠」才不會漏掉點
+        km_per_cell = self.cell_size * min(KM_PER_DEGREE_LAT, KM_PER_DEGREE_LAT * math.cos(math.radians(lat)))
+        last_ring = self._rings_to_cover(center)
+        if max_km is not None:
+            last_ring = min(last_ring, int(max_km / km_per_cell) + 1)
+
+        found: List[Tuple[float, int]] = []
+        for radius in range(last_ring + 1):
+            for cell in self._ring(center, radius):
+                for item in self._cells.get(cell, ()):
+                    if accept is not None and not accept(item):
+                        continue
+                    point_lat, point_lng = self._points[item]
+                    distance = haversine_km(lat, lng, point_lat, point_lng)
+                    if max_km is None or distance <= max_km:
+                        found.append((distance, item))
+            if len(found) >= k:
+                found.sort()
+                # 下一圈以外的點距離至少 radius * km_per_cell，已經不可能比第 k 近的更近
+                if found[k - 1][0] <= radius * km_per_cell:
+                    break
+        found.sort()
+        return [(item, distance) for distance, item in found[:k]]
+
+
+class FacilityIndex:
+    def __init__(self, facilities: Iterable[Facility] = (), cell_size: float = 0.01, name_max_df: float = 0.05):
+        self.facilities: List[Facility] = []
+        self.grid = GridIndex(cell_size)
+        # 欄位種類 -> 詞 -> 院所編號
+        self._terms: Dict[str, Dict[str, Set[int]]] = {"area": {}, "department": {}, "kind": {}}
+        self._term_fields: Dict[str, str] = {}
+        self._max_term_length = 0
+        self._name_bigrams: Dict[str, Set[int]] = {}
+        self._name_max_df = name_max_df
+        for facility in facilities:
+            self.add(facility)
+
+    def __len__(self) -> int:
+        return len(self.facilities)
+
+    def _add_term(self, field: str, term: str, item: int) -> None:
+        if len(term) < 2:
+            return
+        self._terms[field].setdefault(term, set()).add(item)
+        self._term_fields.setdefault(term, field)
+        self._max_term_length = max(self._max_term_length, len(term))
+
+    def add(self, facility: Facility) -> None:
+        item = len(self.facilities)
+        self.facilities.append(facility)
+        if facility.has_location:
+            self.grid.add(item, facility.lat, facility.lng)
+
+        match = _AREA_PATTERN.match(normalize_place(facility.address))
+        if match:
+            city, district = match.groups()
+            self._add_term("area", city, item)
+            # 使用者常省略「市」「縣」，例如「台北有哪些眼科」
+            self._add_term("area", city[:2], item)
+            if district:
+                self._add_term("area", district, item)
+        for department in facility.departments:
+            self._add_term("department", department, item)
+        name_and_kind = facility.kind + facility.name
+        for kind in _KIND_TERMS:
+            if kind in name_and_kind:
+                self._add_term("kind", kind, item)
+        for bigram in _bigrams(normalize_place(facility.name)):
+            self._name_bigrams.setdefault(bigram, set()).add(item)
+
+    def match_terms(self, text: str) -> Dict[str, Set[str]]:
+        """找出訊息中出現的縣市、鄉鎮市區、科別與機構種類（只查長度 2 到最長詞的子字串）"""
+        text = normalize_place(text)
+        matched: Dict[str, Set[str]] = {}
+        for start in range(len(text)):
+            for end in range(start + 2, min(len(text), start + self._max_term_length) + 1):
+                field = self._term_fields.get(text[start:end])
+                if field is not None:
+                    matched.setdefault(field, set()).add(text[start:end])
+        return matched
+
+    def _filter_by_terms(self, matched: Dict[str, Set[str]]) -> Optional[Set[int]]:
+        candidates: Optional[Set[int]] = None
+        for field, terms in matched.items():
+            postings = [self._terms[field][term] for term in terms]
+            if field in ("department", "kind"):
+                # 提到多個科別或種類（「診所還是醫院」）時任一個皆可
+                group = set().union(*postings)
+            else:
+                # 「台北市大安區」要同時符合縣市與區；從小的集合開始取交集
+                postings.sort(key=len)
+                group = set(postings[0])
+                for posting in postings[1:]:
+                    group &= posting
+            candidates = group if candidates is None else candidates & group
+            if not candidates:
+                return set()
+        return candidates
+
+    def search_by_name(self, text: str, limit: int = 5) -> List[Facility]:
+        """依名稱二字元組命中數排序；略過「醫院」這類出現在太多名稱中的常見組合"""
+        max_df = max(1, int(len(self.facilities) * self._name_max_df))
+        scores: Counter = Counter()
+        for bigram in _bigrams(normalize_place(text)):
+            postings = self._name_bigrams.get(bigram)
+            if postings and len(postings) <= max_df:
+                scores.update(postings)
+        results = []
+        for item, score in scores.most_common():
+            if len(results) >= limit:
+                break
+            distinctive = sum(
+                1
+                for bigram in _bigrams(normalize_place(self.facilities[item].name))
+                if len(self._name_bigrams[bigram]) <= max_df
+            )
+            # 至少要命中名稱中一半的特有二字元組，避免只因共用一個字就被選上
+            if score >= 2 and score * 2 >= distinctive:
+                results.append(self.facilities[item])
+        return results
+
+    def search(
+        self,
+        text: str,
+        limit: int = 5,
+        near: Optional[Tuple[float, float]] = None,
+    ) -> List[Facility]:
+        """
+        依訊息內容查詢院所：有提到縣市或鄉鎮市區時用地區、科別與種類篩選，否則改用名稱比對
+
+        只有科別或「醫院」「診所」這類種類（例如「頭痛需要去醫院嗎」）不足以找出特定院所，
+        除非有 near 可依距離排序，否則不回傳，避免把資料中任意幾筆院所當成參考資料
+
+        Args:
+            text: 使用者訊息
+            limit: 最多回傳幾筆
+            near: 可選的 (緯度, 經度)，有的話結果依距離排序
+        """
+        if not self.facilities:
+            return []
+        matched = self.match_terms(text)
+        if "area" not in matched and near is None:
+            return self.search_by_name(text, limit)
+
+        candidates = self._filter_by_terms(matched)
+        if not candidates:
+            return []
+        if near is not None:
+            located = [item for item in candidates if self.facilities[item].has_location]
+            located.sort(key=lambda item: haversine_km(near[0], near[1], self.facilities[item].lat, self.facilities[item].lng))
+            ordered = located[:limit]
+        else:
+            ordered = sorted(candidates)[:limit]
+        return [self.facilities[item] for item in ordered]
+
+    def nearest(
+        self,
+        lat: float,
+        lng: float,
+        k: int = 5,
+        max_km: Optional[float] = None,
+        department: Optional[str] = None,
+    ) -> List[Tuple[Facility, float]]:
+        accept = None
+        if department:
+            allowed = self._terms["department"].get(department, set())
+            accept = allowed.__contains__
+        return [
+            (self.facilities[item], distance)
+            for item, distance in self.grid.nearest(lat, lng, k, max_km, accept)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "facilities": len(self.facilities),
+            "located": len(self.grid),
+            "areas": len(self._terms["area"]),
+            "departments": len(self._terms["department"]),
+        }
+
+
+def _pick(row: Dict[str, str], field: str) -> str:
+    for column in COLUMN_ALIASES[field]:
+        value = row.get(column)
+        if value:
+            return value.strip()
+    return ""
+
+
+def _parse_coordinate(value: str) -> Optional[float]:
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def load_facilities(rows: Iterable[Dict[str, str]]) -> FacilityIndex:
+    index = FacilityIndex(cell_size=settings.FACILITY_GRID_CELL_SIZE)
+    for row in rows:
+        name = _pick(row, "name")
+        if not name:
+            continue
+        departments = [d for d in _DEPARTMENT_SEPARATORS.split(_pick(row, "departments")) if d]
+        index.add(Facility(
+            id=_pick(row, "id"),
+            name=name,
+            kind=_pick(row, "kind"),
+            phone=_pick(row, "phone"),
+            address=_pick(row, "address"),
+            departments=departments,
+            lat=_parse_coordinate(_pick(row, "lat")),
+            lng=_parse_coordinate(_pick(row, "lng")),
+        ))
+    return index
+
+
+def create_facility_index() -> FacilityIndex:
+    path = settings.FACILITY_DATA_PATH
+    if not path or not os.path.exists(path):
+        logger.warning(f"Facility data not found at '{path}', facility lookup disabled")
+        return FacilityIndex()
+    # 開放資料常見 UTF-8 with BOM
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        index = load_facilities(csv.DictReader(f))
+    logger.info(f"Facility index loaded: {index.stats()}")
+    return index
+
+
+def format_facilities(facilities: Sequence[Facility]) -> str:
+    return "\n".join(f"{i}. {facility.describe()}" for i, facility in enumerate(facilities, 1))
+
+
+def format_nearby(results: Sequence[Tuple[Facility, float]]) -> str:
+    return "\n".join(
+        f"{i}. {facility.describe(distance)}" for i, (facility, distance) in enumerate(results, 1)
+    )
@@ -1,18 +1,84 @@
+import asyncio
 import httpx
+import json
+import time
+from typing import AsyncIterator, List, Optional
 from app.core.config import settings
+from app.core.metrics import observe_stage, record_error
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, gemini_circuit_breaker
+from app.services.context_cache import GeminiContextCache, gemini_context_cache
+from app.services.conversation_store import Turn
+from app.services.http_pool import HttpClientPool, gemini_http_pool
+from app.services.rate_control import RateController, gemini_rate_controller
+from app.services.response_cache import ResponseCache, response_cache
+from app.services.retry_policy import Hedger, RetryPolicy, gemini_hedger, gemini_retry_policy
+from app.services.token_usage import (
+    PromptBudget,
+    TokenUsageTracker,
+    gemini_prompt_budget,
+    gemini_token_usage,
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 帶 cachedContent 的請求回傳這些狀態碼時，視為快取已失效，改帶完整的 system instruction 重送
+CACHED_CONTENT_REJECTED_STATUSES = (400, 403, 404)
+
+
+class GeminiAPIError(ValueError):
+    """Gemini API 呼叫失敗；status_code 為 None 表示連線失敗或逾時"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class GeminiUnavailableError(GeminiAPIError):
+    """斷路器開啟中（Gemini 近期持續故障），請求未送出即失敗"""
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message, 503)
+        self.retry_after = retry_after
+
 
 class GeminiService:
-    def __init__(self):
+    def __init__(
+        self,
+        http_pool: Optional[HttpClientPool] = None,
+        cache: Optional[ResponseCache] = None,
+        rate_controller: Optional[RateController] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        hedger: Optional[Hedger] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        token_usage: Optional[TokenUsageTracker] = None,
+        prompt_budget: Optional[PromptBudget] = None,
+        context_cache: Optional[GeminiContextCache] = None,
+    ):
+        # 共用的連線池由 app lifespan 管理，避免每則訊息都重新建立 TCP/TLS 連線
+        self.http_pool = http_pool or gemini_http_pool
+        self.cache = cache or response_cache
+        # 全域併發與速率限制，避免瞬間大量請求被 Gemini 以 429 拒絕
+        self.rate_controller = rate_controller or gemini_rate_controller
+        # 暫時性錯誤自動重試；可選擇對慢請求送出對沖請求以降低長尾延遲
+        self.retry_policy = retry_policy or gemini_retry_policy
+        self.hedger = hedger or gemini_hedger
+        # Gemini 持續故障時直接失敗，不再讓每個請求等到逾時
+        self.circuit_breaker = circuit_breaker or gemini_circuit_breaker
+        # 記錄 usageMetadata 並限制每次請求的輸入長度；固定的 system instruction 可改用 cachedContent
+        self.token_usage = token_usage or gemini_token_usage
+        self.prompt_budget = prompt_budget or gemini_prompt_budget
+        self.context_cache = context_cache or gemini_context_cache
         self.api_key = settings.GEMINI_API_KEY
         self.model_name = settings.MODEL_NAME
         self.api_url = (
-            f"https://generativelanguage.googleapis.com/v1beta/models/"
+            f"{settings.GEMINI_API_BASE_URL}/models/"
             f"{self.model_name}:generateContent"
         )
+        self.stream_api_url = (
+            f"{settings.GEMINI_API_BASE_URL}/models/"
+            f"{self.model_name}:streamGenerateContent"
+        )
         self.system_instruction = (
             "你是 CARE（Clinical Assistance & Resource Engine），"
             "一個專業的健康醫療資訊 AI 助手。\n"
@@ -23,57 +89,171 @@ class GeminiService:
         )
         logger.info(f"GeminiService initialized with model: {self.model_name}")
 
-    async def generate_response(self, user_input: str) -> str:
+    def _build_payload(
+        self,
+        user_input: str,
+        history: Optional[List[Turn]] = None,
+        context: Optional[str] = None,
+        cached_content: Optional[str] = None,
+    ) -> dict:
+        # 多輪對話：先放歷史紀錄，最後才是這次的問題
+        contents = [
+            {"role": turn.role, "parts": [{"text": turn.text}]}
+            for turn in history or []
+        ]
+        if context:
+            # 本地查到的資料放在這次問題前面，system instruction 維持不變
+            user_input = f"參考資料（請優先依據以下資料回答）：\n{context}\n\n使用者問題：{user_input}"
+        contents.append({"role": "user", "parts": [{"text": user_input}]})
+        payload = {"contents": contents}
+        if cached_content:
+            # system instruction 已在 cachedContent 中，不能再重複帶入
+            payload["cachedContent"] = cached_content
+        else:
+            payload["systemInstruction"] = {"parts": [{"text": self.system_instruction}]}
+        generation_config = self.prompt_budget.generation_config()
+        if generation_config:
+            payload["generationConfig"] = generation_config
+        return payload
 
-        payload = {
-            "contents": [{"parts": [{"text": user_input}]}],
-            "systemInstruction": {"parts": [{"text": self.system_instruction}]},
-        }
-        
+    @staticmethod
+    def _status_error(status_code: int) -> GeminiAPIError:
+        if status_code == 400:
+            message = "請求格式錯誤，請稍後再試"
+        elif status_code == 401:
+            message = "API 金鑰無效或已過期"
+        elif status_code == 403:
+            message = "API 權限不足，請檢查金鑰設定"
+        elif status_code == 429:
+            message = "API 請求配額已達上限，請稍後再試"
+        elif status_code == 500:
+            message = "AI 服務暫時無法使用，請稍後再試"
+        else:
+            message = f"AI 服務發生錯誤（狀態碼: {status_code}）"
+        return GeminiAPIError(message, status_code)
+
+    async def generate_response(
+        self,
+        user_input: str,
+        history: Optional[List[Turn]] = None,
+        context: Optional[str] = None,
+        user_id: Optional[str] = None,
+    ) -> str:
+        # 過長的輸入與參考資料先截斷，快取 key 也以截斷後的內容計算
+        user_input = self.prompt_budget.limit_input(user_input)
+        context = self.prompt_budget.limit_context(context)
+
+        # 相同問題直接回傳快取的回覆；有對話上下文時答案會不同，不使用快取
+        cache_key = None
+        if not history:
+            cache_text = f"{user_input}\n{context}" if context else user_input
+            cache_key = self.cache.make_key(cache_text, self.model_name, self.system_instruction)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                logger.info("Response cache hit")
+                return cached
+
+        try:
+            ai_response = await self._generate(user_input, history, context, user_id)
+        except asyncio.TimeoutError:
+            error_msg = "請求超時，請檢查網路連線"
+            logger.error(f"Deadline exceeded: {error_msg}")
+            raise GeminiAPIError(error_msg)
+        except CircuitOpenError as e:
+            return self._degraded_response(user_input, context, e.retry_after)
+
+        if cache_key is not None:
+            self.cache.set(cache_key, ai_response)
+        return ai_response
+
+    async def _generate(
+        self, user_input: str, history: Optional[List[Turn]], context: Optional[str], user_id: Optional[str]
+    ) -> str:
+        cached_content = await self.context_cache.get_name(self.api_key, self.model_name, self.system_instruction)
+        payload = self._build_payload(user_input, history, context, cached_content)
         try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                logger.info(f"Sending request to Gemini API: {user_input[:50]}...")
-                
+            return await self._call(payload, user_input, user_id)
+        except GeminiAPIError as e:
+            if cached_content is None or e.status_code not in CACHED_CONTENT_REJECTED_STATUSES:
+                raise
+            # cachedContent 已過期或被刪除：清除記錄，改帶完整的 system instruction 重送一次
+            self.context_cache.invalidate(self.model_name, self.system_instruction)
+        return await self._call(self._build_payload(user_input, history, context), user_input, user_id)
+
+    async def _call(self, payload: dict, user_input: str, user_id: Optional[str]) -> str:
+        return await self.retry_policy.run(
+            lambda: self.circuit_breaker.run(
+                lambda: self.hedger.run(lambda: self._request_once(payload, user_input, user_id))
+            )
+        )
+
+    def _degraded_response(self, user_input: str, context: Optional[str], retry_after: float) -> str:
+        """
+        降級模式：斷路器開啟時不呼叫 Gemini，改用相同問題的快取回覆
+
+        Raises:
+            GeminiUnavailableError: 沒有可用的快取
+        """
+        cache_text = f"{user_input}\n{context}" if context else user_input
+        cached = self.cache.get(self.cache.make_key(cache_text, self.model_name, self.system_instruction))
+        if cached is not None:
+            logger.warning("Gemini circuit open, serving cached response")
+            return cached
+        logger.warning(f"Gemini circuit open, failing fast (retry after {retry_after:.1f}s)")
+        raise self._unavailable_error(retry_after)
+
+    @staticmethod
+    def _unavailable_error(retry_after: float = 0.0) -> GeminiUnavailableError:
+        return GeminiUnavailableError("AI 服務暫時無法使用，請稍後再試", retry_after)
+
+    async def _request_once(self, payload: dict, user_input: str, user_id: Optional[str] = None) -> str:
+        """單次呼叫 Gemini generateContent（含流量控制），重試與對沖由呼叫端處理"""
+        wait = await self.rate_controller.acquire()
+        status_code = None
+        try:
+            client = self.http_pool.client
+            logger.info(
+                f"Sending request to Gemini API (queued {wait:.3f}s): {user_input[:50]}..."
+            )
+            
+            with observe_stage("gemini"):
                 response = await client.post(
                     self.api_url,
                     params={"key": self.api_key},
                     json=payload,
                 )
-                
-                # 檢查 HTTP 狀態碼
-                if response.status_code != 200:
-                    logger.error(
-                        f"Gemini API error: Status {response.status_code}, "
-                        f"Response: {response.text}"
-                    )
-                    if response.status_code == 400:
-                        raise ValueError("請求格式錯誤，請稍後再試")
-                    elif response.status_code == 401:
-                        raise ValueError("API 金鑰無效或已過期")
-                    elif response.status_code == 403:
-                        raise ValueError("API 權限不足，請檢查金鑰設定")
-                    elif response.status_code == 429:
-                        raise ValueError("API 請求配額已達上限，請稍後再試")
-                    elif response.status_code == 500:
-                        raise ValueError("AI 服務暫時無法使用，請稍後再試")
-                    else:
-                        raise ValueError(f"AI 服務發生錯誤（狀態碼: {response.status_code}）")
-
-                data = response.json()
-                ai_response = data["candidates"][0]["content"]["parts"][0]["text"]
-                
-                logger.info("Successfully received AI response")
-                return ai_response
-                
+            status_code = response.status_code
+            
+            # 檢查 HTTP 狀態碼
+            if response.status_code != 200:
+                logger.error(
+                    f"Gemini API error: Status {response.status_code}, "
+                    f"Response: {response.text}"
+                )
+                raise self._status_error(response.status_code)
+
+            data = response.json()
+            ai_response = data["candidates"][0]["content"]["parts"][0]["text"]
+            self.token_usage.record(data.get("usageMetadata"), user_id)
+            
+            logger.info("Successfully received AI response")
+            return ai_response
+            
+        except GeminiAPIError:
+            record_error("gemini", status_code)
+            raise
+
         except httpx.TimeoutException:
             error_msg = "請求超時，請檢查網路連線"
             logger.error(f"Timeout error: {error_msg}")
-            raise ValueError(error_msg)
+            record_error("gemini", "timeout")
+            raise GeminiAPIError(error_msg)
             
         except httpx.NetworkError as e:
+            record_error("gemini", "network")
             error_msg = f"網路連線錯誤: {str(e)}"
             logger.error(f"Network error: {error_msg}")
-            raise ValueError("無法連線到 AI 服務，請檢查網路連線")
+            raise GeminiAPIError("無法連線到 AI 服務，請檢查網路連線")
             
         except KeyError as e:
             error_msg = f"API 回應格式錯誤: 缺少欄位 {str(e)}"
@@ -84,4 +264,114 @@ class GeminiService:
             error_type = type(e).__name__
             error_msg = str(e)
             logger.error(f"Unexpected error ({error_type}): {error_msg}", exc_info=True)
-            raise ValueError(f"處理請求時發生錯誤: {error_msg}")
\ No newline at end of file
+            raise ValueError(f"處理請求時發生錯誤: {error_msg}")
+
+        finally:
+            await self.rate_controller.release(status_code)
+
+    async def stream_response(self, user_input: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        透過 streamGenerateContent（SSE）逐段產生 AI 回覆
+
+        Yields:
+            str: Gemini 每次送出的文字片段
+        """
+        user_input = self.prompt_budget.limit_input(user_input)
+        cache_key = self.cache.make_key(user_input, self.model_name, self.system_instruction)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            logger.info("Response cache hit (stream)")
+            yield cached
+            return
+
+        if not self.circuit_breaker.allow():
+            raise self._unavailable_error(self.circuit_breaker.retry_after())
+
+        started_at = time.monotonic()
+        try:
+            async for chunk in self._stream_once(user_input, cache_key, user_id):
+                yield chunk
+        except GeneratorExit:
+            # 用戶端中途離開，串流本身沒有失敗
+            self.circuit_breaker.record(False, time.monotonic() - started_at)
+            raise
+        except Exception as e:
+            self.circuit_breaker.record(self.circuit_breaker.is_failure(e), time.monotonic() - started_at)
+            raise
+        self.circuit_breaker.record(False, time.monotonic() - started_at)
+
+    async def _stream_once(self, user_input: str, cache_key: str, user_id: Optional[str] = None) -> AsyncIterator[str]:
+        started_at = time.monotonic()
+        first_chunk_at: Optional[float] = None
+        chunks = []
+        # 每個事件都可能帶 usageMetadata，最後一個才是整個回覆的用量
+        usage = None
+        cached_content = await self.context_cache.get_name(self.api_key, self.model_name, self.system_instruction)
+
+        wait = await self.rate_controller.acquire()
+        status_code = None
+        try:
+            client = self.http_pool.client
+            logger.info(
+                f"Streaming request to Gemini API (queued {wait:.3f}s): {user_input[:50]}..."
+            )
+
+            async with client.stream(
+                "POST",
+                self.stream_api_url,
+                params={"key": self.api_key, "alt": "sse"},
+                json=self._build_payload(user_input, cached_content=cached_content),
+            ) as response:
+                status_code = response.status_code
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(
+                        f"Gemini API error: Status {response.status_code}, "
+                        f"Response: {body.decode('utf-8', errors='replace')}"
+                    )
+                    if cached_content and response.status_code in CACHED_CONTENT_REJECTED_STATUSES:
+                        # 串流已開始回應無法重送，下一個請求會改帶完整的 system instruction
+                        self.context_cache.invalidate(self.model_name, self.system_instruction)
+                    raise self._status_error(response.status_code)
+
+                async for line in response.aiter_lines():
+                    # SSE 格式：每個事件為一行 "data: {json}"，事件之間以空行分隔
+                    if not line.startswith("data:"):
+                        continue
+                    data = json.loads(line[len("data:"):].strip())
+                    usage = data.get("usageMetadata") or usage
+                    parts = data["candidates"][0].get("content", {}).get("parts", [])
+                    text = "".join(part.get("text", "") for part in parts)
+                    if not text:
+                        continue
+
+                    if first_chunk_at is None:
+                        first_chunk_at = time.monotonic()
+                        logger.info(
+                            f"Gemini first token latency: {first_chunk_at - started_at:.3f}s"
+                        )
+                    chunks.append(text)
+                    yield text
+
+        except httpx.TimeoutException:
+            error_msg = "請求超時，請檢查網路連線"
+            logger.error(f"Timeout error: {error_msg}")
+            raise GeminiAPIError(error_msg)
+
+        except httpx.NetworkError as e:
+            logger.error(f"Network error: 網路連線錯誤: {str(e)}")
+            raise GeminiAPIError("無法連線到 AI 服務，請檢查網路連線")
+
+        except (KeyError, IndexError, json.JSONDecodeError) as e:
+            logger.error(f"Response parsing error: API 串流回應格式錯誤: {str(e)}")
+            raise ValueError("AI 服務回應格式異常，請稍後再試")
+
+        finally:
+            await self.rate_controller.release(status_code)
+
+        logger.info(
+            f"Successfully streamed AI response in {time.monotonic() - started_at:.3f}s"
+        )
+        self.token_usage.record(usage, user_id)
+        if chunks:
+            self.cache.set(cache_key, "".join(chunks))
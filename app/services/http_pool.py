@@ -0,0 +1,114 @@
+"""
+共用 HTTP 連線池
+由 app lifespan 建立並關閉長期存活的 httpx.AsyncClient，
+讓每次呼叫 Gemini API 都能重用既有的 TCP/TLS 連線，而不用重新握手。
+"""
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class HttpClientPool:
+    def __init__(
+        self,
+        name: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        timeout: float,
+        http2: bool = False,
+    ):
+        self.name = name
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+
+        if http2 and not _http2_available():
+            logger.warning(
+                f"HttpClientPool '{name}': HTTP/2 requested but 'h2' is not installed, "
+                "falling back to HTTP/1.1 (pip install 'httpx[http2]')"
+            )
+            http2 = False
+        self.http2 = http2
+
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 連線重用統計
+        self._requests = 0
+        self._new_connections = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # lifespan 尚未啟動時（例如單元測試、腳本）也能延遲建立
+        if self._client is None or self._client.is_closed:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:
+        logger.info(
+            f"HttpClientPool '{self.name}' creating client "
+            f"(http2={self.http2}, max_connections={self.limits.max_connections}, "
+            f"keepalive_expiry={self.limits.keepalive_expiry}s)"
+        )
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=self.limits,
+            http2=self.http2,
+            event_hooks={"request": [self._attach_trace]},
+        )
+
+    async def startup(self) -> None:
+        _ = self.client
+
+    async def shutdown(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logger.info(f"HttpClientPool '{self.name}' closed")
+
+    async def _attach_trace(self, request: httpx.Request) -> None:
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        # httpcore 的 trace 事件：每條新連線都會有 connect_tcp，每個請求都會送出 headers
+        if event_name == "connection.connect_tcp.started":
+            self._new_connections += 1
+        elif event_name in (
+            "http11.send_request_headers.started",
+            "http2.send_request_headers.started",
+        ):
+            self._requests += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "requests": self._requests,
+            "new_connections": self._new_connections,
+            "reused_connections": max(0, self._requests - self._new_connections),
+        }
+
+
+gemini_http_pool = HttpClientPool(
+    name="gemini",
+    max_connections=settings.GEMINI_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.GEMINI_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=settings.GEMINI_HTTP_KEEPALIVE_EXPIRY,
+    timeout=settings.GEMINI_TIMEOUT,
+    http2=settings.GEMINI_HTTP2,
+)
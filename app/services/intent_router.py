@@ -0,0 +1,262 @@
+"""
+意圖路由
+在呼叫 Gemini 之前先用關鍵字判斷訊息意圖：
+- 緊急狀況（胸痛、呼吸困難、輕生念頭等）：出現關鍵字就立即回覆固定的安全訊息；
+  但「如何預防中風」「胸悶要看哪一科」這類詢問資訊的問題，沒有「突然」「剛剛」「怎麼辦」等急迫字眼時交給 Gemini
+- 問候、道謝、使用說明：整則訊息幾乎都由關鍵字組成時直接回覆罐頭訊息
+- 其他開放式問題才交給 Gemini
+
+所有意圖的關鍵字編譯成一個 Aho-Corasick 自動機，掃描一次訊息即可找出全部命中的關鍵字，
+比逐一對每個關鍵字做 `in` 判斷更快，且不受關鍵字數量影響。
+"""
+import logging
+import unicodedata
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """多字串比對自動機：add() 加入關鍵字後 build()，再以 find_all() 掃描文字"""
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 每個狀態結束的關鍵字：(關鍵字長度, 值)
+        self._output: List[List[Tuple[int, Any]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value: Any) -> None:
+        if not pattern:
+            return
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((len(pattern), value))
+        self._built = False
+
+    def build(self) -> None:
+        # 以 BFS 計算失敗連結，並把失敗狀態的輸出併入，比對時不必再沿著連結往回找
+        queue = deque(self._goto[0].values())
+        for state in queue:
+            self._fail[state] = 0
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+        self._built = True
+
+    def find_all(self, text: str) -> List[Tuple[int, int, Any]]:
+        """回傳所有命中的 (起點, 終點, 值)，終點不含"""
+        if not self._built:
+            self.build()
+        matches = []
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._output[state]:
+                matches.append((index + 1 - length, index + 1, value))
+        return matches
+
+
+class Intent:
+    __slots__ = ("name", "keywords", "reply", "always", "urgent_markers", "inquiry_markers")
+
+    def __init__(
+        self,
+        name: str,
+        keywords: Sequence[str],
+        reply: str,
+        always: bool = False,
+        urgent_markers: Sequence[str] = (),
+        inquiry_markers: Sequence[str] = (),
+    ):
+        self.name = name
+        self.keywords = tuple(keywords)
+        self.reply = reply
+        # always：只要出現關鍵字就觸發（緊急狀況），否則要整則訊息幾乎都是關鍵字才觸發
+        self.always = always
+        # 訊息帶有 inquiry_markers（詢問資訊的問法）且沒有 urgent_markers（正在發生的描述）時不觸發
+        self.urgent_markers = tuple(urgent_markers)
+        self.inquiry_markers = tuple(inquiry_markers)
+
+
+EMERGENCY_REPLY = (
+    "⚠️ 您描述的情況可能是緊急狀況！\n"
+    "請立即撥打 119 或前往最近的急診室，不要等待線上回覆。\n"
+    "若身旁有人，請請他們陪同並協助聯絡家人。"
+)
+
+CRISIS_REPLY = (
+    "聽起來您現在很不好受，您並不孤單。\n"
+    "請撥打 1925 安心專線（24 小時免付費）或 1995 生命線，會有專人陪您聊聊。\n"
+    "若有立即危險，請撥打 119 或 110。"
+)
+
+GREETING_REPLY = (
+    "您好！我是 CARE 健康醫療資訊助手 😊\n"
+    "您可以問我身體不舒服該看哪一科、附近有哪些醫療院所，"
+    "也可以直接分享您的位置，我會幫您找最近的院所。"
+)
+
+THANKS_REPLY = "不客氣！祝您身體健康，有任何健康問題都歡迎再問我。"
+
+HELP_REPLY = (
+    "CARE 可以幫您：\n"
+    "1. 回答健康與就醫相關問題，例如「頭暈要看哪一科？」\n"
+    "2. 查詢醫療院所，例如「台北市大安區的眼科」\n"
+    "3. 分享位置（點選「+」→「位置資訊」）即可找到最近的醫療院所\n"
+    "如遇緊急狀況請直接撥打 119。"
+)
+
+# 依優先順序排列：同一則訊息命中多個意圖時，排在前面的優先
+DEFAULT_INTENTS = (
+    Intent(
+        "crisis",
+        ["想死", "不想活", "自殺", "輕生", "結束生命", "活不下去", "自殘", "割腕"],
+        CRISIS_REPLY,
+        always=True,
+    ),
+    Intent(
+        "emergency",
+        [
+            "胸痛", "胸口痛", "胸悶", "呼吸困難", "喘不過氣", "不能呼吸", "昏倒", "昏迷", "失去意識",
+            "叫不醒", "中風", "半邊無力", "嘴歪", "大量出血", "血流不止", "心臟病發", "抽搐", "癲癇發作",
+            "噎到", "休克", "過敏性休克", "吞藥", "農藥",
+        ],
+        EMERGENCY_REPLY,
+        always=True,
+        urgent_markers=[
+            "突然", "剛剛", "剛才", "現在", "正在", "一直", "越來越", "怎麼辦", "救命", "快點", "馬上",
+            "倒在", "喝了", "吞了", "送醫",
+        ],
+        inquiry_markers=[
+            "如何", "怎麼預防", "預防", "前兆", "徵兆", "原因", "是什麼", "什麼是", "哪一科", "哪科", "看什麼科",
+            "有哪些", "影響", "風險", "危險因子", "會不會", "容易", "注意什麼", "要注意", "殘留", "偶爾", "平常",
+        ],
+    ),
+    Intent(
+        "greeting",
+        ["你好", "您好", "哈囉", "嗨", "hi", "hello", "hey", "早安", "午安", "晚安", "早", "安安"],
+        GREETING_REPLY,
+    ),
+    Intent(
+        "thanks",
+        ["謝謝", "感謝", "多謝", "謝啦", "3q", "thx", "thanks", "thankyou", "辛苦了"],
+        THANKS_REPLY,
+    ),
+    Intent(
+        "help",
+        ["使用說明", "說明", "怎麼用", "如何使用", "功能", "你會什麼", "你能做什麼", "help", "選單"],
+        HELP_REPLY,
+    ),
+)
+
+
+def normalize_message(text: str) -> str:
+    """全形轉半形、轉小寫，並移除空白、標點與表情符號，只留下比對用的文字"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(
+        char for char in text
+        if not char.isspace() and unicodedata.category(char)[0] not in ("P", "S")
+    )
+
+
+class IntentRouter:
+    def __init__(self, intents: Sequence[Intent] = DEFAULT_INTENTS, min_coverage: float = 0.6):
+        self.intents = list(intents)
+        self.min_coverage = min_coverage
+        self._priority = {intent.name: rank for rank, intent in enumerate(self.intents)}
+        self._matcher = AhoCorasick()
+        for intent in self.intents:
+            for keyword in intent.keywords:
+                self._matcher.add(normalize_message(keyword), intent)
+        self._matcher.build()
+        # 緊急意圖的語氣判斷：值為 (意圖名稱, 是否為急迫字眼)
+        self._markers = AhoCorasick()
+        for intent in self.intents:
+            for marker in intent.urgent_markers:
+                self._markers.add(normalize_message(marker), (intent.name, True))
+            for marker in intent.inquiry_markers:
+                self._markers.add(normalize_message(marker), (intent.name, False))
+        self._markers.build()
+
+        self._total = 0
+        self._hits: Dict[str, int] = {intent.name: 0 for intent in self.intents}
+
+    @staticmethod
+    def _covered(spans: List[Tuple[int, int]]) -> int:
+        covered = 0
+        end_of_last = 0
+        for start, end in sorted(spans):
+            start = max(start, end_of_last)
+            if end > start:
+                covered += end - start
+                end_of_last = end
+        return covered
+
+    def _is_inquiry(self, intent: Intent, normalized: str) -> bool:
+        """詢問資訊的問題（例如「如何預防中風」），而不是描述正在發生的狀況"""
+        if not intent.inquiry_markers:
+            return False
+        found = {urgent for _, _, (name, urgent) in self._markers.find_all(normalized) if name == intent.name}
+        return False in found and True not in found
+
+    def classify(self, text: str) -> Optional[Intent]:
+        """
+        判斷訊息意圖
+
+        Returns:
+            Optional[Intent]: 命中的意圖；需要交給 Gemini 的開放式問題回傳 None
+        """
+        self._total += 1
+        normalized = normalize_message(text)
+        if not normalized:
+            return None
+
+        spans: Dict[str, List[Tuple[int, int]]] = {}
+        intents: Dict[str, Intent] = {}
+        for start, end, intent in self._matcher.find_all(normalized):
+            spans.setdefault(intent.name, []).append((start, end))
+            intents[intent.name] = intent
+
+        for name in sorted(spans, key=self._priority.__getitem__):
+            intent = intents[name]
+            if intent.always:
+                if self._is_inquiry(intent, normalized):
+                    continue
+            elif self._covered(spans[name]) / len(normalized) < self.min_coverage:
+                continue
+            self._hits[name] += 1
+            return intent
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        answered = sum(self._hits.values())
+        return {
+            "messages": self._total,
+            "answered_locally": answered,
+            "forwarded": self._total - answered,
+            "hit_rate": answered / self._total if self._total else 0.0,
+            **{f"hits_{name}": count for name, count in self._hits.items()},
+        }
+
+
+intent_router = IntentRouter(min_coverage=settings.INTENT_MIN_COVERAGE)
@@ -0,0 +1,229 @@
+"""
+背景工作佇列
+Webhook 驗證完簽名後只負責把事件丟進佇列，由固定數量的 worker 在背景處理，
+讓 LINE 平台可以在數毫秒內收到 200 OK，不必等待 Gemini 回覆。
+
+帶有 key（例如 user_id）的工作會進入該 key 專屬的「車道」：不同 key 的工作由多個
+worker 並行處理，同一個 key 的工作則依送入順序一個接一個執行，確保同一位使用者的
+訊息不會亂序回覆。
+
+各 key 輪流使用 worker：同一個 key 的工作處理完一個後，下一個排回佇列尾端，
+而不是由同一個 worker 連續處理；max_pending_per_key 則限制單一 key 可佔用的佇列深度，
+大量傳訊的使用者不會擠掉其他使用者的訊息。
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+JobFunc = Callable[..., Awaitable[Any]]
+Job = Tuple[JobFunc, Tuple[Any, ...], Optional[Hashable], float]
+
+
+class JobQueue:
+    def __init__(self, name: str, worker_count: int, maxsize: int, max_pending_per_key: int = 0):
+        self.name = name
+        self.worker_count = max(1, worker_count)
+        self.maxsize = max(1, maxsize)
+        # 0 代表不限制
+        self.max_pending_per_key = max(0, max_pending_per_key)
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._accepting = False
+        # 正在處理中的 key -> 排在它後面、尚未執行的同 key 工作
+        self._lanes: Dict[Hashable, Deque[Job]] = {}
+        # 佇列與所有車道中等待執行的工作總數，用來限制佇列深度
+        self._pending = 0
+        # key -> 該 key 尚未執行的工作數
+        self._key_pending: Dict[Hashable, int] = {}
+
+        # 背壓（backpressure）統計
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._rejected_per_key = 0
+        self._in_flight = 0
+        self._max_depth = 0
+        self._dequeued = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @property
+    def is_running(self) -> bool:
+        return self._accepting
+
+    async def start(self) -> None:
+        if self._accepting:
+            return
+        self._queue = asyncio.Queue()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"{self.name}-worker-{i}")
+            for i in range(self.worker_count)
+        ]
+        self._accepting = True
+        logger.info(
+            f"JobQueue '{self.name}' started with {self.worker_count} workers "
+            f"(maxsize={self.maxsize})"
+        )
+
+    def key_is_full(self, key: Optional[Hashable]) -> bool:
+        """key 是否已達 max_pending_per_key（submit 因此被拒絕時，佇列本身並沒有滿）"""
+        return (
+            key is not None
+            and bool(self.max_pending_per_key)
+            and self._key_pending.get(key, 0) >= self.max_pending_per_key
+        )
+
+    def submit(self, func: JobFunc, *args: Any, key: Optional[Hashable] = None) -> bool:
+        """
+        將工作放入佇列（不等待執行）
+
+        Args:
+            func: 要執行的 async 函式
+            *args: 傳給 func 的參數
+            key: 相同 key 的工作會依序執行；None 表示不需要排序
+
+        Returns:
+            bool: 成功排入佇列回傳 True；佇列已滿、key 已達上限或尚未啟動回傳 False
+        """
+        if not self._accepting:
+            logger.warning(f"JobQueue '{self.name}' is not running, job rejected")
+            self._rejected += 1
+            return False
+
+        if self._pending >= self.maxsize:
+            self._rejected += 1
+            logger.error(
+                f"JobQueue '{self.name}' is full ({self.maxsize}), job rejected"
+            )
+            return False
+
+        if self.key_is_full(key):
+            self._rejected += 1
+            self._rejected_per_key += 1
+            logger.warning(
+                f"JobQueue '{self.name}' key {key} has {self.max_pending_per_key} pending jobs, job rejected"
+            )
+            return False
+
+        job: Job = (func, args, key, time.monotonic())
+        if key is not None and key in self._lanes:
+            # 同一個 key 已有工作在處理或排隊，排在它後面
+            self._lanes[key].append(job)
+        else:
+            if key is not None:
+                self._lanes[key] = deque()
+            self._queue.put_nowait(job)
+
+        self._submitted += 1
+        self._pending += 1
+        if key is not None:
+            self._key_pending[key] = self._key_pending.get(key, 0) + 1
+        if self._pending > self._max_depth:
+            self._max_depth = self._pending
+        return True
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(index, job)
+                next_job = self._next_in_lane(job[2])
+                if next_job is not None:
+                    # 同 key 的下一個工作排到佇列尾端，讓其他 key 先輪到
+                    self._queue.put_nowait(next_job)
+            finally:
+                self._queue.task_done()
+
+    def _next_in_lane(self, key: Optional[Hashable]) -> Optional[Job]:
+        if key is None:
+            return None
+        lane = self._lanes.get(key)
+        if lane:
+            return lane.popleft()
+        self._lanes.pop(key, None)
+        return None
+
+    async def _run(self, index: int, job: Job) -> None:
+        func, args, key, enqueued_at = job
+        self._pending -= 1
+        if key is not None:
+            remaining = self._key_pending.get(key, 1) - 1
+            if remaining > 0:
+                self._key_pending[key] = remaining
+            else:
+                self._key_pending.pop(key, None)
+        wait = time.monotonic() - enqueued_at
+        self._dequeued += 1
+        self._total_wait += wait
+        if wait > self._max_wait:
+            self._max_wait = wait
+
+        self._in_flight += 1
+        try:
+            await func(*args)
+            self._completed += 1
+        except Exception as e:
+            self._failed += 1
+            logger.error(
+                f"JobQueue '{self.name}' worker {index} job failed: {e}",
+                exc_info=True,
+            )
+        finally:
+            self._in_flight -= 1
+
+    async def shutdown(self, timeout: float = 10.0) -> None:
+        """停止接收新工作，等待佇列中的工作處理完畢（最多 timeout 秒）後關閉 worker"""
+        if self._queue is None:
+            return
+        self._accepting = False
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+            logger.info(f"JobQueue '{self.name}' drained")
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"JobQueue '{self.name}' drain timed out after {timeout}s, "
+                f"{self._pending} jobs dropped"
+            )
+
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._lanes.clear()
+        self._key_pending.clear()
+        self._pending = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.worker_count,
+            "maxsize": self.maxsize,
+            "depth": self._pending,
+            "max_depth": self._max_depth,
+            "active_lanes": len(self._lanes),
+            "in_flight": self._in_flight,
+            "submitted": self._submitted,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "rejected_per_key": self._rejected_per_key,
+            "avg_wait_seconds": self._total_wait / self._dequeued if self._dequeued else 0.0,
+            "max_wait_seconds": self._max_wait,
+        }
+
+
+webhook_job_queue = JobQueue(
+    name="line-webhook",
+    worker_count=settings.WEBHOOK_WORKERS,
+    maxsize=settings.WEBHOOK_QUEUE_MAXSIZE,
+    max_pending_per_key=settings.WEBHOOK_QUEUE_MAX_PER_USER,
+)
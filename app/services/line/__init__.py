@@ -2,14 +2,25 @@
 LINE Bot 服務層
 提供 LINE Messaging API 相關的業務邏輯服務
 """
-from app.services.line.message_service import LineMessageService, line_message_service
-from app.services.line.token_manager import LineTokenManager, line_token_manager
-from app.services.line.event_handler import handle_text_message_async
+from app.services.line.message_service import LineMessageService
+from app.services.line.token_manager import LineTokenManager
+from app.services.line.messaging_client import LineMessagingClient, line_messaging_client
+from app.services.line.push_batcher import PushBatcher, line_push_batcher
+from app.services.line.loading_indicator import LoadingIndicator, line_loading_indicator
+from app.services.line.event_handler import handle_location_message_async, handle_text_message_async
+from app.services.line.deduplicator import EventDeduplicator, event_deduplicator
 
 __all__ = [
     "LineMessageService",
-    "line_message_service",
     "LineTokenManager",
-    "line_token_manager",
-    "handle_text_message_async"
+    "LineMessagingClient",
+    "line_messaging_client",
+    "PushBatcher",
+    "line_push_batcher",
+    "LoadingIndicator",
+    "line_loading_indicator",
+    "handle_text_message_async",
+    "handle_location_message_async",
+    "EventDeduplicator",
+    "event_deduplicator",
 ]
@@ -0,0 +1,183 @@
+"""
+Webhook 事件去重
+LINE 在我們回應太慢時會重送相同事件（delivery_context.is_redelivery = True），
+以每個事件的 webhookEventId 記錄已處理過的事件，重複的事件在進入
+handle_text_message_async 之前就丟棄，避免重複呼叫 Gemini 與重複回覆。
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.shared_state import LazySQLite, local_fallback
+
+logger = logging.getLogger(__name__)
+
+SUPPRESSED_EVENTS = registry.counter(
+    "care_webhook_events_suppressed_total",
+    "Webhook events dropped because their webhookEventId was already seen",
+)
+
+
+class MemorySeenSet:
+    """有時間期限、有容量上限的 seen-set"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._expires: "OrderedDict[str, float]" = OrderedDict()
+
+    def add_if_absent(self, event_id: str) -> bool:
+        """尚未看過則記錄並回傳 True，已看過回傳 False"""
+        now = time.monotonic()
+        # 依寫入順序排列，從最舊的開始清掉過期的
+        while self._expires:
+            oldest_id, expires_at = next(iter(self._expires.items()))
+            if expires_at > now:
+                break
+            del self._expires[oldest_id]
+
+        if event_id in self._expires:
+            return False
+        self._expires[event_id] = now + self.ttl
+        while len(self._expires) > self.max_entries:
+            self._expires.popitem(last=False)
+        return True
+
+    def discard(self, event_id: str) -> None:
+        self._expires.pop(event_id, None)
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+
+class SQLiteSeenSet:
+    """多個 worker 共用同一個檔案時使用"""
+
+    def __init__(self, path: str, ttl: float, max_entries: int, sweep_interval: float = 60.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.sweep_interval = sweep_interval
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+        self._db = LazySQLite(path, [
+            "CREATE TABLE IF NOT EXISTS webhook_events ("
+            "event_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_webhook_events_expires ON webhook_events (expires_at)",
+        ])
+        # 檔案忙碌時暫用：只能擋下送到同一個 worker 的重送事件
+        self._fallback = MemorySeenSet(ttl, self.max_entries)
+
+    @local_fallback
+    def add_if_absent(self, event_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            if time.monotonic() - self._last_sweep > self.sweep_interval:
+                self._sweep(now)
+            # 先刪掉同 id 的過期紀錄，再用 INSERT OR IGNORE 原子地判斷是否已存在
+            self._db.conn.execute(
+                "DELETE FROM webhook_events WHERE event_id = ? AND expires_at <= ?",
+                (event_id, now),
+            )
+            cursor = self._db.conn.execute(
+                "INSERT OR IGNORE INTO webhook_events (event_id, expires_at) VALUES (?, ?)",
+                (event_id, now + self.ttl),
+            )
+            return cursor.rowcount == 1
+
+    @local_fallback
+    def discard(self, event_id: str) -> None:
+        with self._lock:
+            self._db.conn.execute("DELETE FROM webhook_events WHERE event_id = ?", (event_id,))
+
+    def _sweep(self, now: float) -> None:
+        self._last_sweep = time.monotonic()
+        self._db.conn.execute("DELETE FROM webhook_events WHERE expires_at <= ?", (now,))
+        self._db.conn.execute(
+            "DELETE FROM webhook_events WHERE event_id NOT IN ("
+            "SELECT event_id FROM webhook_events ORDER BY expires_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    @local_fallback
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.conn.execute("SELECT COUNT(*) FROM webhook_events").fetchone()[0]
+
+
+class EventDeduplicator:
+    def __init__(self, seen_set, enabled: bool = True):
+        self.seen_set = seen_set
+        self.enabled = enabled
+        self._checked = 0
+        self._suppressed = 0
+        self._redeliveries = 0
+
+    def is_duplicate(self, event: Any) -> bool:
+        if not self.enabled:
+            return False
+
+        event_id: Optional[str] = getattr(event, "webhook_event_id", None)
+        if not event_id:
+            return False
+
+        delivery_context = getattr(event, "delivery_context", None)
+        if delivery_context is not None and getattr(delivery_context, "is_redelivery", False):
+            self._redeliveries += 1
+
+        self._checked += 1
+        try:
+            first_seen = self.seen_set.add_if_absent(event_id)
+        except Exception as e:
+            # 去重失敗時寧可重複處理，也不要漏掉使用者的訊息
+            logger.warning(f"Webhook dedup check failed for {event_id}: {e}")
+            return False
+
+        if first_seen:
+            return False
+        self._suppressed += 1
+        SUPPRESSED_EVENTS.inc()
+        logger.info(f"Duplicate webhook event suppressed: {event_id}")
+        return True
+
+    def forget(self, event: Any) -> None:
+        """事件最後沒有被處理（例如佇列已滿）時移除紀錄，讓 LINE 重送的同一事件可以再處理"""
+        event_id: Optional[str] = getattr(event, "webhook_event_id", None)
+        if not self.enabled or not event_id:
+            return
+        try:
+            self.seen_set.discard(event_id)
+        except Exception as e:
+            logger.warning(f"Webhook dedup forget failed for {event_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.seen_set).__name__,
+            "tracked_events": len(self.seen_set),
+            "checked": self._checked,
+            "redeliveries": self._redeliveries,
+            "suppressed": self._suppressed,
+        }
+
+
+def create_event_deduplicator() -> EventDeduplicator:
+    if settings.WEBHOOK_DEDUP_BACKEND == "sqlite":
+        seen_set = SQLiteSeenSet(
+            settings.WEBHOOK_DEDUP_SQLITE_PATH,
+            ttl=settings.WEBHOOK_DEDUP_TTL,
+            max_entries=settings.WEBHOOK_DEDUP_MAX_ENTRIES,
+        )
+    else:
+        seen_set = MemorySeenSet(
+            ttl=settings.WEBHOOK_DEDUP_TTL,
+            max_entries=settings.WEBHOOK_DEDUP_MAX_ENTRIES,
+        )
+    return EventDeduplicator(seen_set, enabled=settings.WEBHOOK_DEDUP_ENABLED)
+
+
+event_deduplicator = create_event_deduplicator()
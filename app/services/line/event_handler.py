@@ -1,11 +1,14 @@
-from linebot.v3.webhooks import MessageEvent
-from app.services.line.message_service import line_message_service
+from typing import TYPE_CHECKING
+from app.dependencies import get_line_message_service
 import logging
 
+if TYPE_CHECKING:
+    from linebot.v3.webhooks import MessageEvent
+
 logger = logging.getLogger(__name__)
 
 
-async def handle_text_message_async(event: MessageEvent):
+async def handle_text_message_async(event: "MessageEvent"):
     # 提取事件信息
     user_text = event.message.text
     reply_token = event.reply_token
@@ -14,8 +17,25 @@ async def handle_text_message_async(event: MessageEvent):
     logger.info(f"Received text message event from user {user_id}")
     
     # 委派給 message_service 處理完整流程
-    await line_message_service.process_and_reply(
+    await get_line_message_service().process_and_reply(
         user_text=user_text,
         reply_token=reply_token,
-        user_id=user_id
+        user_id=user_id,
+        event_timestamp=event.timestamp
+    )
+
+
+async def handle_location_message_async(event: "MessageEvent"):
+    # 使用者分享位置：直接以本地空間索引找最近的院所，不經過 Gemini
+    reply_token = event.reply_token
+    user_id = event.source.user_id if hasattr(event.source, 'user_id') else None
+
+    logger.info(f"Received location message event from user {user_id}")
+
+    await get_line_message_service().reply_nearby_facilities(
+        latitude=event.message.latitude,
+        longitude=event.message.longitude,
+        reply_token=reply_token,
+        user_id=user_id,
+        event_timestamp=event.timestamp
     )
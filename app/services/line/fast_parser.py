@@ -0,0 +1,63 @@
+"""
+Webhook 快速解析
+- 直接對原始 bytes 計算 HMAC 驗證簽名，不先 decode 成 str 再 encode 回去
+- json.loads 之後先用 dict 欄位做便宜的事件類型篩選，
+  只有我們實際會處理的事件才建立完整的 SDK model（Event.from_dict 是主要成本）
+- linebot SDK 在第一次解析時才 import（import 本身就要數百毫秒），不拖慢 app 啟動
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Iterable, List
+
+from app.core.metrics import observe_stage
+
+if TYPE_CHECKING:
+    from linebot.v3.webhooks import Event
+
+logger = logging.getLogger(__name__)
+
+
+class FastWebhookParser:
+    def __init__(self, channel_secret: str, handled_message_types: Iterable[str] = ("text",)):
+        self._secret = (channel_secret or "").encode("utf-8")
+        self.handled_message_types: FrozenSet[str] = frozenset(handled_message_types)
+
+    def verify(self, body: bytes, signature: str) -> bool:
+        digest = hmac.new(self._secret, body, hashlib.sha256).digest()
+        return hmac.compare_digest(signature.encode("utf-8"), base64.b64encode(digest))
+
+    def is_handled(self, raw_event: Dict[str, Any]) -> bool:
+        if raw_event.get("type") != "message":
+            return False
+        message = raw_event.get("message")
+        return isinstance(message, dict) and message.get("type") in self.handled_message_types
+
+    def parse(self, body: bytes, signature: str) -> List["Event"]:
+        """
+        驗證簽名並只解析會處理的事件
+
+        Raises:
+            InvalidSignatureError: 簽名不符
+        """
+        from linebot.v3.exceptions import InvalidSignatureError
+        from linebot.v3.webhooks import Event
+
+        with observe_stage("signature_verification"):
+            valid = self.verify(body, signature)
+        if not valid:
+            raise InvalidSignatureError(f"Invalid signature. signature={signature}")
+
+        with observe_stage("event_parsing"):
+            payload = json.loads(body)
+            events = []
+            for raw_event in payload.get("events", []):
+                if not self.is_handled(raw_event):
+                    continue
+                try:
+                    events.append(Event.from_dict(raw_event))
+                except ValueError as e:
+                    logger.warning(f"Failed to parse webhook event: {e}")
+            return events
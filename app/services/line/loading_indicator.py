@@ -0,0 +1,81 @@
+"""
+LINE 聊天室載入動畫
+Webhook 事件排入背景佇列後立即呼叫 loading animation API，使用者在等待 Gemini 回覆時
+會看到「輸入中」動畫；機器人送出訊息時動畫會自動消失。
+只支援一對一聊天，且在同一位使用者的動畫還沒結束前不重複呼叫。
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set
+
+from app.core.config import settings
+from app.core.metrics import record_error
+from app.services.line.messaging_client import LineMessagingClient, line_messaging_client
+
+logger = logging.getLogger(__name__)
+
+# 超過這個數量才清理已結束的動畫紀錄
+_PRUNE_THRESHOLD = 1000
+
+
+class LoadingIndicator:
+    def __init__(self, client: Optional[LineMessagingClient] = None, loading_seconds: int = 20, enabled: bool = True):
+        self.client = client or line_messaging_client
+        # API 只接受 5 到 60 之間、5 的倍數
+        self.loading_seconds = min(60, max(5, int(loading_seconds) // 5 * 5))
+        self.enabled = enabled
+        # user_id -> 動畫預計結束時間（monotonic）
+        self._active_until: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._started = 0
+        self._failed = 0
+
+    def trigger(self, user_id: Optional[str]) -> None:
+        """在背景顯示載入動畫，不阻塞 webhook 回應"""
+        if not self.enabled or not user_id:
+            return
+        now = time.monotonic()
+        if self._active_until.get(user_id, 0.0) > now:
+            return
+        if len(self._active_until) > _PRUNE_THRESHOLD:
+            self._active_until = {uid: until for uid, until in self._active_until.items() if until > now}
+        self._active_until[user_id] = now + self.loading_seconds
+
+        task = asyncio.create_task(self.show(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def clear(self, user_id: Optional[str]) -> None:
+        """機器人已送出訊息（動畫自動消失），下一則訊息需要重新顯示"""
+        if user_id:
+            self._active_until.pop(user_id, None)
+
+    async def show(self, user_id: str) -> bool:
+        from linebot.v3.messaging import ApiException, ShowLoadingAnimationRequest
+
+        try:
+            line_bot_api = await self.client.get_api()
+            await line_bot_api.show_loading_animation(
+                ShowLoadingAnimationRequest(chat_id=user_id, loading_seconds=self.loading_seconds)
+            )
+            self._started += 1
+            return True
+        except ApiException as e:
+            self._failed += 1
+            self._active_until.pop(user_id, None)
+            logger.warning(f"LINE loading animation error: Status {e.status}, Response: {e.body}")
+            record_error("line_loading", e.status)
+            return False
+        except Exception as e:
+            self._failed += 1
+            self._active_until.pop(user_id, None)
+            logger.warning(f"Failed to show LINE loading animation: {e}")
+            record_error("line_loading", None)
+            return False
+
+
+line_loading_indicator = LoadingIndicator(
+    loading_seconds=settings.LINE_LOADING_SECONDS,
+    enabled=settings.LINE_LOADING_ANIMATION_ENABLED,
+)
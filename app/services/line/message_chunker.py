@@ -0,0 +1,68 @@
+"""
+長訊息切段
+LINE 文字訊息上限 5000 字（以 UTF-16 code unit 計算，表情符號算兩個字），
+超過時整個 reply 會被拒絕。這裡依句子邊界把長回覆切成多則訊息，
+盡量不在句子中間斷開；單一句子本身超過上限時才硬切。
+"""
+import re
+from typing import List
+
+LINE_TEXT_LIMIT = 5000
+
+# 句尾標點（含後面的引號、括號）或換行之後切開
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;…\n])(?![」』）)\"'])|(?<=\. )")
+
+
+def utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _hard_split(text: str, limit: int) -> List[str]:
+    pieces = []
+    current = []
+    size = 0
+    for char in text:
+        width = 2 if ord(char) > 0xFFFF else 1
+        if size + width > limit:
+            pieces.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += width
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def split_message(text: str, limit: int = LINE_TEXT_LIMIT) -> List[str]:
+    """
+    依句子邊界切成每段不超過 limit 的多則訊息
+
+    Returns:
+        List[str]: 切好的訊息；未超過上限時只有一則
+    """
+    if utf16_length(text) <= limit:
+        return [text]
+
+    chunks: List[str] = []
+    current = ""
+    current_size = 0
+    for sentence in _SENTENCE_END.split(text):
+        if not sentence:
+            continue
+        size = utf16_length(sentence)
+        if current_size + size <= limit:
+            current += sentence
+            current_size += size
+            continue
+        if current:
+            chunks.append(current)
+        if size <= limit:
+            current, current_size = sentence, size
+        else:
+            *full, current = _hard_split(sentence, limit)
+            chunks.extend(full)
+            current_size = utf16_length(current)
+    if current:
+        chunks.append(current)
+    # 切點附近的換行與空白在 LINE 上沒有意義
+    return [chunk.strip() for chunk in chunks if chunk.strip()]
@@ -1,27 +1,75 @@
-from typing import Optional
-from linebot.v3.messaging import (
-    Configuration, ApiClient, MessagingApi, ReplyMessageRequest, TextMessage
-)
-from app.services.gemini_service import GeminiService
-from app.services.line.token_manager import line_token_manager
+import time
+from typing import TYPE_CHECKING, List, Optional
+from app.core.config import settings
+from app.core.metrics import observe_stage, record_error
+from app.dependencies import get_facility_index, get_gemini_service
+from app.services.conversation_store import MODEL_ROLE, USER_ROLE, conversation_store
+from app.services.facility_index import format_facilities, format_nearby
+from app.services.gemini_service import GeminiUnavailableError
+from app.services.intent_router import intent_router
+from app.services.line.loading_indicator import line_loading_indicator
+from app.services.line.message_chunker import split_message
+from app.services.line.messaging_client import line_messaging_client
+from app.services.line.push_batcher import MAX_MESSAGES_PER_REQUEST, line_push_batcher
+from app.services.user_rate_limiter import throttle_reply, user_rate_limiter
 import logging
 
+if TYPE_CHECKING:
+    from linebot.v3.messaging import ApiException, TextMessage
+
 logger = logging.getLogger(__name__)
 
+# Gemini 斷路器開啟時的降級回覆
+DEGRADED_REPLY = (
+    "抱歉，AI 服務目前暫時忙碌中，請稍後再試。\n"
+    "您也可以分享位置，我會幫您找最近的醫療院所；如遇緊急狀況請撥打 119。"
+)
+
 
 class LineMessageService:
-    def __init__(self):
-        self.gemini_service = GeminiService()
+    def __init__(
+        self, gemini_service=None, memory=None, facilities=None, router=None, push_batcher=None, rate_limiter=None
+    ):
+        # 與 /ai 路由共用同一個 GeminiService（同一份快取、速率控制與統計）
+        self.gemini_service = gemini_service or get_gemini_service()
+        # 每位使用者的對話記憶（ConversationStore 或 SQLiteConversationStore）
+        self.memory = memory or conversation_store
+        # 本地醫療院所索引，回覆前先查詢以提供可靠的院所資料
+        self.facilities = facilities if facilities is not None else get_facility_index()
+        # 簡單訊息與緊急狀況先由意圖路由直接回覆
+        self.router = router or intent_router
+        # reply token 過期時改以 push 送出，同一使用者的訊息會合併成一個請求
+        self.push_batcher = push_batcher or line_push_batcher
+        # 每位使用者需要 Gemini 的訊息有速率上限，超過時請使用者稍候
+        self.rate_limiter = rate_limiter or user_rate_limiter
         logger.info("LineMessageService initialized with Gemini AI")
     
-    async def process_and_reply(self, user_text: str, reply_token: str, user_id: Optional[str] = None) -> bool:
+    async def process_and_reply(
+        self,
+        user_text: str,
+        reply_token: str,
+        user_id: Optional[str] = None,
+        event_timestamp: Optional[int] = None,
+    ) -> bool:
         try:
-            # 1. 生成 AI 回覆
             logger.info(f"Processing message from user {user_id}: {user_text[:50]}...")
-            response_text = await self._generate_ai_response(user_text, user_id)
+            # 1. 問候、道謝、緊急狀況直接回覆；其他問題才生成 AI 回覆
+            intent = self.router.classify(user_text) if settings.INTENT_ROUTER_ENABLED else None
+            if intent is not None:
+                if intent.always:
+                    logger.warning(f"Urgent intent '{intent.name}' detected for user {user_id}")
+                else:
+                    logger.info(f"Intent '{intent.name}' answered locally for user {user_id}")
+                response_text = intent.reply
+            else:
+                retry_after = self.rate_limiter.acquire(user_id)
+                if retry_after > 0:
+                    response_text = throttle_reply(retry_after)
+                else:
+                    response_text = await self._generate_ai_response(user_text, user_id)
             
             # 2. 發送回覆到 LINE
-            success = await self._send_line_reply(reply_token, response_text, user_id)#send_line_reply 是回傳布林直，所以success 是布林直
+            success = await self._send_line_reply(reply_token, response_text, user_id, event_timestamp)#send_line_reply 是回傳布林直，所以success 是布林直
             
             if success:
                 logger.info(f"Successfully processed and replied to user {user_id}")
@@ -31,15 +79,68 @@ class LineMessageService:
         except Exception as e:
             logger.error(f"Error in process_and_reply: {e}", exc_info=True)
             # 嘗試發送錯誤訊息
-            await self._send_error_reply(reply_token, user_id)
+            await self._send_error_reply(reply_token, user_id, event_timestamp)
             return False
     
+    async def reply_nearby_facilities(
+        self,
+        latitude: float,
+        longitude: float,
+        reply_token: str,
+        user_id: Optional[str] = None,
+        event_timestamp: Optional[int] = None,
+    ) -> bool:
+        """依使用者分享的位置回覆最近的醫療院所（只查本地索引，不呼叫 Gemini）"""
+        with observe_stage("facility_lookup"):
+            results = self.facilities.nearest(
+                latitude,
+                longitude,
+                k=settings.FACILITY_NEARBY_LIMIT,
+                max_km=settings.FACILITY_NEARBY_MAX_KM,
+            )
+        logger.info(f"Found {len(results)} nearby facilities for user {user_id}")
+
+        if results:
+            message_text = f"離您最近的醫療院所：\n{format_nearby(results)}"
+        elif len(self.facilities) == 0:
+            message_text = "抱歉，目前尚未提供醫療院所資料，請稍後再試"
+        else:
+            message_text = (
+                f"抱歉，您附近 {settings.FACILITY_NEARBY_MAX_KM:g} 公里內找不到醫療院所，"
+                "如遇緊急情況請撥打 119"
+            )
+        return await self._send_line_reply(reply_token, message_text, user_id, event_timestamp)
+
     async def _generate_ai_response(self, user_text: str, user_id: Optional[str] = None) -> str:
         try:
-            ai_response = await self.gemini_service.generate_response(user_text)
-            logger.info(f"AI response generated for user {user_id}")
+            context = None
+            with observe_stage("facility_lookup"):
+                matches = self.facilities.search(user_text, limit=settings.FACILITY_CONTEXT_LIMIT)
+            if matches:
+                context = format_facilities(matches)
+                logger.info(f"Found {len(matches)} local facilities for user {user_id}")
+                if settings.FACILITY_ANSWER_MODE == "direct":
+                    return f"為您找到以下醫療院所：\n{context}"
+
+            history = self.memory.get_history(user_id) if user_id else []
+            ai_response = await self.gemini_service.generate_response(
+                user_text, history=history, context=context, user_id=user_id
+            )
+            logger.info(f"AI response generated for user {user_id} ({len(history)} turns of context)")
+
+            # 只記錄成功的對話，錯誤訊息不應該成為下一輪的上下文
+            if user_id:
+                self.memory.append(user_id, USER_ROLE, user_text)
+                self.memory.append(user_id, MODEL_ROLE, ai_response)
             return ai_response
             
+        except GeminiUnavailableError:
+            # 降級模式：Gemini 近期持續故障，不等待逾時，直接給固定回覆（有查到院所就一併附上）
+            logger.warning(f"Gemini unavailable, sending degraded reply to user {user_id}")
+            if context:
+                return f"AI 服務暫時忙碌中，先提供您查到的醫療院所資料：\n{context}"
+            return DEGRADED_REPLY
+
         except ValueError as e:
             # 處理已知的 API 錯誤（如配額超限、網路錯誤等）
             logger.error(f"API error: {e}")
@@ -50,39 +151,97 @@ class LineMessageService:
             logger.error(f"Unexpected error in _generate_ai_response: {e}", exc_info=True)
             return "抱歉，處理您的訊息時發生錯誤，請稍後再試"
     
-    async def _send_line_reply(self, reply_token: str, message_text: str, user_id: Optional[str] = None) -> bool:
+    async def _send_line_reply(
+        self,
+        reply_token: str,
+        message_text: str,
+        user_id: Optional[str] = None,
+        event_timestamp: Optional[int] = None,
+    ) -> bool:
+        from linebot.v3.messaging import TextMessage
+
+        # 超過 LINE 5000 字上限的回覆依句子切成多則，放在同一個 reply 請求中
+        messages = [TextMessage(text=chunk) for chunk in split_message(message_text)]
+        return await self._send_messages(reply_token, messages, user_id, event_timestamp)
+
+    @staticmethod
+    def _reply_token_expired(event_timestamp: Optional[int]) -> bool:
+        # event_timestamp 為 LINE webhook 事件的毫秒時間戳
+        if not event_timestamp:
+            return False
+        return time.time() - event_timestamp / 1000 > settings.LINE_REPLY_TOKEN_TTL
+
+    @staticmethod
+    def _is_invalid_reply_token(error: "ApiException") -> bool:
+        return error.status == 400 and "reply token" in str(error.body or "").lower()
+
+    def _push(self, user_id: Optional[str], messages: List["TextMessage"]) -> bool:
+        """改用 push 送出（由 PushBatcher 合併後背景送出）；無法 push 時回傳 False"""
+        if not user_id or not settings.LINE_PUSH_FALLBACK_ENABLED:
+            return False
+        self.push_batcher.enqueue(user_id, messages)
+        line_loading_indicator.clear(user_id)
+        return True
+
+    async def _send_messages(
+        self,
+        reply_token: str,
+        messages: List["TextMessage"],
+        user_id: Optional[str] = None,
+        event_timestamp: Optional[int] = None,
+    ) -> bool:
+        from linebot.v3.messaging import ApiException, ReplyMessageRequest
+
+        # reply token 已經放太久（例如 Gemini 很慢或佇列很長），直接 push，省下一次必定失敗的請求
+        if self._reply_token_expired(event_timestamp) and self._push(user_id, messages):
+            logger.warning(f"Reply token for user {user_id} likely expired, sent via push")
+            return True
+
+        # 一次 reply 最多五則訊息，多出來的改用 push 接著送
+        reply_messages = messages[:MAX_MESSAGES_PER_REQUEST]
+        overflow = messages[MAX_MESSAGES_PER_REQUEST:]
         try:
-            # 獲取 LINE access token
-            access_token = line_token_manager.get_token()
-            
-            # 初始化 LINE Messaging API
-            line_config = Configuration(access_token=access_token)
-            with ApiClient(line_config) as api_client:
-                line_bot_api = MessagingApi(api_client)
-                line_bot_api.reply_message(
+            # 取得共用的非同步 LINE Messaging API（token 換發時才會重建）
+            line_bot_api = await line_messaging_client.get_api()
+            with observe_stage("line_reply"):
+                await line_bot_api.reply_message(
                     ReplyMessageRequest(
                         reply_token=reply_token,
-                        messages=[TextMessage(text=message_text)]
+                        messages=reply_messages
                     )
                 )
             
             logger.info(f"Message sent to LINE for user {user_id}")
+            # 送出訊息後載入動畫會自動消失
+            line_loading_indicator.clear(user_id)
+            if overflow:
+                self._push(user_id, overflow)
             return True
             
         except ValueError as e:
             logger.error(f"Failed to get LINE token: {e}")
+            record_error("line_token", None)
+            return False
+
+        except ApiException as e:
+            logger.error(f"LINE API error: Status {e.status}, Response: {e.body}")
+            record_error("line_reply", e.status)
+            if self._is_invalid_reply_token(e) and self._push(user_id, messages):
+                logger.warning(f"Reply token for user {user_id} expired, falling back to push")
+                return True
             return False
             
         except Exception as e:
             logger.error(f"Failed to send LINE message: {e}", exc_info=True)
+            record_error("line_reply", None)
             return False
     
-    async def _send_error_reply(self, reply_token: str, user_id: Optional[str] = None) -> bool:
+    async def _send_error_reply(
+        self, reply_token: str, user_id: Optional[str] = None, event_timestamp: Optional[int] = None
+    ) -> bool:
         try:
             error_message = "抱歉，處理您的訊息時發生錯誤，請稍後再試"
-            return await self._send_line_reply(reply_token, error_message, user_id)
+            return await self._send_line_reply(reply_token, error_message, user_id, event_timestamp)
         except Exception as e:
             logger.error(f"Failed to send error reply: {e}")
             return False
-
-line_message_service = LineMessageService()
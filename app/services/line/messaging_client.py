@@ -0,0 +1,80 @@
+"""
+LINE Messaging API 非同步客戶端
+整個服務共用一個 AsyncApiClient（底層為 aiohttp 連線池），
+只有在 LineTokenManager 換發新的 access token 時才重新建立。
+"""
+import asyncio
+import logging
+from typing import TYPE_CHECKING, List, Optional
+
+from app.core.config import settings
+from app.dependencies import get_line_token_manager
+from app.services.line.token_manager import LineTokenManager
+
+if TYPE_CHECKING:
+    from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi
+
+logger = logging.getLogger(__name__)
+
+
+class LineMessagingClient:
+    def __init__(self, token_manager: Optional[LineTokenManager] = None):
+        # 未指定時第一次呼叫 API 才取得共用的 LineTokenManager
+        self._token_manager = token_manager
+
+        self._api_client: Optional["AsyncApiClient"] = None
+        self._messaging_api: Optional["AsyncMessagingApi"] = None
+        self._access_token: Optional[str] = None
+        # token 換發後被替換下來的舊 client，可能還有請求在使用，延後到下次換發或關閉時才釋放
+        self._retired: List["AsyncApiClient"] = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def token_manager(self) -> LineTokenManager:
+        if self._token_manager is None:
+            self._token_manager = get_line_token_manager()
+        return self._token_manager
+
+    async def get_api(self) -> "AsyncMessagingApi":
+        access_token = await self.token_manager.get_token_async()
+        if self._messaging_api is not None and access_token == self._access_token:
+            return self._messaging_api
+
+        async with self._lock:
+            if self._messaging_api is None or access_token != self._access_token:
+                await self._rebuild(access_token)
+            return self._messaging_api
+
+    async def _rebuild(self, access_token: str) -> None:
+        # linebot.v3.messaging 的 import 很重，第一次呼叫 API 時才載入（lifespan 會在背景預先載入）
+        from linebot.v3.messaging import AsyncApiClient, AsyncMessagingApi, Configuration
+
+        await self._close_retired()
+        if self._api_client is not None:
+            self._retired.append(self._api_client)
+            logger.info("LINE access token rotated, rebuilding Messaging API client")
+
+        self._api_client = AsyncApiClient(
+            Configuration(access_token=access_token, host=settings.LINE_API_BASE_URL)
+        )
+        self._messaging_api = AsyncMessagingApi(self._api_client)
+        self._access_token = access_token
+
+    async def _close_retired(self) -> None:
+        while self._retired:
+            client = self._retired.pop()
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close retired LINE API client: {e}")
+
+    async def close(self) -> None:
+        await self._close_retired()
+        if self._api_client is not None:
+            await self._api_client.close()
+        self._api_client = None
+        self._messaging_api = None
+        self._access_token = None
+
+
+line_messaging_client = LineMessagingClient()
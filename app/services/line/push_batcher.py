@@ -0,0 +1,156 @@
+"""
+LINE push 訊息批次合併
+reply token 過期時改用 push API 依 user_id 送出回覆；push 會計入每月訊息額度，
+因此同一位使用者在短時間內（LINE_PUSH_BATCH_WINDOW 秒）要送的訊息會先暫存，
+合併成一個最多五則訊息的 push 請求（LINE 的上限），減少 API 呼叫次數。
+
+enqueue() 不等待實際送出，讓同一位使用者的下一則訊息可以繼續處理並合併進同一批；
+服務關閉時由 lifespan 呼叫 close() 送出剩餘的訊息。
+"""
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.core.metrics import observe_stage, record_error
+from app.services.line.messaging_client import LineMessagingClient, line_messaging_client
+
+logger = logging.getLogger(__name__)
+
+# LINE reply / push 單次請求最多五則訊息
+MAX_MESSAGES_PER_REQUEST = 5
+
+
+class PushBatcher:
+    def __init__(
+        self,
+        client: Optional[LineMessagingClient] = None,
+        window: float = 0.5,
+        max_messages: int = MAX_MESSAGES_PER_REQUEST,
+    ):
+        self.client = client or line_messaging_client
+        self.window = window
+        self.max_messages = max(1, min(max_messages, MAX_MESSAGES_PER_REQUEST))
+        # user_id -> 尚未送出的 (訊息, 完成通知)
+        self._pending: Dict[str, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[str, asyncio.Task] = {}
+        # 同一位使用者的批次依序送出，確保訊息順序
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # 持有或等待各使用者鎖的 _flush 數量，降為 0 時才移除鎖
+        self._lock_users: Dict[str, int] = {}
+        # 湊滿一批立即送出的 task，保留參考避免被回收
+        self._flushing: Set[asyncio.Task] = set()
+
+        self._enqueued = 0
+        self._requests = 0
+        self._failed_requests = 0
+
+    def enqueue(self, user_id: str, messages: Sequence[Any]) -> asyncio.Future:
+        """
+        排入要 push 給使用者的訊息（不等待送出）
+
+        Returns:
+            asyncio.Future: 這些訊息全部送出後為 True，任一請求失敗為 False
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        if not messages:
+            done.set_result(True)
+            return done
+
+        pending = self._pending.setdefault(user_id, [])
+        for message in messages[:-1]:
+            pending.append((message, None))
+        pending.append((messages[-1], done))
+        self._enqueued += len(messages)
+
+        if len(pending) >= self.max_messages:
+            # 已經湊滿一個請求，不必再等
+            self._cancel_timer(user_id)
+            task = asyncio.create_task(self._flush(user_id))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+        elif user_id not in self._timers:
+            self._timers[user_id] = asyncio.create_task(self._flush_later(user_id))
+        return done
+
+    def _cancel_timer(self, user_id: str) -> None:
+        timer = self._timers.pop(user_id, None)
+        if timer is not None and timer is not asyncio.current_task():
+            timer.cancel()
+
+    async def _flush_later(self, user_id: str) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(user_id, None)
+        await self._flush(user_id)
+
+    async def _flush(self, user_id: str) -> None:
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        self._lock_users[user_id] = self._lock_users.get(user_id, 0) + 1
+        try:
+            async with lock:
+                pending = self._pending.pop(user_id, [])
+                ok = True
+                for start in range(0, len(pending), self.max_messages):
+                    chunk = pending[start:start + self.max_messages]
+                    ok = await self._push(user_id, [message for message, _ in chunk]) and ok
+                    for _, done in chunk:
+                        # 一組訊息可能跨兩個請求，以最後一則所在請求送出時的累計結果通知
+                        if done is not None and not done.done():
+                            done.set_result(ok)
+        finally:
+            # lock.locked() 在鎖剛交給下一個等待者時仍是 False，不能用來判斷是否還有人在用
+            remaining = self._lock_users[user_id] - 1
+            if remaining:
+                self._lock_users[user_id] = remaining
+            else:
+                del self._lock_users[user_id]
+                self._locks.pop(user_id, None)
+
+    async def _push(self, user_id: str, messages: List[Any]) -> bool:
+        from linebot.v3.messaging import ApiException, PushMessageRequest
+
+        self._requests += 1
+        try:
+            line_bot_api = await self.client.get_api()
+            with observe_stage("line_push"):
+                # retry key 讓 LINE 在重送時不會重複推播
+                await line_bot_api.push_message(
+                    PushMessageRequest(to=user_id, messages=messages),
+                    x_line_retry_key=str(uuid.uuid4()),
+                )
+            logger.info(f"Pushed {len(messages)} messages to user {user_id}")
+            return True
+        except ApiException as e:
+            self._failed_requests += 1
+            logger.error(f"LINE push error: Status {e.status}, Response: {e.body}")
+            record_error("line_push", e.status)
+            return False
+        except Exception as e:
+            self._failed_requests += 1
+            logger.error(f"Failed to push LINE messages: {e}", exc_info=True)
+            record_error("line_push", None)
+            return False
+
+    async def close(self) -> None:
+        """送出所有暫存中的訊息"""
+        for user_id in list(self._timers):
+            self._cancel_timer(user_id)
+        await asyncio.gather(
+            *self._flushing,
+            *(self._flush(user_id) for user_id in list(self._pending)),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self.window,
+            "pending_users": len(self._pending),
+            "messages": self._enqueued,
+            "requests": self._requests,
+            "failed_requests": self._failed_requests,
+            "messages_per_request": self._enqueued / self._requests if self._requests else 0.0,
+        }
+
+
+line_push_batcher = PushBatcher(window=settings.LINE_PUSH_BATCH_WINDOW)
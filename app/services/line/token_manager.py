@@ -1,83 +1,265 @@
+import asyncio
+import json
+import os
+import time
+import uuid
 import requests
+import httpx
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from app.core.config import settings
+from app.core.metrics import observe_stage, record_error
+from app.services.shared_state import shared_state as default_shared_state
 
 logger = logging.getLogger(__name__)
 
+TOKEN_URL = f"{settings.LINE_API_BASE_URL}/oauth2/v3/token"
+
+# 共用狀態中的 token 與換發鎖名稱
+TOKEN_STATE_KEY = "line:access_token"
+REFRESH_LOCK_NAME = "line:token_refresh"
+
 
 class LineTokenManager:
-    def __init__(self):
+    def __init__(self, state=None):
         self.channel_id = settings.LINE_CHANNEL_ID
         self.channel_secret = settings.LINE_CHANNEL_SECRET
-        
+        # token 存在共用狀態中，重啟後或多個 worker 都使用同一個 token
+        self.state = state or default_shared_state
+        # 換發時先取得跨 worker 的鎖，同一時間只有一個 worker 會打 LINE OAuth API
+        self.refresh_lock_timeout = settings.LINE_TOKEN_REFRESH_LOCK_TIMEOUT
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        # 在 5 分鐘緩衝之前多久就先在背景換發
+        self.renew_before = timedelta(seconds=settings.LINE_TOKEN_RENEW_BEFORE)
+
         # Token 緩存
         self._access_token: Optional[str] = None
         self._token_expires_at: Optional[datetime] = None
-    
+
+        # 進行中的非同步刷新（所有等待者共用同一個），以及背景換發的 task
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._renewal_task: Optional[asyncio.Task] = None
+
+        self._load_cached_token()
+
     def get_token(self) -> str:
+        """同步版本，供腳本等非 async 環境使用；async 程式碼請用 get_token_async"""
         # 檢查緩存是否有效
         if self._is_token_valid():
             logger.debug("使用緩存的 access token")
             return self._access_token
-        
+
         # 獲取新的 token
         logger.info("緩存的 token 已過期或不存在，正在獲取新的 token...")
         return self._fetch_new_token()
-    
+
+    async def get_token_async(self) -> str:
+        if self._is_token_valid():
+            logger.debug("使用緩存的 access token")
+            return self._access_token
+
+        logger.info("緩存的 token 已過期或不存在，正在獲取新的 token...")
+        return await self._refresh_single_flight()
+
     def _is_token_valid(self) -> bool:
         if not self._access_token or not self._token_expires_at:
             return False
-        
+
         # 提前 5 分鐘刷新，避免在使用時過期
         buffer_time = timedelta(minutes=5)
         return datetime.now() < (self._token_expires_at - buffer_time)
-    
-    def _fetch_new_token(self) -> str:
+
+    def _check_credentials(self) -> None:
         if not self.channel_id or not self.channel_secret:
             raise ValueError(
                 "無法獲取 token：LINE_CHANNEL_ID 和 LINE_CHANNEL_SECRET 未設定。"
                 "請在 .env 檔案中設定這些變數。"
             )
-        
-        url = "https://api.line.me/oauth2/v3/token"
-        headers = {
-            "Content-Type": "application/x-www-form-urlencoded"
-        }
-        data = {
+
+    def _token_request_data(self) -> Dict[str, str]:
+        return {
             "grant_type": "client_credentials",
             "client_id": self.channel_id,
             "client_secret": self.channel_secret
         }
-        
+
+    def _apply_token_response(self, result: Dict[str, Any]) -> str:
+        access_token = result.get("access_token")
+        expires_in = result.get("expires_in", 2592000)  # 預設 30 天 (秒)
+
+        if not access_token:
+            raise ValueError("API 返回的響應中沒有 access_token")
+
+        # 緩存 token 和過期時間
+        self._access_token = access_token
+        self._token_expires_at = datetime.now() + timedelta(seconds=expires_in)
+        self._save_cached_token()
+
+        logger.info(
+            f"成功獲取新的 access token，"
+            f"有效期至: {self._token_expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
+        )
+
+        return access_token
+
+    def _fetch_new_token(self) -> str:
+        self._check_credentials()
+
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+
         try:
-            response = requests.post(url, headers=headers, data=data, timeout=10)
+            with observe_stage("token_refresh"):
+                response = requests.post(
+                    TOKEN_URL, headers=headers, data=self._token_request_data(), timeout=10
+                )
             response.raise_for_status()
-            
-            result = response.json()
-            access_token = result.get("access_token")
-            expires_in = result.get("expires_in", 2592000)  # 預設 30 天 (秒)
-            
-            if not access_token:
-                raise ValueError("API 返回的響應中沒有 access_token")
-            
-            # 緩存 token 和過期時間
-            self._access_token = access_token
-            self._token_expires_at = datetime.now() + timedelta(seconds=expires_in)
-            
-            logger.info(
-                f"成功獲取新的 access token，"
-                f"有效期至: {self._token_expires_at.strftime('%Y-%m-%d %H:%M:%S')}"
-            )
-            
-            return access_token
-            
+            return self._apply_token_response(response.json())
+
         except requests.exceptions.RequestException as e:
             error_msg = f"獲取 access token 失敗: {e}"
             if hasattr(e, 'response') and e.response is not None:
                 error_msg += f"\nAPI 響應: {e.response.text}"
+                record_error("token_refresh", e.response.status_code)
+            else:
+                record_error("token_refresh", None)
             logger.error(error_msg)
             raise ValueError(error_msg)
-        
-line_token_manager = LineTokenManager()
+
+    async def _refresh_single_flight(self) -> str:
+        # 同一時間只會有一個刷新請求，其他呼叫者等待同一個結果
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch_new_token_async())
+        # shield：單一等待者被取消時不影響其他人共用的刷新
+        return await asyncio.shield(self._refresh_task)
+
+    async def _fetch_new_token_async(self) -> str:
+        self._check_credentials()
+
+        # 其他 worker 可能已經換發並寫入共用狀態，若還不到換發時間就直接使用
+        if self._has_fresh_shared_token():
+            logger.info("使用其他程序已換發的 access token")
+            return self._access_token
+
+        locked = await self._acquire_refresh_lock()
+        try:
+            # 等鎖的期間其他 worker 可能已經換發完成
+            if self._has_fresh_shared_token():
+                logger.info("使用其他程序已換發的 access token")
+                return self._access_token
+
+            async with httpx.AsyncClient(timeout=10.0) as client:
+                with observe_stage("token_refresh"):
+                    response = await client.post(TOKEN_URL, data=self._token_request_data())
+                response.raise_for_status()
+                return self._apply_token_response(response.json())
+
+        except httpx.HTTPError as e:
+            error_msg = f"獲取 access token 失敗: {e}"
+            if isinstance(e, httpx.HTTPStatusError):
+                error_msg += f"\nAPI 響應: {e.response.text}"
+                record_error("token_refresh", e.response.status_code)
+            else:
+                record_error("token_refresh", None)
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+        finally:
+            if locked:
+                self._release_refresh_lock()
+
+    def _has_fresh_shared_token(self) -> bool:
+        return self._load_cached_token() and self._seconds_until_renewal() > 0
+
+    async def _acquire_refresh_lock(self) -> bool:
+        """
+        取得跨 worker 的換發鎖
+
+        Returns:
+            bool: 是否取得鎖；等待超過 refresh_lock_timeout 仍拿不到（持有者可能卡住）時回傳 False，
+            由呼叫端自行換發，避免所有 worker 一起沒有 token 可用
+        """
+        deadline = time.monotonic() + self.refresh_lock_timeout
+        while True:
+            try:
+                # 鎖的期限略長於 OAuth 請求逾時，持有者當掉時會自動釋放
+                if self.state.acquire(REFRESH_LOCK_NAME, self._owner, ttl=self.refresh_lock_timeout):
+                    return True
+            except Exception as e:
+                logger.warning(f"取得 token 換發鎖失敗，直接換發: {e}")
+                return False
+            if time.monotonic() >= deadline or self._has_fresh_shared_token():
+                return False
+            await asyncio.sleep(0.2)
+
+    def _release_refresh_lock(self) -> None:
+        try:
+            self.state.release(REFRESH_LOCK_NAME, self._owner)
+        except Exception as e:
+            logger.warning(f"釋放 token 換發鎖失敗: {e}")
+
+    def _load_cached_token(self) -> bool:
+        try:
+            raw = self.state.get(TOKEN_STATE_KEY)
+            if raw is None:
+                return False
+            cached = json.loads(raw)
+            access_token = cached["access_token"]
+            expires_at = datetime.fromtimestamp(cached["expires_at"])
+        except Exception as e:
+            logger.warning(f"讀取共用 token 失敗: {e}")
+            return False
+
+        self._access_token = access_token
+        self._token_expires_at = expires_at
+        return True
+
+    def _save_cached_token(self) -> None:
+        expires_at = self._token_expires_at.timestamp()
+        try:
+            self.state.set(
+                TOKEN_STATE_KEY,
+                json.dumps({"access_token": self._access_token, "expires_at": expires_at}),
+                ttl=max(0.0, expires_at - time.time()),
+            )
+        except Exception as e:
+            # 寫入失敗時 token 仍保留在記憶體，只是其他 worker 看不到
+            logger.warning(f"寫入共用 token 失敗: {e}")
+
+    def _seconds_until_renewal(self) -> float:
+        if not self._access_token or not self._token_expires_at:
+            return 0.0
+        renew_at = self._token_expires_at - timedelta(minutes=5) - self.renew_before
+        return max(0.0, (renew_at - datetime.now()).total_seconds())
+
+    async def _renewal_loop(self) -> None:
+        min_interval = 0.0
+        while True:
+            # 第一次立即換發（預熱），之後至少間隔 60 秒，避免 token 有效期過短時不斷換發
+            await asyncio.sleep(max(self._seconds_until_renewal(), min_interval))
+            min_interval = 60.0
+            try:
+                # 到了換發時間，即使 token 還沒進入 5 分鐘緩衝也直接換發
+                await self._refresh_single_flight()
+            except Exception as e:
+                logger.error(f"背景換發 access token 失敗，60 秒後重試: {e}")
+
+    def start_background_refresh(self) -> None:
+        """在 token 進入 5 分鐘緩衝之前，於背景先行換發"""
+        if self._renewal_task is not None and not self._renewal_task.done():
+            return
+        if not self.channel_id or not self.channel_secret:
+            logger.info("LINE 憑證未設定，不啟動背景換發 token")
+            return
+        self._renewal_task = asyncio.create_task(self._renewal_loop())
+
+    async def stop_background_refresh(self) -> None:
+        if self._renewal_task is None:
+            return
+        self._renewal_task.cancel()
+        try:
+            await self._renewal_task
+        except asyncio.CancelledError:
+            pass
+        self._renewal_task = None
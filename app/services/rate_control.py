@@ -0,0 +1,178 @@
+"""
+Gemini 呼叫流量控制
+- TokenBucket：限制每秒送出的請求數，避免瞬間湧入的訊息把配額打爆
+- AdaptiveConcurrencyLimiter：限制同時進行中的請求數，遇到 429/5xx 時縮小視窗，
+  成功時再慢慢放大（AIMD：加法增加、乘法減少）
+- RateController：組合上面兩者，並記錄每個請求的排隊等待時間
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 代表 Gemini 過載、需要縮小併發視窗的狀態碼
+OVERLOAD_STATUS_CODES = frozenset({429, 500, 503})
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self) -> None:
+        # 用 lock 讓等待者依先來後到取得 token
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AdaptiveConcurrencyLimiter:
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        decrease_factor: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+        # 同一波過載通常會連續收到多個錯誤，冷卻時間內只縮小一次
+        self.cooldown = cooldown
+
+        self._limit = self.max_limit
+        self._in_flight = 0
+        self._successes_since_increase = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self._limit)
+            self._in_flight += 1
+
+    async def release(self, overloaded: bool = False, succeeded: bool = False) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            if overloaded:
+                self._decrease()
+            elif succeeded:
+                self._increase()
+            self._condition.notify_all()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        new_limit = max(self.min_limit, int(self._limit * self.decrease_factor))
+        if new_limit != self._limit:
+            logger.warning(f"Gemini overloaded, concurrency limit {self._limit} -> {new_limit}")
+        self._limit = new_limit
+        self._successes_since_increase = 0
+
+    def _increase(self) -> None:
+        if self._limit >= self.max_limit:
+            return
+        # 每累積「目前視窗大小」次成功才 +1，大約每一輪往返放大一次
+        self._successes_since_increase += 1
+        if self._successes_since_increase >= self._limit:
+            self._limit += 1
+            self._successes_since_increase = 0
+            logger.info(f"Gemini concurrency limit increased to {self._limit}")
+
+
+class RateController:
+    def __init__(
+        self,
+        limiter: AdaptiveConcurrencyLimiter,
+        bucket: Optional[TokenBucket] = None,
+    ):
+        self.limiter = limiter
+        self.bucket = bucket
+
+        self._requests = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+        self._overloaded = 0
+
+    async def acquire(self) -> float:
+        """取得送出請求的許可，回傳排隊等待的秒數"""
+        started_at = time.monotonic()
+        await self.limiter.acquire()
+        if self.bucket is not None:
+            try:
+                await self.bucket.acquire()
+            except BaseException:
+                await self.limiter.release()
+                raise
+
+        wait = time.monotonic() - started_at
+        self._requests += 1
+        self._total_wait += wait
+        if wait > self._max_wait:
+            self._max_wait = wait
+        return wait
+
+    async def release(self, status_code: Optional[int]) -> None:
+        """
+        歸還許可並依結果調整併發視窗
+
+        Args:
+            status_code: Gemini 回應的 HTTP 狀態碼；連線失敗或逾時為 None
+        """
+        overloaded = status_code in OVERLOAD_STATUS_CODES
+        if overloaded:
+            self._overloaded += 1
+        await self.limiter.release(overloaded=overloaded, succeeded=status_code == 200)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": self.limiter.limit,
+            "in_flight": self.limiter.in_flight,
+            "requests": self._requests,
+            "overloaded_responses": self._overloaded,
+            "avg_wait_seconds": self._total_wait / self._requests if self._requests else 0.0,
+            "max_wait_seconds": self._max_wait,
+        }
+
+
+def create_gemini_rate_controller() -> RateController:
+    limiter = AdaptiveConcurrencyLimiter(
+        max_limit=settings.GEMINI_MAX_CONCURRENCY,
+        min_limit=settings.GEMINI_MIN_CONCURRENCY,
+    )
+    bucket = None
+    if settings.GEMINI_RATE_LIMIT_RPS > 0:
+        bucket = TokenBucket(
+            rate=settings.GEMINI_RATE_LIMIT_RPS,
+            capacity=settings.GEMINI_RATE_LIMIT_BURST,
+        )
+    return RateController(limiter, bucket)
+
+
+gemini_rate_controller = create_gemini_rate_controller()
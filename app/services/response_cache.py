@@ -0,0 +1,203 @@
+"""
+Gemini 回應快取
+長者常重複詢問相同的問題，將「正規化後的問題 + 模型名稱 + system instruction」
+作為 key 快取 AI 回覆，命中時可省下 Gemini 的費用與數秒延遲。
+提供記憶體（預設）與 SQLite 兩種後端，皆支援 TTL 與 LRU 淘汰。
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.services.shared_state import LazySQLite, local_fallback
+
+logger = logging.getLogger(__name__)
+
+# 句尾標點不影響問題語意，正規化時移除
+_TRAILING_PUNCTUATION = "?？!！。.~～、,，"
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    # NFKC 會把全形英數字轉成半形，讓「ＡＢＣ」和「ABC」視為相同
+    normalized = unicodedata.normalize("NFKC", text)
+    normalized = _WHITESPACE.sub(" ", normalized).strip().lower()
+    return normalized.rstrip(_TRAILING_PUNCTUATION).strip()
+
+
+class MemoryCacheBackend:
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._data: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[Optional[str], bool]:
+        """回傳 (value, expired)"""
+        item = self._data.get(key)
+        if item is None:
+            return None, False
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None, True
+        self._data.move_to_end(key)
+        return value, False
+
+    def set(self, key: str, value: str, ttl: float) -> int:
+        """寫入並回傳因容量不足被淘汰的筆數"""
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        evicted = 0
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._db = LazySQLite(path, [
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS idx_response_cache_last_access "
+            "ON response_cache (last_access)",
+        ])
+        # 檔案忙碌時暫用，效果等同快取未命中
+        self._fallback = MemoryCacheBackend(self.max_entries)
+
+    @local_fallback
+    def get(self, key: str) -> Tuple[Optional[str], bool]:
+        # 使用 wall clock，讓多個程序共用同一個檔案時時間基準一致
+        now = time.time()
+        with self._lock:
+            row = self._db.conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None, False
+            value, expires_at = row
+            if expires_at <= now:
+                self._db.conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None, True
+            self._db.conn.execute(
+                "UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            return value, False
+
+    @local_fallback
+    def set(self, key: str, value: str, ttl: float) -> int:
+        now = time.time()
+        with self._lock:
+            self._db.conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            count = self._db.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow <= 0:
+                return 0
+            self._db.conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,),
+            )
+            return overflow
+
+    @local_fallback
+    def clear(self) -> None:
+        with self._lock:
+            self._db.conn.execute("DELETE FROM response_cache")
+
+    @local_fallback
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: float, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def make_key(user_text: str, model_name: str, system_instruction: str) -> str:
+        instruction_hash = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest()
+        raw = f"{model_name}\x00{instruction_hash}\x00{normalize_text(user_text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            value, expired = self.backend.get(key)
+        except Exception as e:
+            # 快取失效不應該影響正常回覆
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+
+        if expired:
+            self._expirations += 1
+        if value is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._evictions += self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self._hits + self._misses
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            "entries": len(self.backend),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
+
+
+def create_response_cache() -> ResponseCache:
+    if settings.RESPONSE_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(
+            settings.RESPONSE_CACHE_SQLITE_PATH, settings.RESPONSE_CACHE_MAX_ENTRIES
+        )
+    else:
+        backend = MemoryCacheBackend(settings.RESPONSE_CACHE_MAX_ENTRIES)
+    return ResponseCache(
+        backend,
+        ttl=settings.RESPONSE_CACHE_TTL,
+        enabled=settings.RESPONSE_CACHE_ENABLED,
+    )
+
+
+response_cache = create_response_cache()
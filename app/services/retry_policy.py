@@ -0,0 +1,190 @@
+"""
+Gemini 呼叫的重試與對沖（hedged request）策略
+- RetryPolicy：遇到可重試的錯誤時，以加上隨機抖動的指數退避重試，並受整體期限限制
+- Hedger：請求超過近期 p95 延遲仍未回應時，再送出第二個請求，取先回來的結果，
+  只有最慢的約 5% 請求會多花一次呼叫，藉此壓低長尾延遲
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, FrozenSet, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+AttemptFunc = Callable[[], Awaitable[Any]]
+
+
+def parse_status_codes(value: str) -> FrozenSet[int]:
+    return frozenset(int(code) for code in value.split(",") if code.strip())
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        max_attempts: int,
+        base_delay: float,
+        max_delay: float,
+        retryable_statuses: FrozenSet[int],
+        deadline: float,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_statuses = retryable_statuses
+        self.deadline = deadline
+
+        self._retries = 0
+        self._deadline_exceeded = 0
+
+    def is_retryable(self, error: Exception) -> bool:
+        # 錯誤帶有 status_code 屬性：None 代表逾時或連線失敗，可重試；否則看狀態碼
+        if not hasattr(error, "status_code"):
+            return False
+        status_code = error.status_code
+        return status_code is None or status_code in self.retryable_statuses
+
+    def backoff(self, attempt: int) -> float:
+        # full jitter：在 0 到指數退避上限之間隨機，避免大量請求同時重試
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(self, attempt_func: AttemptFunc) -> Any:
+        """
+        執行 attempt_func，失敗時依策略重試
+
+        Raises:
+            最後一次嘗試的錯誤；超過整體期限且沒有其他錯誤時拋出 TimeoutError
+        """
+        deadline_at = time.monotonic() + self.deadline
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_attempts):
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                return await asyncio.wait_for(attempt_func(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            except Exception as e:
+                if not self.is_retryable(e) or attempt == self.max_attempts - 1:
+                    raise
+                last_error = e
+
+            delay = self.backoff(attempt)
+            if time.monotonic() + delay >= deadline_at:
+                break
+            self._retries += 1
+            logger.warning(
+                f"Gemini attempt {attempt + 1}/{self.max_attempts} failed ({last_error}), "
+                f"retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+        self._deadline_exceeded += 1
+        if last_error is not None:
+            raise last_error
+        raise asyncio.TimeoutError(f"Gemini deadline of {self.deadline}s exceeded")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_attempts": self.max_attempts,
+            "retries": self._retries,
+            "deadline_exceeded": self._deadline_exceeded,
+        }
+
+
+class LatencyTracker:
+    """保留最近 window 筆延遲，用來估計 p95"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class Hedger:
+    def __init__(self, enabled: bool, min_delay: float, tracker: Optional[LatencyTracker] = None):
+        self.enabled = enabled
+        self.min_delay = min_delay
+        self.tracker = tracker or LatencyTracker()
+
+        self._hedged = 0
+        self._hedge_wins = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """樣本不足時不對沖，回傳 None"""
+        if not self.enabled:
+            return None
+        p95 = self.tracker.percentile(0.95)
+        if p95 is None:
+            return None
+        return max(self.min_delay, p95)
+
+    async def run(self, attempt_func: AttemptFunc) -> Any:
+        delay = self.hedge_delay()
+        started_at = time.monotonic()
+        if delay is None:
+            result = await attempt_func()
+            self.tracker.record(time.monotonic() - started_at)
+            return result
+
+        primary = asyncio.create_task(attempt_func())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self._hedged += 1
+                logger.info(f"Gemini request slower than {delay:.2f}s, sending hedged request")
+                tasks.add(asyncio.create_task(attempt_func()))
+
+            last_error: Optional[BaseException] = None
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._hedge_wins += 1
+                        self.tracker.record(time.monotonic() - started_at)
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "hedge_delay_seconds": self.hedge_delay(),
+            "hedged_requests": self._hedged,
+            "hedge_wins": self._hedge_wins,
+        }
+
+
+gemini_retry_policy = RetryPolicy(
+    max_attempts=settings.GEMINI_RETRY_MAX_ATTEMPTS,
+    base_delay=settings.GEMINI_RETRY_BASE_DELAY,
+    max_delay=settings.GEMINI_RETRY_MAX_DELAY,
+    retryable_statuses=parse_status_codes(settings.GEMINI_RETRY_STATUSES),
+    deadline=settings.GEMINI_RETRY_DEADLINE,
+)
+
+gemini_hedger = Hedger(
+    enabled=settings.GEMINI_HEDGE_ENABLED,
+    min_delay=settings.GEMINI_HEDGE_MIN_DELAY,
+)
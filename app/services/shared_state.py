@@ -0,0 +1,249 @@
+"""
+跨 worker 共用狀態
+以多個 worker 部署時，各程序的 module-level singleton 彼此看不到：
+LINE token 會被每個 worker 各自換發，快取與去重紀錄也分散在各個程序。
+這裡提供最小的共用介面：
+- get / set / delete：有 TTL 的 key-value
+- acquire / release：有期限的租約鎖（lease），持有者當掉時鎖會自動過期，不會卡死其他 worker
+
+後端：
+- SQLiteStateStore（預設）：同一台機器上的 worker 指向同一個 SQLite 檔案即可，不需要 Redis 等外部服務
+- MemoryStateStore：只在單一程序內有效，供測試或明確只跑一個 worker 時使用
+
+SQLite 的呼叫直接在 event loop 上執行，所以（這裡與回應快取、對話記憶、事件去重的 SQLite 後端皆同）：
+- 檔案在第一次使用時才開啟，import app 不會建立檔案
+- busy_timeout 很短（SHARED_STATE_BUSY_TIMEOUT_MS），其他 worker 正在寫入時不會卡住 event loop 數秒；
+  等不到鎖就改用程序內的記憶體後端處理這一次呼叫（local_fallback）
+- WAL 搭配 synchronous=NORMAL，寫入不必每次 fsync
+"""
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T", bound=Callable[..., Any])
+
+SQLITE_FALLBACKS = registry.counter(
+    "care_sqlite_fallbacks_total",
+    "SQLite calls served by the in-process fallback because the database was busy or unavailable",
+    ("backend",),
+)
+
+
+class LazySQLite:
+    """第一次取用 conn 時才開啟檔案並建立資料表"""
+
+    def __init__(self, path: str, schema: Sequence[str], busy_timeout_ms: Optional[int] = None):
+        self.path = path
+        self.schema = tuple(schema)
+        self.busy_timeout_ms = (
+            settings.SHARED_STATE_BUSY_TIMEOUT_MS if busy_timeout_ms is None else busy_timeout_ms
+        )
+        self._conn: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            with self._open_lock:
+                if self._conn is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+                    conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    for statement in self.schema:
+                        conn.execute(statement)
+                    self._conn = conn
+        return self._conn
+
+
+def local_fallback(method: T) -> T:
+    """SQLite 忙碌或無法使用時，改呼叫 self._fallback（程序內的記憶體後端）的同名方法"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            backend = type(self).__name__
+            SQLITE_FALLBACKS.inc(backend)
+            logger.warning(f"{backend}.{method.__name__} fell back to local memory: {e}")
+            return getattr(self._fallback, method.__name__)(*args, **kwargs)
+
+    return wrapper
+
+
+class MemoryStateStore:
+    def __init__(self):
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._locks: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+        self._acquired = 0
+        self._contended = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        """ttl 為 None 代表不過期"""
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl is not None else None)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """取得租約鎖；已由同一個 owner 持有時延長期限並回傳 True"""
+        now = time.time()
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder is not None and holder[0] != owner and holder[1] > now:
+                self._contended += 1
+                return False
+            self._locks[name] = (owner, now + ttl)
+            self._acquired += 1
+            return True
+
+    def release(self, name: str, owner: str) -> None:
+        with self._lock:
+            holder = self._locks.get(name)
+            if holder is not None and holder[0] == owner:
+                del self._locks[name]
+
+    def ping(self) -> bool:
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "keys": len(self._data),
+            "lock_acquired": self._acquired,
+            "lock_contended": self._contended,
+        }
+
+
+class SQLiteStateStore:
+    """多個 worker 共用同一個檔案；SQLite 本身的檔案鎖保證每個寫入都是原子的"""
+
+    def __init__(self, path: str, busy_timeout_ms: Optional[int] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = LazySQLite(
+            path,
+            [
+                "CREATE TABLE IF NOT EXISTS shared_state ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)",
+                "CREATE TABLE IF NOT EXISTS shared_locks ("
+                "name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)",
+            ],
+            busy_timeout_ms,
+        )
+        # 檔案被其他 worker 鎖住時暫用（鎖也只在本程序內有效，最多造成多換發一次 token）
+        self._fallback = MemoryStateStore()
+
+        self._acquired = 0
+        self._contended = 0
+
+    @local_fallback
+    def get(self, key: str) -> Optional[str]:
+        # 使用 wall clock，讓多個程序的時間基準一致
+        now = time.time()
+        with self._lock:
+            row = self._db.conn.execute(
+                "SELECT value, expires_at FROM shared_state WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._db.conn.execute(
+                    "DELETE FROM shared_state WHERE key = ? AND expires_at <= ?", (key, now)
+                )
+                return None
+            return value
+
+    @local_fallback
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            self._db.conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+
+    @local_fallback
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._db.conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    @local_fallback
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # 先清掉過期的鎖，再用 INSERT OR IGNORE 原子地搶鎖（與 SQLiteSeenSet 相同做法）
+            self._db.conn.execute(
+                "DELETE FROM shared_locks WHERE name = ? AND expires_at <= ?", (name, now)
+            )
+            cursor = self._db.conn.execute(
+                "INSERT OR IGNORE INTO shared_locks (name, owner, expires_at) VALUES (?, ?, ?)",
+                (name, owner, now + ttl),
+            )
+            if cursor.rowcount != 1:
+                # 自己已經持有時延長期限
+                cursor = self._db.conn.execute(
+                    "UPDATE shared_locks SET expires_at = ? WHERE name = ? AND owner = ?",
+                    (now + ttl, name, owner),
+                )
+            if cursor.rowcount == 1:
+                self._acquired += 1
+                return True
+            self._contended += 1
+            return False
+
+    @local_fallback
+    def release(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._db.conn.execute(
+                "DELETE FROM shared_locks WHERE name = ? AND owner = ?", (name, owner)
+            )
+
+    def ping(self) -> bool:
+        with self._lock:
+            return self._db.conn.execute("SELECT 1").fetchone()[0] == 1
+
+    @local_fallback
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            keys = self._db.conn.execute("SELECT COUNT(*) FROM shared_state").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "keys": keys,
+            "lock_acquired": self._acquired,
+            "lock_contended": self._contended,
+        }
+
+
+def create_shared_state():
+    if settings.SHARED_STATE_BACKEND == "memory":
+        return MemoryStateStore()
+    return SQLiteStateStore(settings.SHARED_STATE_PATH)
+
+
+shared_state = create_shared_state()
@@ -0,0 +1,168 @@
+"""
+Gemini token 用量與 prompt 預算
+- TokenUsageTracker：記錄每次回應的 usageMetadata（prompt / candidates / 命中快取的 token 數），
+  依使用者累計（LRU，超過上限淘汰最久沒有使用的使用者），並輸出到 /stats 與 /metrics
+- PromptBudget：送出前依估算的 token 數截斷過長的使用者輸入與參考資料，
+  並可設定 maxOutputTokens，讓每次請求的成本有上限
+"""
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.conversation_store import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TOKENS = registry.counter(
+    "care_gemini_tokens_total",
+    "Gemini tokens reported by usageMetadata, by kind",
+    ("kind",),
+)
+PROMPT_TOKENS = registry.histogram(
+    "care_gemini_prompt_tokens",
+    "Prompt tokens per Gemini request",
+    buckets=(50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+# usageMetadata 欄位 -> 統計名稱
+_USAGE_FIELDS = (
+    ("promptTokenCount", "prompt_tokens"),
+    ("candidatesTokenCount", "candidates_tokens"),
+    ("cachedContentTokenCount", "cached_tokens"),
+    ("thoughtsTokenCount", "thoughts_tokens"),
+    ("totalTokenCount", "total_tokens"),
+)
+
+TRUNCATION_MARKER = "…（內容過長，以下省略）"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """依 estimate_tokens 的估算方式截斷到 max_tokens 以內；max_tokens <= 0 表示不限制"""
+    if max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - estimate_tokens(TRUNCATION_MARKER))
+    # 與 estimate_tokens 相同：非 ASCII 字元 1 token，ASCII 4 字元 1 token
+    used = 1.0
+    end = 0
+    for end, char in enumerate(text):
+        used += 1.0 if ord(char) >= 128 else 0.25
+        if used > budget:
+            break
+    return text[:end].rstrip() + TRUNCATION_MARKER
+
+
+class TokenUsageTracker:
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max(1, max_users)
+        self._totals: Dict[str, int] = {name: 0 for _, name in _USAGE_FIELDS}
+        self._requests = 0
+        self._missing_usage = 0
+        # user_id -> 累計用量（同 _totals 的欄位加上 requests）
+        self._users: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+
+    def record(self, usage: Optional[Dict[str, Any]], user_id: Optional[str] = None) -> Dict[str, int]:
+        """記錄一次請求的 usageMetadata，回傳整理後的 token 數"""
+        self._requests += 1
+        if not usage:
+            self._missing_usage += 1
+            return {}
+
+        counts = {name: int(usage.get(field) or 0) for field, name in _USAGE_FIELDS}
+        if not counts["total_tokens"]:
+            counts["total_tokens"] = counts["prompt_tokens"] + counts["candidates_tokens"] + counts["thoughts_tokens"]
+        for name, value in counts.items():
+            self._totals[name] += value
+            if value and name != "total_tokens":
+                TOKENS.inc(name.replace("_tokens", ""), amount=value)
+        PROMPT_TOKENS.labels().observe(counts["prompt_tokens"])
+
+        if user_id:
+            user = self._users.get(user_id)
+            if user is None:
+                user = self._users[user_id] = {"requests": 0, **{name: 0 for _, name in _USAGE_FIELDS}}
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            user["requests"] += 1
+            for name, value in counts.items():
+                user[name] += value
+
+        logger.info(
+            f"Gemini usage for user {user_id}: prompt={counts['prompt_tokens']} "
+            f"(cached {counts['cached_tokens']}), candidates={counts['candidates_tokens']}, "
+            f"total={counts['total_tokens']}"
+        )
+        return counts
+
+    def usage_for(self, user_id: str) -> Dict[str, int]:
+        return dict(self._users.get(user_id) or {})
+
+    def top_users(self, limit: int = 10) -> List[Dict[str, Any]]:
+        ranked = sorted(self._users.items(), key=lambda item: item[1]["total_tokens"], reverse=True)
+        return [{"user_id": user_id, **usage} for user_id, usage in ranked[:limit]]
+
+    def stats(self) -> Dict[str, Any]:
+        recorded = self._requests - self._missing_usage
+        return {
+            "requests": self._requests,
+            "requests_without_usage": self._missing_usage,
+            **self._totals,
+            "avg_prompt_tokens": self._totals["prompt_tokens"] / recorded if recorded else 0.0,
+            "avg_candidates_tokens": self._totals["candidates_tokens"] / recorded if recorded else 0.0,
+            "cached_token_ratio": (
+                self._totals["cached_tokens"] / self._totals["prompt_tokens"]
+                if self._totals["prompt_tokens"] else 0.0
+            ),
+            "users_tracked": len(self._users),
+        }
+
+
+class PromptBudget:
+    def __init__(self, max_input_tokens: int = 0, max_context_tokens: int = 0, max_output_tokens: int = 0):
+        # 0 代表不限制
+        self.max_input_tokens = max_input_tokens
+        self.max_context_tokens = max_context_tokens
+        self.max_output_tokens = max_output_tokens
+        self._truncated_inputs = 0
+        self._truncated_contexts = 0
+
+    def limit_input(self, text: str) -> str:
+        limited = truncate_to_tokens(text, self.max_input_tokens)
+        if limited is not text:
+            self._truncated_inputs += 1
+            logger.warning(f"User input truncated from ~{estimate_tokens(text)} to {self.max_input_tokens} tokens")
+        return limited
+
+    def limit_context(self, text: Optional[str]) -> Optional[str]:
+        if not text:
+            return text
+        limited = truncate_to_tokens(text, self.max_context_tokens)
+        if limited is not text:
+            self._truncated_contexts += 1
+            logger.warning(f"Context truncated from ~{estimate_tokens(text)} to {self.max_context_tokens} tokens")
+        return limited
+
+    def generation_config(self) -> Optional[Dict[str, Any]]:
+        if self.max_output_tokens <= 0:
+            return None
+        return {"maxOutputTokens": self.max_output_tokens}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_input_tokens": self.max_input_tokens,
+            "max_context_tokens": self.max_context_tokens,
+            "max_output_tokens": self.max_output_tokens,
+            "truncated_inputs": self._truncated_inputs,
+            "truncated_contexts": self._truncated_contexts,
+        }
+
+
+gemini_token_usage = TokenUsageTracker(max_users=settings.GEMINI_USAGE_MAX_USERS)
+gemini_prompt_budget = PromptBudget(
+    max_input_tokens=settings.GEMINI_MAX_INPUT_TOKENS,
+    max_context_tokens=settings.GEMINI_MAX_CONTEXT_TOKENS,
+    max_output_tokens=settings.GEMINI_MAX_OUTPUT_TOKENS,
+)
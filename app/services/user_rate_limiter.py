@@ -0,0 +1,124 @@
+"""
+每位使用者的速率限制
+每個 user_id 一個 token bucket：平均每分鐘 rate_per_minute 則、最多連續 burst 則需要 Gemini 的訊息。
+超過的訊息不呼叫 Gemini，改回覆請使用者稍候，避免單一使用者用光整個 Gemini 配額。
+
+bucket 只存剩餘 token 與上次更新時間；閒置到補滿所需的時間後就與新 bucket 相同，可直接移除，
+因此記憶體只與最近有傳訊息的使用者數量有關（另有 max_users 上限）。
+"""
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from app.core.config import settings
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+THROTTLED = registry.counter(
+    "care_user_throttled_total",
+    "Messages answered with a throttling reply instead of Gemini",
+)
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+class UserRateLimiter:
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: float,
+        max_users: int = 10000,
+        enabled: bool = True,
+        clock=time.monotonic,
+    ):
+        self.enabled = enabled and rate_per_minute > 0
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.max_users = max(1, max_users)
+        # 閒置超過這個秒數的 bucket 已經補滿，移除不影響結果
+        self.idle_ttl = self.capacity / self.rate if self.rate > 0 else 0.0
+        self._clock = clock
+        # 依最後使用時間排序，最舊的在前面
+        self._buckets: "OrderedDict[Hashable, _Bucket]" = OrderedDict()
+
+        self._allowed = 0
+        self._throttled = 0
+        self._expired = 0
+
+    def _expire(self, now: float) -> None:
+        while self._buckets:
+            bucket = next(iter(self._buckets.values()))
+            if now - bucket.updated_at < self.idle_ttl and len(self._buckets) <= self.max_users:
+                break
+            self._buckets.popitem(last=False)
+            self._expired += 1
+
+    def acquire(self, user_id: Optional[Hashable]) -> float:
+        """
+        為使用者取用一個 token
+
+        Returns:
+            float: 0 表示放行；大於 0 表示已超過限制，為需要再等待的秒數
+        """
+        if not self.enabled or user_id is None:
+            return 0.0
+
+        now = self._clock()
+        bucket = self._buckets.pop(user_id, None)
+        if bucket is None:
+            bucket = _Bucket(self.capacity, now)
+        else:
+            bucket.tokens = min(self.capacity, bucket.tokens + (now - bucket.updated_at) * self.rate)
+            bucket.updated_at = now
+        self._buckets[user_id] = bucket
+        self._expire(now)
+
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            self._allowed += 1
+            return 0.0
+
+        self._throttled += 1
+        THROTTLED.inc()
+        retry_after = (1 - bucket.tokens) / self.rate
+        logger.warning(f"User {user_id} exceeded {self.rate * 60:g} messages/min, retry after {retry_after:.1f}s")
+        return retry_after
+
+    def stats(self) -> Dict[str, Any]:
+        total = self._allowed + self._throttled
+        return {
+            "enabled": self.enabled,
+            "rate_per_minute": self.rate * 60,
+            "burst": self.capacity,
+            "tracked_users": len(self._buckets),
+            "allowed": self._allowed,
+            "throttled": self._throttled,
+            "throttle_rate": self._throttled / total if total else 0.0,
+            "expired_buckets": self._expired,
+        }
+
+
+def throttle_reply(retry_after: float) -> str:
+    """超過限制時的回覆"""
+    seconds = max(1, math.ceil(retry_after))
+    return (
+        f"您的訊息有點多，為了讓每位使用者都能順利使用，請約 {seconds} 秒後再提問，謝謝您的耐心。\n"
+        "如遇緊急狀況請撥打 119。"
+    )
+
+
+user_rate_limiter = UserRateLimiter(
+    rate_per_minute=settings.USER_RATE_LIMIT_PER_MINUTE,
+    burst=settings.USER_RATE_LIMIT_BURST,
+    max_users=settings.USER_RATE_LIMIT_MAX_USERS,
+    enabled=settings.USER_RATE_LIMIT_ENABLED,
+)
@@ -0,0 +1,38 @@
+"""
+多 worker 部署設定（Linux / macOS）
+
+    pip install gunicorn
+    gunicorn -c gunicorn.conf.py app.main:app
+
+不安裝 gunicorn 時也可以直接使用 uvicorn（未指定 --workers 時 uvicorn 同樣讀取 WEB_CONCURRENCY）：
+
+    WEB_CONCURRENCY=4 uvicorn app.main:app --host 0.0.0.0 --port 8000
+
+WEB_CONCURRENCY 大於 1 時，回應快取、對話記憶與事件去重預設改用 SHARED_STATE_PATH 的 SQLite 檔案，
+LINE token 也只會由一個 worker 換發；所有 worker 必須在同一台機器上、指向同一個檔案。
+"""
+import multiprocessing
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# worker 在 fork 之後才 import app，讓 app.core.config 看到實際的 worker 數
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# 不預先載入：httpx 連線池、asyncio 物件與 SQLite 連線都不能跨 fork 共用，每個 worker 自行建立
+preload_app = False
+
+# 關閉時保留時間讓 lifespan 排空 webhook 佇列（WEBHOOK_DRAIN_TIMEOUT）並送出暫存的 push
+graceful_timeout = int(float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "10"))) + 10
+# Gemini 重試總時限之外再多留一些緩衝，避免慢請求讓 worker 被誤判為卡死
+timeout = int(float(os.getenv("GEMINI_RETRY_DEADLINE", "30"))) + 30
+keepalive = 5
+
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} initialized; readiness at GET /ready")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker {worker.pid} exited")
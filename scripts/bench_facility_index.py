@@ -0,0 +1,66 @@
+"""
+本地醫療院所索引微基準測試：以合成資料量測查詢延遲（目標為次毫秒）
+
+用法（在專案根目錄）：
+    python -m scripts.bench_facility_index [院所數量] [重複次數]
+"""
+import random
+import sys
+import timeit
+
+from app.services.facility_index import Facility, FacilityIndex
+
+AREAS = [
+    ("台北市", ["中正區", "大安區", "信義區", "士林區", "內湖區"], 25.04, 121.55),
+    ("新北市", ["板橋區", "三重區", "新店區", "淡水區"], 25.01, 121.46),
+    ("台中市", ["西屯區", "北屯區", "南屯區"], 24.16, 120.65),
+    ("台南市", ["東區", "永康區", "安平區"], 22.99, 120.21),
+    ("高雄市", ["三民區", "苓雅區", "左營區"], 22.63, 120.30),
+    ("花蓮縣", ["花蓮市", "吉安鄉"], 23.98, 121.60),
+]
+DEPARTMENTS = ["家醫科", "內科", "外科", "小兒科", "婦產科", "眼科", "耳鼻喉科", "皮膚科", "牙科", "復健科"]
+HOSPITAL_RATIO = 0.15
+
+
+def build_index(count: int, seed: int = 1) -> FacilityIndex:
+    rng = random.Random(seed)
+    index = FacilityIndex()
+    for i in range(count):
+        city, districts, lat, lng = rng.choice(AREAS)
+        district = rng.choice(districts)
+        kind = "醫院" if rng.random() < HOSPITAL_RATIO else "診所"
+        departments = rng.sample(DEPARTMENTS, rng.randint(1, 4))
+        index.add(Facility(
+            id=f"{i:010d}",
+            name=f"合成{district[:-1]}{i}號{departments[0]}{kind}",
+            kind=kind,
+            address=f"{city}{district}測試路{i}號",
+            departments=departments,
+            lat=lat + rng.gauss(0, 0.05),
+            lng=lng + rng.gauss(0, 0.05),
+        ))
+    return index
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) >= 2 else 20000
+    repeat = int(sys.argv[2]) if len(sys.argv) >= 3 else 1000
+
+    build_time = timeit.timeit(lambda: build_index(count), number=1)
+    index = build_index(count)
+    cases = {
+        "search 縣市+科別": lambda: index.search("台北市大安區有推薦的眼科嗎？"),
+        "search 名稱": lambda: index.search(f"合成大安{count // 2}號的電話"),
+        "search 無命中": lambda: index.search("今天天氣很好，想出去走走"),
+        "nearest k=5": lambda: index.nearest(25.033, 121.543, k=5),
+        "nearest 科別 k=5": lambda: index.nearest(25.033, 121.543, k=5, department="耳鼻喉科"),
+    }
+
+    print(f"index: {index.stats()} built in {build_time * 1000:.0f} ms")
+    for name, case in cases.items():
+        elapsed = timeit.timeit(case, number=repeat)
+        print(f"{name:<16}: {elapsed / repeat * 1_000_000:8.1f} µs/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+啟動時間基準測試：每一輪都開新的 Python 程序（冷啟動），量測
+- import：import app.main 的時間
+- startup：lifespan 啟動（連線池、webhook worker 等）
+- first_request：第一個 GET /health
+- ready：lifespan 啟動後到 /ready 回傳 200（背景預熱 Gemini / LINE 服務與 linebot SDK 完成）
+- first_webhook：預熱完成後第一個已簽名 webhook 的回應時間（LINE 看到的延遲）
+
+外部服務都指向不存在的位址，背景處理會很快失敗，不影響量測。
+
+用法（在專案根目錄）：
+    python -m scripts.bench_startup [輪數]
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CHANNEL_SECRET = "startup_benchmark_secret"
+STAGES = ("import", "startup", "first_request", "ready", "first_webhook")
+
+
+def build_webhook() -> bytes:
+    # 位置訊息只查本地索引，不會呼叫 Gemini
+    event = {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": "Ubenchmark"},
+        "webhookEventId": "01HSTARTUPBENCHMARK000000",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": "benchmark_reply_token",
+        "message": {"id": "1", "type": "location", "latitude": 25.033, "longitude": 121.543},
+    }
+    return json.dumps({"destination": "Ubot", "events": [event]}).encode("utf-8")
+
+
+def sign(body: bytes) -> str:
+    digest = hmac.new(CHANNEL_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def run_child() -> None:
+    timings = {}
+    started_at = time.perf_counter()
+    from app.main import app
+    timings["import"] = time.perf_counter() - started_at
+
+    from fastapi.testclient import TestClient
+
+    stage_start = time.perf_counter()
+    with TestClient(app) as client:
+        timings["startup"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        client.get("/health")
+        timings["first_request"] = time.perf_counter() - stage_start
+
+        # ready 從 lifespan 啟動開始計時
+        while client.get("/ready").status_code != 200:
+            time.sleep(0.005)
+        timings["ready"] = time.perf_counter() - stage_start + timings["startup"]
+
+        body = build_webhook()
+        stage_start = time.perf_counter()
+        response = client.post(
+            "/line/callback",
+            content=body,
+            headers={"Content-Type": "application/json", "X-Line-Signature": sign(body)},
+        )
+        timings["first_webhook"] = time.perf_counter() - stage_start
+        assert response.status_code == 200, response.text
+    print(json.dumps(timings))
+
+
+def run_once() -> dict:
+    env = dict(
+        os.environ,
+        LINE_CHANNEL_SECRET=CHANNEL_SECRET,
+        LINE_CHANNEL_ID="",
+        LINE_API_BASE_URL="http://127.0.0.1:9",
+        GEMINI_API_BASE_URL="http://127.0.0.1:9",
+        LINE_LOADING_ANIMATION_ENABLED="false",
+        SHARED_STATE_BACKEND="memory",
+    )
+    result = subprocess.run(
+        [sys.executable, "-m", "scripts.bench_startup", "--child"],
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    if "--child" in sys.argv:
+        run_child()
+        return
+
+    rounds = int(sys.argv[1]) if len(sys.argv) >= 2 else 5
+    samples = {stage: [] for stage in STAGES}
+    for _ in range(rounds):
+        timings = run_once()
+        for stage in STAGES:
+            samples[stage].append(timings[stage] * 1000)
+
+    print(f"cold starts: {rounds}")
+    for stage in STAGES:
+        values = samples[stage]
+        print(
+            f"{stage:<14}: median {statistics.median(values):7.1f} ms"
+            f" (min {min(values):7.1f}, max {max(values):7.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Webhook 解析微基準測試：比較 SDK 的 WebhookParser 與 FastWebhookParser
+
+用法（在專案根目錄）：
+    python -m scripts.bench_webhook_parse [事件數量] [重複次數]
+"""
+import base64
+import hashlib
+import hmac
+import json
+import sys
+import timeit
+
+from linebot.v3.webhook import WebhookParser
+
+from app.services.line.fast_parser import FastWebhookParser
+
+CHANNEL_SECRET = "benchmark_secret"
+
+
+def build_payload(event_count: int) -> bytes:
+    # 模擬真實批次：文字訊息之外夾雜貼圖、圖片、追蹤等不處理的事件
+    events = []
+    for i in range(event_count):
+        base = {
+            "mode": "active",
+            "timestamp": 1700000000000 + i,
+            "source": {"type": "user", "userId": f"U{i:032d}"},
+            "webhookEventId": f"01H{i:023d}",
+            "deliveryContext": {"isRedelivery": False},
+        }
+        kind = i % 4
+        if kind == 0:
+            base.update({
+                "type": "message",
+                "replyToken": f"token{i}",
+                "message": {"id": str(i), "type": "text", "quoteToken": "q", "text": "台北市有哪些醫院？"},
+            })
+        elif kind == 1:
+            base.update({
+                "type": "message",
+                "replyToken": f"token{i}",
+                "message": {
+                    "id": str(i), "type": "sticker", "quoteToken": "q",
+                    "packageId": "1", "stickerId": "1", "stickerResourceType": "STATIC",
+                },
+            })
+        elif kind == 2:
+            base.update({
+                "type": "message",
+                "replyToken": f"token{i}",
+                "message": {
+                    "id": str(i), "type": "image", "quoteToken": "q",
+                    "contentProvider": {"type": "line"},
+                },
+            })
+        else:
+            base.update({"type": "follow", "replyToken": f"token{i}", "follow": {"isUnblocked": False}})
+        events.append(base)
+    return json.dumps({"destination": "Ubot", "events": events}, ensure_ascii=False).encode("utf-8")
+
+
+def sign(body: bytes) -> str:
+    digest = hmac.new(CHANNEL_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+def main() -> None:
+    event_count = int(sys.argv[1]) if len(sys.argv) >= 2 else 100
+    repeat = int(sys.argv[2]) if len(sys.argv) >= 3 else 200
+
+    body = build_payload(event_count)
+    signature = sign(body)
+    sdk_parser = WebhookParser(CHANNEL_SECRET)
+    fast_parser = FastWebhookParser(CHANNEL_SECRET)
+
+    sdk_events = sdk_parser.parse(body.decode("utf-8"), signature)
+    fast_events = fast_parser.parse(body, signature)
+
+    sdk_time = timeit.timeit(lambda: sdk_parser.parse(body.decode("utf-8"), signature), number=repeat)
+    fast_time = timeit.timeit(lambda: fast_parser.parse(body, signature), number=repeat)
+
+    print(f"payload: {event_count} events, {len(body)} bytes, {repeat} runs")
+    print(f"WebhookParser     : {sdk_time / repeat * 1000:8.3f} ms/batch ({len(sdk_events)} events built)")
+    print(f"FastWebhookParser : {fast_time / repeat * 1000:8.3f} ms/batch ({len(fast_events)} events built)")
+    print(f"speedup           : {sdk_time / fast_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
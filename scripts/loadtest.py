@@ -0,0 +1,255 @@
+"""
+Webhook → Gemini → LINE 整條流程的離線壓力測試
+
+在同一個 event loop 中啟動：模擬 Gemini、模擬 LINE、CARE app 本身（皆為本機 uvicorn），
+再以固定 RPS（open-loop）送出已簽名的 webhook 到 /line/callback，最後回報：
+- 吞吐量（webhook 回應數與實際送達 LINE 的回覆數）
+- webhook 回應延遲與端到端延遲（送出 webhook → 模擬 LINE 收到回覆）的 p50/p95/p99
+- event loop 延遲（lag）
+
+用法（在專案根目錄）：
+    python -m scripts.loadtest --rps 50 --duration 20 --gemini-latency 1.5 --gemini-error-rate 0.02
+
+預設關閉 Gemini 全域速率限制與每位使用者的限流；要量測實際部署的設定時加上
+--gemini-rps 5 --user-rate-limit。實際生效的限制會列在結果最後。
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import socket
+import time
+from typing import Dict, List, Optional
+
+CHANNEL_SECRET = "loadtest_secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def format_latency(name: str, samples: List[float]) -> str:
+    return (
+        f"{name:<18} n={len(samples):<6} "
+        f"p50={percentile(samples, 0.50) * 1000:8.1f}ms "
+        f"p95={percentile(samples, 0.95) * 1000:8.1f}ms "
+        f"p99={percentile(samples, 0.99) * 1000:8.1f}ms "
+        f"max={(max(samples) if samples else 0) * 1000:8.1f}ms"
+    )
+
+
+def build_webhook(index: int, user_count: int) -> bytes:
+    event = {
+        "type": "message",
+        "mode": "active",
+        "timestamp": int(time.time() * 1000),
+        "source": {"type": "user", "userId": f"U{index % user_count:032d}"},
+        "webhookEventId": f"01LOADTEST{index:016d}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"reply-{index}",
+        # 每則訊息都不同，避免被回應快取命中
+        "message": {"id": str(index), "type": "text", "quoteToken": "q", "text": f"第 {index} 個問題：感冒要看哪一科？"},
+    }
+    return json.dumps({"destination": "Ubot", "events": [event]}, ensure_ascii=False).encode("utf-8")
+
+
+def sign(body: bytes) -> str:
+    digest = hmac.new(CHANNEL_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        while True:
+            started_at = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - started_at - self.interval))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def start_server(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    return server, task
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from scripts.mock_services import MockBehavior, create_gemini_app, create_line_app
+
+    gemini_port, line_port, app_port = free_port(), free_port(), free_port()
+
+    # app 的 Settings 在 import 時讀取環境變數，必須在 import app.main 之前設定
+    os.environ.update({
+        "GEMINI_API_KEY": "loadtest",
+        "GEMINI_API_BASE_URL": f"http://127.0.0.1:{gemini_port}/v1beta",
+        "LINE_API_BASE_URL": f"http://127.0.0.1:{line_port}",
+        "LINE_CHANNEL_ID": "loadtest",
+        "LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+        # 模擬 LINE 發的 token 不能寫進正式的共用狀態檔
+        "SHARED_STATE_BACKEND": "memory",
+        "WEBHOOK_WORKERS": str(args.workers),
+        "WEBHOOK_QUEUE_MAXSIZE": str(args.queue_size),
+        # 預設不限制 Gemini RPS（0 表示關閉 token bucket），量測的是整條流程而不是 .env 中的配額
+        "GEMINI_RATE_LIMIT_RPS": str(args.gemini_rps),
+    })
+    if not args.user_rate_limit:
+        # 預設量測整條 Gemini 路徑的吞吐量，不讓每位使用者的限流改變結果
+        os.environ.update({"USER_RATE_LIMIT_ENABLED": "false", "WEBHOOK_QUEUE_MAX_PER_USER": "0"})
+    from app.core.config import settings
+    from app.main import app as care_app
+
+    gemini_app = create_gemini_app(
+        MockBehavior(args.gemini_latency, args.gemini_latency * 0.3, args.gemini_error_rate, 500)
+    )
+    line_app = create_line_app(MockBehavior(args.line_latency, args.line_latency * 0.3, 0.0, 500))
+
+    servers = [
+        await start_server(gemini_app, gemini_port),
+        await start_server(line_app, line_port),
+        await start_server(care_app, app_port),
+    ]
+
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+
+    sent_at: Dict[str, float] = {}
+    ack_latencies: List[float] = []
+    ack_errors = 0
+
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{app_port}",
+        timeout=30,
+        limits=httpx.Limits(max_connections=200),
+    ) as client:
+        # 等背景預熱（linebot SDK 與服務建立）完成，量到的才是穩定狀態的延遲
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+
+        async def send(index: int) -> None:
+            nonlocal ack_errors
+            body = build_webhook(index, args.users)
+            started_at = time.perf_counter()
+            sent_at[f"reply-{index}"] = started_at
+            try:
+                response = await client.post(
+                    "/line/callback",
+                    content=body,
+                    headers={"Content-Type": "application/json", "X-Line-Signature": sign(body)},
+                )
+                if response.status_code != 200:
+                    ack_errors += 1
+                    return
+                ack_latencies.append(time.perf_counter() - started_at)
+            except httpx.HTTPError:
+                ack_errors += 1
+
+        total = int(args.rps * args.duration)
+        print(f"Sending {total} webhooks at {args.rps} rps to 127.0.0.1:{app_port} ...")
+        load_started = time.perf_counter()
+        tasks = []
+        for index in range(total):
+            # open-loop：依排程時間送出，不等前一個完成
+            delay = load_started + index / args.rps - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(send(index)))
+        await asyncio.gather(*tasks)
+        send_elapsed = time.perf_counter() - load_started
+
+        # 等待背景 worker 把剩下的回覆送完
+        drain_deadline = time.perf_counter() + args.drain_timeout
+        while len(line_app.state.replied_at) < total and time.perf_counter() < drain_deadline:
+            await asyncio.sleep(0.1)
+        total_elapsed = time.perf_counter() - load_started
+
+        stats = (await client.get("/stats")).json()
+
+    await lag_monitor.stop()
+    for server, task in reversed(servers):
+        server.should_exit = True
+        await task
+
+    replied_at = line_app.state.replied_at
+    e2e_latencies = [replied_at[token] - sent_at[token] for token in replied_at if token in sent_at]
+
+    print()
+    print(f"webhooks sent      : {total} in {send_elapsed:.1f}s ({total / send_elapsed:.1f} rps offered)")
+    print(f"webhooks acked     : {len(ack_latencies)} ({ack_errors} errors)")
+    print(f"replies delivered  : {len(replied_at)} in {total_elapsed:.1f}s "
+          f"({len(replied_at) / total_elapsed:.1f} replies/s)")
+    print(f"gemini requests    : {gemini_app.state.requests} ({gemini_app.state.errors} injected errors)")
+    print(format_latency("webhook ack", ack_latencies))
+    print(format_latency("end-to-end reply", e2e_latencies))
+    print(format_latency("event loop lag", lag_monitor.samples))
+    print(f"webhook queue      : {json.dumps(stats.get('webhook_queue', {}), ensure_ascii=False)}")
+    # 吞吐量受以下限制影響，與結果一起列出
+    gemini_rps = (
+        f"{settings.GEMINI_RATE_LIMIT_RPS:g} rps (burst {settings.GEMINI_RATE_LIMIT_BURST:g})"
+        if settings.GEMINI_RATE_LIMIT_RPS > 0 else "unlimited"
+    )
+    user_limit = (
+        f"{settings.USER_RATE_LIMIT_PER_MINUTE:g}/min (burst {settings.USER_RATE_LIMIT_BURST:g})"
+        if settings.USER_RATE_LIMIT_ENABLED else "off"
+    )
+    print(f"active limits      : gemini rate {gemini_rps}, "
+          f"gemini concurrency {settings.GEMINI_MIN_CONCURRENCY}-{settings.GEMINI_MAX_CONCURRENCY}, "
+          f"user rate {user_limit}, "
+          f"queue per user {settings.WEBHOOK_QUEUE_MAX_PER_USER or 'unlimited'}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline load test for the CARE webhook pipeline")
+    parser.add_argument("--rps", type=float, default=20, help="target webhook requests per second")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of load")
+    parser.add_argument("--users", type=int, default=50, help="number of distinct LINE users")
+    parser.add_argument("--workers", type=int, default=16, help="WEBHOOK_WORKERS for the app")
+    parser.add_argument("--queue-size", type=int, default=1000, help="WEBHOOK_QUEUE_MAXSIZE for the app")
+    parser.add_argument("--gemini-latency", type=float, default=1.0, help="mean mock Gemini latency (s)")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0, help="fraction of Gemini 500s")
+    parser.add_argument("--line-latency", type=float, default=0.05, help="mean mock LINE latency (s)")
+    parser.add_argument(
+        "--gemini-rps", type=float, default=0, help="GEMINI_RATE_LIMIT_RPS for the app (0 = unlimited)"
+    )
+    parser.add_argument(
+        "--user-rate-limit", action="store_true", help="keep the per-user rate limit and queue cap enabled"
+    )
+    parser.add_argument("--drain-timeout", type=float, default=60, help="seconds to wait for replies")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+壓力測試用的本機模擬伺服器
+- 模擬 Gemini generateContent
+- 模擬 LINE OAuth token、reply、push 與 loading animation 端點
+延遲與錯誤率皆可設定，讓整條 webhook → Gemini → LINE 流程可以完全離線測試。
+
+單獨啟動（在專案根目錄）：
+    python -m scripts.mock_services --gemini-port 9001 --line-port 9002
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+class MockBehavior:
+    def __init__(self, latency: float, jitter: float, error_rate: float, error_status: int):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    async def delay(self) -> None:
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self) -> bool:
+        return random.random() < self.error_rate
+
+
+def create_gemini_app(behavior: MockBehavior) -> FastAPI:
+    app = FastAPI(title="Mock Gemini")
+    app.state.requests = 0
+    app.state.errors = 0
+
+    @app.post("/v1beta/models/{model_action}")
+    async def generate_content(model_action: str, request: Request):
+        app.state.requests += 1
+        payload = await request.json()
+        await behavior.delay()
+        if behavior.should_fail():
+            app.state.errors += 1
+            return JSONResponse({"error": {"code": behavior.error_status}}, status_code=behavior.error_status)
+
+        question = payload["contents"][-1]["parts"][0]["text"]
+        return {
+            "candidates": [
+                {"content": {"role": "model", "parts": [{"text": f"模擬回覆：{question}"}]}}
+            ],
+            "usageMetadata": {"promptTokenCount": 50, "candidatesTokenCount": 20, "totalTokenCount": 70},
+        }
+
+    return app
+
+
+def create_line_app(behavior: MockBehavior) -> FastAPI:
+    app = FastAPI(title="Mock LINE")
+    # reply token -> 收到回覆的時間（time.perf_counter），壓力測試用來計算端到端延遲
+    app.state.replied_at = {}
+    app.state.pushed = []
+    app.state.requests = 0
+    app.state.errors = 0
+
+    @app.post("/oauth2/v3/token")
+    async def issue_token():
+        return {"access_token": "mock_access_token", "expires_in": 2592000, "token_type": "Bearer"}
+
+    @app.post("/v2/bot/message/reply")
+    async def reply(request: Request):
+        app.state.requests += 1
+        payload = await request.json()
+        await behavior.delay()
+        if behavior.should_fail():
+            app.state.errors += 1
+            return JSONResponse({"message": "mock failure"}, status_code=behavior.error_status)
+        app.state.replied_at[payload["replyToken"]] = time.perf_counter()
+        return {"sentMessages": [{"id": "1", "quoteToken": "q"} for _ in payload["messages"]]}
+
+    @app.post("/v2/bot/message/push")
+    async def push(request: Request):
+        app.state.requests += 1
+        payload = await request.json()
+        await behavior.delay()
+        app.state.pushed.append(payload["to"])
+        return {"sentMessages": [{"id": "1", "quoteToken": "q"} for _ in payload["messages"]]}
+
+    @app.post("/v2/bot/chat/loading/start")
+    async def loading_start():
+        return JSONResponse({}, status_code=202)
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run mock Gemini and LINE servers")
+    parser.add_argument("--gemini-port", type=int, default=9001)
+    parser.add_argument("--line-port", type=int, default=9002)
+    parser.add_argument("--gemini-latency", type=float, default=1.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--line-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    gemini_app = create_gemini_app(MockBehavior(args.gemini_latency, args.gemini_latency * 0.2, args.gemini_error_rate, 500))
+    line_app = create_line_app(MockBehavior(args.line_latency, args.line_latency * 0.2, 0.0, 500))
+
+    async def serve() -> None:
+        servers = [
+            uvicorn.Server(uvicorn.Config(gemini_app, host="127.0.0.1", port=args.gemini_port, log_level="warning")),
+            uvicorn.Server(uvicorn.Config(line_app, host="127.0.0.1", port=args.line_port, log_level="warning")),
+        ]
+        print(f"Mock Gemini: http://127.0.0.1:{args.gemini_port}/v1beta")
+        print(f"Mock LINE  : http://127.0.0.1:{args.line_port}")
+        await asyncio.gather(*(server.serve() for server in servers))
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
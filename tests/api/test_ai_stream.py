@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_gemini_service
+from app.main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def mock_service():
+    #以 dependency_overrides 換掉延遲建立的 GeminiService
+    service = MagicMock()
+    app.dependency_overrides[get_gemini_service] = lambda: service
+    yield service
+    app.dependency_overrides.pop(get_gemini_service, None)
+
+
+async def _fake_stream(user_input):
+    for chunk in ["第一段", "第二段"]:
+        yield chunk
+
+
+async def _failing_stream(user_input):
+    raise ValueError("API 請求配額已達上限，請稍後再試")
+    yield  # 讓這個函式成為 async generator
+
+
+def test_stream_returns_all_chunks(mock_service):
+    mock_service.stream_response = _fake_stream
+    response = client.post("/ai/stream", json={"user_input": "你好"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert response.text == "第一段第二段"
+
+
+def test_stream_returns_502_when_gemini_fails(mock_service):
+    mock_service.stream_response = _failing_stream
+    response = client.post("/ai/stream", json={"user_input": "你好"})
+    assert response.status_code == 502
+    assert "配額" in response.json()["detail"]
+
+
+def test_stream_requires_user_input():
+    response = client.post("/ai/stream", json={})
+    assert response.status_code == 422
@@ -1,5 +1,8 @@
+import time
+
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.circuit_breaker import gemini_circuit_breaker
 
 client = TestClient(app)#fastapi的假瀏覽器，假HTTPclient,這樣就可以不用自己開伺服器 不用開port
 #testclient裡面的括號，就是app 整包丟近testclient得到client 物件
@@ -13,5 +16,62 @@ def test_root():
 def test_health():
     response = client.get("/health")
     assert response.status_code == 200
-    assert response.json() == {"status": "Welcome to CARE Backend!"}
-#給機器看的健康檢查，K8s,cloud run 給監控系統看的
\ No newline at end of file
+    assert response.json() == {
+        "status": "Welcome to CARE Backend!",
+        "gemini_circuit": "closed",#Gemini 斷路器正常
+        "degraded": False,
+    }
+#給機器看的健康檢查，K8s,cloud run 給監控系統看的
+
+def test_stats():
+    response = client.get("/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert {"webhook_queue", "gemini_http_pool", "response_cache"} <= data.keys()
+
+
+def test_metrics():
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "care_stage_duration_seconds" in response.text
+
+
+def test_loop_diagnostics_disabled_by_default():
+    response = client.get("/diagnostics/loop")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["enabled"] is False
+    assert data["blocking_calls"] == []
+
+
+def test_health_reports_open_circuit():
+    breaker = gemini_circuit_breaker
+    breaker._transition("open")#模擬 Gemini 持續故障
+    try:
+        data = client.get("/health").json()
+        assert data["gemini_circuit"] == "open"
+        assert data["degraded"] is True
+    finally:
+        breaker._transition("closed")
+
+
+def test_ready_before_startup_returns_503():
+    #沒有執行 lifespan（worker 尚未啟動完成）時不應接收流量
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["checks"]["startup"] is False
+
+
+def test_ready_after_startup():
+    with TestClient(app) as started_client:#with 會執行 lifespan 的啟動與關閉
+        #服務在背景預熱，完成前回傳 503
+        deadline = time.monotonic() + 10
+        response = started_client.get("/ready")
+        while response.status_code == 503 and time.monotonic() < deadline:
+            time.sleep(0.05)
+            response = started_client.get("/ready")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ready"] is True
+    assert all(data["checks"].values())
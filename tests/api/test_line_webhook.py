@@ -1,14 +1,25 @@
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import MessageEvent
 
+from app.dependencies import get_webhook_parser
 from app.main import app
 
 client = TestClient(app)
 
 
+@pytest.fixture
+def mock_parser():
+    #以 dependency_overrides 換掉延遲建立的 webhook 解析器
+    parser = MagicMock()
+    app.dependency_overrides[get_webhook_parser] = lambda: parser
+    yield parser
+    app.dependency_overrides.pop(get_webhook_parser, None)
+
+
 def test_callback_missing_signature_returns_400():
     response = client.post(
         "/line/callback",
@@ -20,7 +31,6 @@ def test_callback_missing_signature_returns_400():
     assert "missing" in detail.lower() or "signature" in detail.lower()
 
 
-@patch("app.routers.line.webhook.parser")
 def test_callback_invalid_signature_returns_400(mock_parser):
     mock_parser.parse.side_effect = InvalidSignatureError("invalid")
     response = client.post(
@@ -35,7 +45,6 @@ def test_callback_invalid_signature_returns_400(mock_parser):
     assert "signature" in response.json().get("detail", "").lower()
 
 
-@patch("app.routers.line.webhook.parser")
 def test_callback_valid_request_returns_200(mock_parser):
     mock_parser.parse.return_value = []
     response = client.post(
@@ -48,3 +57,100 @@ def test_callback_valid_request_returns_200(mock_parser):
     )
     assert response.status_code == 200
     assert response.text == '"OK"'
+
+
+def _text_event(webhook_event_id, text="你好", user_id="U123"):
+    return MessageEvent.from_dict({
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1700000000000,
+        "source": {"type": "user", "userId": user_id},
+        "webhookEventId": webhook_event_id,
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": "reply_token_xxx",
+        "message": {"id": "1", "type": "text", "quoteToken": "q", "text": text},
+    })
+
+
+@patch("app.routers.line.webhook.handle_text_message_async", new_callable=AsyncMock)
+def test_callback_drops_redelivered_events(mock_handler, mock_parser):
+    event = _text_event("01HDEDUPTEST0000000000000")
+    mock_parser.parse.return_value = [event, event]#同一個事件被 LINE 重送
+    response = client.post(
+        "/line/callback",
+        content=b'{"events":[]}',
+        headers={
+            "Content-Type": "application/json",
+            "X-Line-Signature": "valid_signature",
+        },
+    )
+    assert response.status_code == 200
+    mock_handler.assert_awaited_once()
+
+
+@patch("app.routers.line.webhook.handle_text_message_async", new_callable=AsyncMock)
+@patch("app.routers.line.webhook.handle_location_message_async", new_callable=AsyncMock)
+def test_callback_routes_location_messages(mock_location_handler, mock_text_handler, mock_parser):
+    event = MessageEvent.from_dict({
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1700000000000,
+        "source": {"type": "user", "userId": "U123"},
+        "webhookEventId": "01HLOCATIONTEST0000000000",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": "reply_token_xxx",
+        "message": {"id": "2", "type": "location", "latitude": 25.033, "longitude": 121.543, "address": "台北市"},
+    })
+    mock_parser.parse.return_value = [event]
+    response = client.post(
+        "/line/callback",
+        content=b'{"events":[]}',
+        headers={
+            "Content-Type": "application/json",
+            "X-Line-Signature": "valid_signature",
+        },
+    )
+    assert response.status_code == 200
+    mock_location_handler.assert_awaited_once_with(event)
+    mock_text_handler.assert_not_awaited()
+
+
+@patch("app.routers.line.webhook.webhook_job_queue")
+def test_callback_returns_503_and_allows_redelivery_when_queue_is_full(mock_queue, mock_parser):
+    mock_queue.is_running = True
+    mock_queue.submit.return_value = False#佇列已滿
+    mock_queue.key_is_full.return_value = False
+    event = _text_event("01HQUEUEFULLTEST000000000")
+    mock_parser.parse.return_value = [event]
+    headers = {"Content-Type": "application/json", "X-Line-Signature": "valid_signature"}
+
+    response = client.post("/line/callback", content=b'{"events":[]}', headers=headers)
+    assert response.status_code == 503
+
+    # LINE 重送同一個事件時不能被當成重複事件丟掉
+    mock_queue.submit.return_value = True
+    response = client.post("/line/callback", content=b'{"events":[]}', headers=headers)
+    assert response.status_code == 200
+    assert mock_queue.submit.call_count == 2
+
+
+@patch("app.routers.line.webhook.webhook_job_queue")
+def test_callback_drops_events_over_per_user_cap_and_returns_200(mock_queue, mock_parser):
+    mock_queue.is_running = True
+    # 只有 USPAM 超過每位使用者的上限，佇列本身沒有滿
+    mock_queue.submit.side_effect = lambda handler, event, key=None: key != "USPAM"
+    mock_queue.key_is_full.side_effect = lambda key: key == "USPAM"
+    spam = _text_event("01HPERUSERCAPSPAM00000000", user_id="USPAM")
+    other = _text_event("01HPERUSERCAPOTHER0000000", user_id="UOTHER")
+    mock_parser.parse.return_value = [spam, other]
+    headers = {"Content-Type": "application/json", "X-Line-Signature": "valid_signature"}
+
+    response = client.post("/line/callback", content=b'{"events":[]}', headers=headers)
+    assert response.status_code == 200#單一使用者洗版不能讓整個 webhook 失敗
+
+    # 被捨棄的事件仍記錄為已處理，LINE 重送時直接略過
+    mock_queue.submit.reset_mock()
+    mock_parser.parse.return_value = [spam]
+    response = client.post("/line/callback", content=b'{"events":[]}', headers=headers)
+    assert response.status_code == 200
+    mock_queue.submit.assert_not_called()
@@ -3,7 +3,7 @@ import os
 import pytest
 import requests
 
-from app.services.line.token_manager import line_token_manager
+from app.dependencies import get_line_token_manager
 
 
 def _has_line_credentials():#檢查我在env 裡面有沒有設token
@@ -17,7 +17,7 @@ def _has_line_credentials():#檢查我在env 裡面有沒有設token
     reason="Need LINE_CHANNEL_ID and LINE_CHANNEL_SECRET in .env",
 )
 def test_get_token_returns_non_empty_string():
-    token = line_token_manager.get_token()#跟真正的lineOAuth伺服器要access token
+    token = get_line_token_manager().get_token()#跟真正的lineOAuth伺服器要access token
     assert isinstance(token, str)#確認回傳 token是字串
     assert len(token) > 0#確認回傳token不是空字串
 
@@ -27,7 +27,7 @@ def test_get_token_returns_non_empty_string():
     reason="Need LINE_CHANNEL_ID and LINE_CHANNEL_SECRET in .env",
 )
 def test_get_token_valid_against_line_api():
-    token = line_token_manager.get_token()
+    token = get_line_token_manager().get_token()
     resp = requests.get(
         "https://api.line.me/v2/bot/info",#這個你在router 裡面找不到，不是router定義的endpoint，這是line 的API
         headers={"Authorization": f"Bearer {token}"},
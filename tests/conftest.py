@@ -0,0 +1,8 @@
+"""
+測試共用設定
+Settings 在 import app 時讀取環境變數，必須在任何測試 import app 之前設定。
+"""
+import os
+
+# 經過 lifespan 的測試會讀寫共用狀態（含 LINE token）；改用記憶體，不在專案目錄留下或覆寫正式的 care_state.sqlite3
+os.environ["SHARED_STATE_BACKEND"] = "memory"
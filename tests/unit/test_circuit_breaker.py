@@ -0,0 +1,101 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, _is_gemini_outage
+from app.services.gemini_service import GeminiAPIError, GeminiService
+#斷路器單元測試：失敗率過高時打開、冷卻後試探、試探成功才恢復
+
+
+def make_breaker(**kwargs):
+    options = {"window_size": 4, "minimum_calls": 4, "open_duration": 30, "half_open_max_calls": 1}
+    options.update(kwargs)
+    return CircuitBreaker("test", **options)
+
+
+async def fail():
+    raise GeminiAPIError("down", 503)
+
+
+async def ok():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_opens_after_failure_rate_and_fails_fast():
+    breaker = make_breaker()
+    for _ in range(2):
+        assert await breaker.run(ok) == "ok"
+    for _ in range(2):
+        with pytest.raises(GeminiAPIError):
+            await breaker.run(fail)
+
+    assert breaker.state == "open"#4 次中失敗 2 次，達到 50%
+    with pytest.raises(CircuitOpenError):
+        await breaker.run(ok)#開啟中直接拒絕，不呼叫
+    assert breaker.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe_closes_or_reopens():
+    breaker = make_breaker(minimum_calls=1, window_size=1)
+    with pytest.raises(GeminiAPIError):
+        await breaker.run(fail)
+    assert breaker.state == "open"
+
+    with patch("app.services.circuit_breaker.time.monotonic", return_value=breaker._opened_at + 31):
+        assert breaker.state == "half_open"
+        with pytest.raises(GeminiAPIError):
+            await breaker.run(fail)#試探失敗，再次打開
+        assert breaker.state == "open"
+
+    with patch("app.services.circuit_breaker.time.monotonic", return_value=breaker._opened_at + 31):
+        assert await breaker.run(ok) == "ok"
+        assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_count_as_failures():
+    breaker = make_breaker(minimum_calls=1, window_size=1, is_failure=lambda e: e.status_code >= 500)
+
+    async def bad_request():
+        raise GeminiAPIError("bad", 400)
+
+    with pytest.raises(GeminiAPIError):
+        await breaker.run(bad_request)
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_open_the_circuit():
+    breaker = make_breaker(minimum_calls=2, window_size=2, slow_call_threshold=0.01, slow_call_rate_threshold=1.0)
+
+    async def slow():
+        await asyncio.sleep(0.02)
+        return "ok"
+
+    await breaker.run(slow)
+    await breaker.run(slow)
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_blocked_response_is_not_an_outage():
+    # Gemini 以 200 回覆被安全機制擋下的內容（沒有 content），不能讓斷路器打開
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {"candidates": [{"finishReason": "SAFETY"}]}
+    http_pool = MagicMock()
+    http_pool.client.post = AsyncMock(return_value=response)
+    breaker = make_breaker(is_failure=_is_gemini_outage)
+    service = GeminiService(http_pool=http_pool, circuit_breaker=breaker)
+
+    for _ in range(4):
+        with pytest.raises(ValueError):
+            await service._call({}, "自殺的念頭怎麼辦", None)
+
+    assert breaker.state == "closed"
+    assert _is_gemini_outage(GeminiAPIError("timeout")) is True
+    assert _is_gemini_outage(GeminiAPIError("down", 503)) is True
+    assert _is_gemini_outage(GeminiAPIError("bad request", 400)) is False
@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from app.services.conversation_store import (
+    MODEL_ROLE,
+    USER_ROLE,
+    ConversationStore,
+    SQLiteConversationStore,
+)
+#對話記憶單元測試：ring buffer 輪數上限、token 預算裁切、閒置淘汰
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def _make(**kwargs):
+        options = {"max_turns": 4, "token_budget": 1000, "idle_ttl": 60}
+        options.update(kwargs)
+        if request.param == "memory":
+            return ConversationStore(max_users=100, **options)
+        return SQLiteConversationStore(str(tmp_path / "conversations.sqlite3"), **options)
+    return _make
+
+
+def test_history_keeps_only_latest_turns(make_store):
+    store = make_store()
+    for i in range(3):
+        store.append("u1", USER_ROLE, f"問題{i}")
+        store.append("u1", MODEL_ROLE, f"回答{i}")
+
+    history = store.get_history("u1")
+    assert [t.text for t in history] == ["問題1", "回答1", "問題2", "回答2"]#只保留最近 4 筆
+    assert store.get_history("u2") == []#不同使用者互不影響
+
+
+def test_history_trimmed_to_token_budget_and_starts_with_user(make_store):
+    store = make_store(token_budget=25)
+    store.append("u1", USER_ROLE, "一" * 10)
+    store.append("u1", MODEL_ROLE, "二" * 10)
+    store.append("u1", USER_ROLE, "三" * 10)
+    store.append("u1", MODEL_ROLE, "四" * 10)
+
+    history = store.get_history("u1")
+    #預算只夠最新兩筆，且第一筆必須是使用者的發言
+    assert [t.role for t in history] == [USER_ROLE, MODEL_ROLE]
+    assert history[0].text == "三" * 10
+
+
+def test_idle_conversations_are_evicted(make_store):
+    store = make_store(idle_ttl=0.01)
+    store.append("u1", USER_ROLE, "你好")
+    time.sleep(0.02)
+
+    assert store.evict_idle() == 1
+    assert store.get_history("u1") == []
+
+
+def test_memory_store_caps_number_of_users():
+    store = ConversationStore(max_turns=4, token_budget=1000, idle_ttl=60, max_users=2)
+    for user_id in ["u1", "u2", "u3"]:
+        store.append(user_id, USER_ROLE, "你好")
+
+    assert store.get_history("u1") == []#最久沒互動的使用者被淘汰
+    assert store.stats()["users"] == 2
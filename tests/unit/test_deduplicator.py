@@ -0,0 +1,65 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.line.deduplicator import EventDeduplicator, MemorySeenSet, SQLiteSeenSet
+#事件去重單元測試：相同 webhookEventId 第二次要被丟棄，過期後可再處理
+
+
+def _event(event_id, is_redelivery=False):
+    return SimpleNamespace(
+        webhook_event_id=event_id,
+        delivery_context=SimpleNamespace(is_redelivery=is_redelivery),
+    )
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_seen_set(request, tmp_path):
+    def _make(ttl=60, max_entries=100):
+        if request.param == "memory":
+            return MemorySeenSet(ttl=ttl, max_entries=max_entries)
+        return SQLiteSeenSet(str(tmp_path / "events.sqlite3"), ttl=ttl, max_entries=max_entries)
+    return _make
+
+
+def test_redelivered_event_is_suppressed(make_seen_set):
+    dedup = EventDeduplicator(make_seen_set())
+    assert dedup.is_duplicate(_event("01H000")) is False
+    assert dedup.is_duplicate(_event("01H000", is_redelivery=True)) is True
+    assert dedup.is_duplicate(_event("01H001")) is False
+
+    stats = dedup.stats()
+    assert stats["suppressed"] == 1
+    assert stats["redeliveries"] == 1
+
+
+def test_event_can_be_processed_again_after_ttl(make_seen_set):
+    dedup = EventDeduplicator(make_seen_set(ttl=0.01))
+    assert dedup.is_duplicate(_event("01H000")) is False
+    time.sleep(0.02)
+    assert dedup.is_duplicate(_event("01H000")) is False
+
+
+def test_forgotten_event_can_be_processed_again(make_seen_set):
+    # 事件沒排進佇列時取消紀錄，LINE 重送時要能再處理
+    dedup = EventDeduplicator(make_seen_set())
+    assert dedup.is_duplicate(_event("01H000")) is False
+    dedup.forget(_event("01H000"))
+    assert dedup.is_duplicate(_event("01H000", is_redelivery=True)) is False
+    assert dedup.stats()["suppressed"] == 0
+
+
+def test_memory_seen_set_is_capped():
+    seen_set = MemorySeenSet(ttl=60, max_entries=2)
+    for event_id in ["a", "b", "c"]:
+        seen_set.add_if_absent(event_id)
+    assert len(seen_set) == 2
+    assert seen_set.add_if_absent("a") is True#最舊的 a 已被淘汰
+
+
+def test_events_without_id_are_never_suppressed():
+    dedup = EventDeduplicator(MemorySeenSet(ttl=60, max_entries=10))
+    event = SimpleNamespace(webhook_event_id=None)
+    assert dedup.is_duplicate(event) is False
+    assert dedup.is_duplicate(event) is False
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from app import dependencies
+from app.dependencies import get_gemini_service, get_webhook_parser
+
+
+def test_services_created_once():
+    # 第一次取得時才建立，之後都是同一個實例
+    assert get_gemini_service() is get_gemini_service()
+    assert get_webhook_parser() is get_webhook_parser()
+
+
+def test_cache_clear_recreates_service():
+    first = get_webhook_parser()
+    get_webhook_parser.cache_clear()
+    try:
+        assert get_webhook_parser() is not first
+    finally:
+        get_webhook_parser.cache_clear()
+
+
+def _run_in_new_process(code, **env):
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=Path(__file__).resolve().parents[2],
+        env={**os.environ, **env},
+        capture_output=True,
+        text=True,
+        timeout=60,
+        check=True,
+    )
+
+
+def test_importing_app_does_not_load_linebot():
+    # 在新的程序中 import app.main，linebot SDK 應該要等到預熱或第一次使用才載入
+    code = (
+        "import sys, app.main; "
+        "loaded = [m for m in sys.modules if m.startswith('linebot')]; "
+        "print(','.join(loaded))"
+    )
+    result = _run_in_new_process(code)
+    assert result.stdout.strip() == ""
+
+
+def test_importing_app_does_not_open_shared_state(tmp_path):
+    # 共用狀態（含 LINE token）要等到第一次使用才開啟 SQLite 檔案
+    path = tmp_path / "state.sqlite3"
+    _run_in_new_process("import app.main", SHARED_STATE_BACKEND="sqlite", SHARED_STATE_PATH=str(path))
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_wait_until_warm_runs_off_loop_and_backs_off(monkeypatch):
+    threads = []
+
+    def failing_warm_up():
+        # 模擬預熱失敗：記錄執行的 thread 並進入退避
+        threads.append(threading.get_ident())
+        dependencies._retry_at = time.monotonic() + dependencies.WARM_UP_RETRY_BACKOFF
+
+    monkeypatch.setattr(dependencies, "warm_up", failing_warm_up)
+    monkeypatch.setattr(dependencies, "_warm", threading.Event())
+    monkeypatch.setattr(dependencies, "_warm_up_task", None)
+    monkeypatch.setattr(dependencies, "_retry_at", 0.0)
+
+    await dependencies.wait_until_warm()
+    assert threads and threads[0] != threading.get_ident()
+    # 退避期間不再重試
+    await dependencies.wait_until_warm()
+    assert len(threads) == 1
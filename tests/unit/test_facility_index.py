@@ -0,0 +1,98 @@
+import csv
+import io
+import random
+
+from app.services.facility_index import Facility, FacilityIndex, GridIndex, haversine_km, load_facilities
+#本地醫療院所索引單元測試：CSV 載入、縣市科別查詢、名稱查詢與網格最近鄰搜尋
+
+SAMPLE_CSV = """醫事機構代碼,醫事機構名稱,醫事機構種類,電話,地址,診療科別,緯度,經度
+0001,測試大安眼科診所,西醫診所,02-1111-1111,106臺北市大安區復興南路一段1號,眼科,25.0330,121.5430
+0002,測試信義聯合醫院,區域醫院,02-2222-2222,臺北市信義區松仁路2號,"內科,外科,眼科",25.0360,121.5680
+0003,測試板橋耳鼻喉科診所,西醫診所,02-3333-3333,新北市板橋區文化路3號,耳鼻喉科,25.0140,121.4630
+0004,測試竹北牙醫診所,牙醫診所,03-4444-4444,新竹縣竹北市光明六路4號,牙科,,
+"""
+
+
+def build_index():
+    return load_facilities(csv.DictReader(io.StringIO(SAMPLE_CSV)))
+
+
+def test_load_facilities_from_csv():
+    index = build_index()
+    assert index.stats() == {"facilities": 4, "located": 3, "areas": 10, "departments": 5}
+    assert index.facilities[1].departments == ("內科", "外科", "眼科")
+
+
+def test_search_by_area_and_department():
+    index = build_index()
+    names = [f.name for f in index.search("台北市有哪些眼科？")]
+    assert names == ["測試大安眼科診所", "測試信義聯合醫院"]
+
+    names = [f.name for f in index.search("臺北大安區的眼科")]#臺/台、省略「市」都能查到
+    assert names == ["測試大安眼科診所"]
+
+    assert index.search("新北市有眼科嗎") == []#條件都要符合
+
+
+def test_search_by_kind_sorted_by_distance():
+    index = build_index()
+    names = [f.name for f in index.search("台北的醫院", near=(25.036, 121.568))]
+    assert names == ["測試信義聯合醫院"]
+
+    names = [f.name for f in index.search("台北市眼科", near=(25.036, 121.568))]
+    assert names[0] == "測試信義聯合醫院"#離查詢位置較近的排前面
+
+
+def test_search_by_facility_name():
+    index = build_index()
+    names = [f.name for f in index.search("竹北牙醫的電話是多少")]
+    assert names == ["測試竹北牙醫診所"]
+    assert index.search("今天天氣如何") == []
+
+
+def test_generic_questions_without_area_or_name_return_nothing():
+    index = build_index()
+    #只有種類或科別無法指出特定院所，不應回傳資料中任意幾筆
+    assert index.search("頭痛需要去醫院嗎") == []
+    assert index.search("眼睛痛要看眼科嗎") == []
+    assert index.search("感冒要去診所還是醫院") == []
+
+
+def test_kind_terms_are_alternatives():
+    index = build_index()
+    names = [f.name for f in index.search("台北市的診所還是醫院")]
+    assert names == ["測試大安眼科診所", "測試信義聯合醫院"]
+
+
+def test_nearest_with_department_filter():
+    index = build_index()
+    results = index.nearest(25.0335, 121.5435, k=2)
+    assert [f.name for f, _ in results] == ["測試大安眼科診所", "測試信義聯合醫院"]
+    assert results[0][1] < 0.1
+
+    results = index.nearest(25.0335, 121.5435, k=5, department="耳鼻喉科")
+    assert [f.name for f, _ in results] == ["測試板橋耳鼻喉科診所"]
+
+    results = index.nearest(25.0335, 121.5435, k=5, max_km=1)
+    assert [f.name for f, _ in results] == ["測試大安眼科診所"]#其他院所都超過 1 公里
+
+
+def test_grid_nearest_matches_brute_force():
+    rng = random.Random(7)
+    points = [(rng.uniform(21.9, 25.3), rng.uniform(120.0, 122.0)) for _ in range(2000)]
+    grid = GridIndex(cell_size=0.02)
+    for item, (lat, lng) in enumerate(points):
+        grid.add(item, lat, lng)
+
+    for _ in range(50):
+        lat, lng = rng.uniform(21.5, 25.5), rng.uniform(119.8, 122.2)
+        expected = sorted(range(len(points)), key=lambda i: haversine_km(lat, lng, *points[i]))[:5]
+        assert [item for item, _ in grid.nearest(lat, lng, k=5)] == expected
+
+
+def test_empty_index_returns_nothing():
+    index = FacilityIndex()
+    assert index.search("台北市眼科") == []
+    assert index.nearest(25.0, 121.5) == []
+    index.add(Facility("x", "無座標診所", address="台北市中正區"))
+    assert index.nearest(25.0, 121.5) == []
@@ -0,0 +1,69 @@
+import base64
+import hashlib
+import hmac
+import json
+
+import pytest
+from linebot.v3.exceptions import InvalidSignatureError
+from linebot.v3.webhooks import MessageEvent, TextMessageContent
+
+from app.services.line.fast_parser import FastWebhookParser
+#Webhook 快速解析單元測試：bytes 上驗證簽名、只建立會處理的事件
+
+SECRET = "test_secret"
+
+
+def _sign(body: bytes) -> str:
+    return base64.b64encode(hmac.new(SECRET.encode(), body, hashlib.sha256).digest()).decode()
+
+
+def _body():
+    base = {
+        "mode": "active",
+        "timestamp": 1700000000000,
+        "source": {"type": "user", "userId": "U123"},
+        "webhookEventId": "01H000",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": "reply_token_xxx",
+    }
+    events = [
+        {**base, "type": "message", "message": {"id": "1", "type": "text", "quoteToken": "q", "text": "你好"}},
+        {**base, "type": "message", "message": {
+            "id": "2", "type": "sticker", "quoteToken": "q",
+            "packageId": "1", "stickerId": "1", "stickerResourceType": "STATIC",
+        }},
+        {**base, "type": "follow", "follow": {"isUnblocked": False}},
+    ]
+    return json.dumps({"destination": "Ubot", "events": events}, ensure_ascii=False).encode("utf-8")
+
+
+def test_parse_only_builds_handled_events():
+    body = _body()
+    events = FastWebhookParser(SECRET).parse(body, _sign(body))
+
+    assert len(events) == 1#貼圖與追蹤事件不會建立 model
+    assert isinstance(events[0], MessageEvent)
+    assert isinstance(events[0].message, TextMessageContent)
+    assert events[0].message.text == "你好"
+
+
+def test_parse_rejects_invalid_signature():
+    body = _body()
+    with pytest.raises(InvalidSignatureError):
+        FastWebhookParser(SECRET).parse(body, _sign(body + b" "))
+
+
+def test_signature_matches_sdk_validator():
+    from linebot.v3.webhook import SignatureValidator
+
+    body = _body()
+    signature = _sign(body)
+    assert SignatureValidator(SECRET).validate(body.decode("utf-8"), signature)
+    assert FastWebhookParser(SECRET).verify(body, signature)
+
+
+def test_parse_builds_configured_message_types():
+    body = _body()
+    events = FastWebhookParser(SECRET, handled_message_types=("text", "sticker")).parse(body, _sign(body))
+
+    assert [event.message.type for event in events] == ["text", "sticker"]
@@ -1,6 +1,13 @@
 from unittest.mock import AsyncMock, MagicMock, patch
+import httpx
 import pytest
-from app.services.gemini_service import GeminiService
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.context_cache import GeminiContextCache
+from app.services.conversation_store import Turn
+from app.services.gemini_service import GeminiService, GeminiUnavailableError
+from app.services.response_cache import MemoryCacheBackend, ResponseCache
+from app.services.shared_state import MemoryStateStore
+from app.services.token_usage import TRUNCATION_MARKER, PromptBudget, TokenUsageTracker
 #單元測試：mock httpx，不打真實 Gemini API
 @patch("app.services.gemini_service.settings")
 @pytest.mark.asyncio
@@ -15,14 +22,11 @@ async def test_generate_response_returns_text_on_success(mock_settings):#確定s
         ]
     }
     post = AsyncMock(return_value=response)#把真正的 httpx.AsyncClient 替換成假method
-    client_instance = MagicMock()
-    client_instance.post = post
+    http_pool = MagicMock()#假的共用連線池，client.post 是假method
+    http_pool.client.post = post
 
-    with patch("app.services.gemini_service.httpx.AsyncClient") as mock_ac:
-        mock_ac.return_value.__aenter__ = AsyncMock(return_value=client_instance)
-        mock_ac.return_value.__aexit__ = AsyncMock(return_value=None)
-        service = GeminiService()
-        result = await service.generate_response("你好")#這會去呼叫client.post
+    service = GeminiService(http_pool=http_pool)
+    result = await service.generate_response("你好")#這會去呼叫client.post
 
     assert result == "AI 回覆內容"
     assert post.called#如果generate_response沒有去呼叫post，就會是false
@@ -37,13 +41,164 @@ async def test_generate_response_raises_value_error_on_4xx(mock_settings):
     response.status_code = 429#當gemini回傳429 配額超限
     response.text = "quota exceeded"
     post = AsyncMock(return_value=response)
-    client_instance = MagicMock()
-    client_instance.post = post
-
-    with patch("app.services.gemini_service.httpx.AsyncClient") as mock_ac:
-        mock_ac.return_value.__aenter__ = AsyncMock(return_value=client_instance)
-        mock_ac.return_value.__aexit__ = AsyncMock(return_value=None)
-        service = GeminiService()
-        with pytest.raises(ValueError) as exc_info:
-            await service.generate_response("hi")
-        assert "配額" in str(exc_info.value) or "429" in str(exc_info.value)#確定在配額不足時候 有正常拋出錯誤訊息
+    http_pool = MagicMock()
+    http_pool.client.post = post
+
+    service = GeminiService(http_pool=http_pool)
+    with pytest.raises(ValueError) as exc_info:
+        await service.generate_response("hi")
+    assert "配額" in str(exc_info.value) or "429" in str(exc_info.value)#確定在配額不足時候 有正常拋出錯誤訊息
+
+
+@patch("app.services.gemini_service.settings")
+@pytest.mark.asyncio
+async def test_generate_response_served_from_cache(mock_settings):#相同問題第二次不應該再打 Gemini
+    mock_settings.GEMINI_API_KEY = "test_key"
+    mock_settings.MODEL_NAME = "gemini-2.0-flash"
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {
+        "candidates": [
+            {"content": {"parts": [{"text": "快取回覆"}]}}
+        ]
+    }
+    post = AsyncMock(return_value=response)
+    http_pool = MagicMock()
+    http_pool.client.post = post
+
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60)
+    service = GeminiService(http_pool=http_pool, cache=cache)
+    first = await service.generate_response("台北市有哪些醫院？")
+    second = await service.generate_response("台北市有哪些醫院")
+
+    assert first == second == "快取回覆"
+    assert post.call_count == 1
+
+
+def _sse_pool(status_code, body):
+    #用 httpx.MockTransport 假裝 Gemini 的 SSE 串流回應
+    transport = httpx.MockTransport(lambda request: httpx.Response(status_code, content=body))
+    http_pool = MagicMock()
+    http_pool.client = httpx.AsyncClient(transport=transport)
+    return http_pool
+
+
+@pytest.mark.asyncio
+async def test_stream_response_yields_chunks_in_order():
+    body = (
+        'data: {"candidates": [{"content": {"parts": [{"text": "台大"}]}}]}\n\n'
+        'data: {"candidates": [{"content": {"parts": [{"text": "醫院"}]}}]}\n\n'
+    ).encode("utf-8")
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60)
+    service = GeminiService(http_pool=_sse_pool(200, body), cache=cache)
+
+    chunks = [chunk async for chunk in service.stream_response("台北市有哪些醫院")]
+
+    assert chunks == ["台大", "醫院"]
+    assert cache.stats()["entries"] == 1#串流完成後整段回覆會寫入快取
+
+
+@pytest.mark.asyncio
+async def test_stream_response_raises_value_error_on_4xx():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60)
+    service = GeminiService(http_pool=_sse_pool(429, b"quota exceeded"), cache=cache)
+
+    with pytest.raises(ValueError) as exc_info:
+        async for _ in service.stream_response("hi"):
+            pass
+    assert "配額" in str(exc_info.value)
+
+
+@patch("app.services.gemini_service.settings")
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_or_serves_cache(mock_settings):#斷路器開啟時不呼叫 Gemini
+    mock_settings.GEMINI_API_KEY = "test_key"
+    mock_settings.MODEL_NAME = "gemini-2.0-flash"
+    post = AsyncMock()
+    http_pool = MagicMock()
+    http_pool.client.post = post
+    breaker = CircuitBreaker("test", open_duration=30)
+    breaker._transition("open")
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60)
+    service = GeminiService(http_pool=http_pool, cache=cache, circuit_breaker=breaker)
+
+    with pytest.raises(GeminiUnavailableError):
+        await service.generate_response("糖尿病要注意什麼")
+
+    cache.set(cache.make_key("糖尿病要注意什麼", service.model_name, service.system_instruction), "快取回覆")
+    history = [Turn("user", "你好", 2, 0.0), Turn("model", "您好", 2, 0.0)]
+    assert await service.generate_response("糖尿病要注意什麼", history=history) == "快取回覆"#降級模式連有上下文的問題也用快取
+    post.assert_not_called()
+
+
+def _response(status_code, data=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = "error"
+    response.json.return_value = data
+    return response
+
+
+_OK = {
+    "candidates": [{"content": {"parts": [{"text": "回覆"}]}}],
+    "usageMetadata": {"promptTokenCount": 120, "candidatesTokenCount": 30, "totalTokenCount": 150},
+}
+
+
+@patch("app.services.gemini_service.settings")
+@pytest.mark.asyncio
+async def test_usage_recorded_and_long_input_truncated(mock_settings):#記錄 usageMetadata，過長的輸入截斷後才送出
+    mock_settings.GEMINI_API_KEY = "test_key"
+    mock_settings.MODEL_NAME = "gemini-2.0-flash"
+    post = AsyncMock(return_value=_response(200, _OK))
+    http_pool = MagicMock()
+    http_pool.client.post = post
+    usage = TokenUsageTracker()
+    budget = PromptBudget(max_input_tokens=50, max_output_tokens=256)
+    service = GeminiService(
+        http_pool=http_pool,
+        cache=ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60),
+        token_usage=usage,
+        prompt_budget=budget,
+    )
+
+    await service.generate_response("頭痛" * 500, user_id="U1")
+
+    payload = post.call_args.kwargs["json"]
+    sent = payload["contents"][-1]["parts"][0]["text"]
+    assert sent.endswith(TRUNCATION_MARKER) and len(sent) < 60
+    assert payload["generationConfig"] == {"maxOutputTokens": 256}
+    assert usage.usage_for("U1")["prompt_tokens"] == 120
+    assert usage.stats()["total_tokens"] == 150
+    assert budget.stats()["truncated_inputs"] == 1
+
+
+@patch("app.services.gemini_service.settings")
+@pytest.mark.asyncio
+async def test_cached_content_used_and_dropped_when_rejected(mock_settings):#cachedContent 失效時改帶 system instruction 重送
+    mock_settings.GEMINI_API_KEY = "test_key"
+    mock_settings.MODEL_NAME = "gemini-2.0-flash"
+    post = AsyncMock(side_effect=[
+        _response(200, {"name": "cachedContents/abc"}),
+        _response(200, _OK),
+        _response(404),
+        _response(200, _OK),
+    ])
+    http_pool = MagicMock()
+    http_pool.client.post = post
+    context_cache = GeminiContextCache(http_pool=http_pool, state=MemoryStateStore(), min_tokens=1)
+    service = GeminiService(
+        http_pool=http_pool,
+        cache=ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60),
+        context_cache=context_cache,
+    )
+
+    await service.generate_response("第一個問題")
+    payload = post.call_args_list[1].kwargs["json"]
+    assert payload["cachedContent"] == "cachedContents/abc"
+    assert "systemInstruction" not in payload
+
+    assert await service.generate_response("第二個問題") == "回覆"
+    retried = post.call_args_list[3].kwargs["json"]
+    assert "cachedContent" not in retried and "systemInstruction" in retried
+    assert context_cache.stats()["invalidated"] == 1
@@ -0,0 +1,53 @@
+import pytest
+
+from app.services.http_pool import HttpClientPool
+#共用連線池單元測試：確認 client 會被重用，以及連線重用統計正確
+
+
+def _make_pool():
+    return HttpClientPool(
+        name="test",
+        max_connections=5,
+        max_keepalive_connections=5,
+        keepalive_expiry=30,
+        timeout=5,
+    )
+
+
+@pytest.mark.asyncio
+async def test_client_is_reused_until_shutdown():
+    pool = _make_pool()
+    first = pool.client
+    assert pool.client is first#同一個 pool 每次拿到的都是同一個 client
+
+    await pool.shutdown()
+    assert first.is_closed
+    assert pool.client is not first#關閉後再拿會建立新的 client
+    await pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_trace_counts_new_and_reused_connections():
+    pool = _make_pool()
+    #模擬 httpcore trace 事件：第一個請求開新連線，後面兩個請求重用連線
+    await pool._trace("connection.connect_tcp.started", {})
+    for _ in range(3):
+        await pool._trace("http11.send_request_headers.started", {})
+
+    stats = pool.stats()
+    assert stats["requests"] == 3
+    assert stats["new_connections"] == 1
+    assert stats["reused_connections"] == 2
+
+
+def test_http2_falls_back_when_h2_missing(monkeypatch):
+    monkeypatch.setattr("app.services.http_pool._http2_available", lambda: False)
+    pool = HttpClientPool(
+        name="test",
+        max_connections=5,
+        max_keepalive_connections=5,
+        keepalive_expiry=30,
+        timeout=5,
+        http2=True,
+    )
+    assert pool.http2 is False
@@ -0,0 +1,48 @@
+from app.services.intent_router import AhoCorasick, IntentRouter, normalize_message
+#意圖路由單元測試：多字串比對、罐頭意圖需佔滿訊息、緊急狀況一律優先
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick()
+    for pattern in ["he", "she", "his", "hers"]:
+        matcher.add(pattern, pattern)
+    matches = sorted((start, value) for start, _, value in matcher.find_all("ushers"))
+    assert matches == [(1, "she"), (2, "he"), (2, "hers")]
+
+
+def test_normalize_message_strips_punctuation_and_width():
+    assert normalize_message("ＨＩ～ 你好！！😊") == "hi你好"
+
+
+def test_canned_intents_require_message_to_be_mostly_keywords():
+    router = IntentRouter()
+    assert router.classify("你好").name == "greeting"
+    assert router.classify("謝謝你！").name == "thanks"
+    assert router.classify("怎麼用？").name == "help"
+    assert router.classify("你好，我最近常常頭痛要看哪一科") is None#開放式問題交給 Gemini
+
+
+def test_emergency_takes_priority_anywhere_in_message():
+    router = IntentRouter()
+    assert router.classify("你好，我媽媽剛剛昏倒了怎麼辦").name == "emergency"
+    assert router.classify("最近壓力好大，有點想死").name == "crisis"
+    assert router.classify("胸痛").name == "emergency"#只有症狀也視為緊急
+    assert router.classify("我爸突然胸悶，要看哪一科？").name == "emergency"#有急迫字眼時仍以緊急處理
+
+
+def test_health_information_questions_are_not_emergencies():
+    router = IntentRouter()
+    #詢問資訊的問題交給 Gemini，不回覆固定的 119 訊息
+    for question in ["如何預防中風？", "中風的前兆有哪些", "農藥殘留對健康有影響嗎", "偶爾胸悶要看哪一科"]:
+        assert router.classify(question) is None, question
+
+
+def test_stats_report_hit_rate():
+    router = IntentRouter()
+    router.classify("你好")
+    router.classify("糖尿病要注意什麼")
+    stats = router.stats()
+    assert stats["messages"] == 2
+    assert stats["answered_locally"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["hits_greeting"] == 1
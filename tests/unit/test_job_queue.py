@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+
+from app.services.job_queue import JobQueue
+#背景工作佇列單元測試：確認工作會被 worker 執行、佇列滿時會拒絕、關閉時會等工作做完
+
+
+@pytest.mark.asyncio
+async def test_submitted_jobs_are_processed():
+    queue = JobQueue(name="test", worker_count=2, maxsize=10)
+    await queue.start()
+    results = []
+
+    async def job(value):
+        results.append(value)
+
+    assert queue.submit(job, 1) is True
+    assert queue.submit(job, 2) is True
+    await queue.shutdown(timeout=1)
+
+    assert sorted(results) == [1, 2]
+    stats = queue.stats()
+    assert stats["completed"] == 2
+    assert stats["failed"] == 0
+
+
+@pytest.mark.asyncio
+async def test_submit_rejected_when_queue_full():
+    queue = JobQueue(name="test", worker_count=1, maxsize=1)
+    await queue.start()
+    release = asyncio.Event()
+
+    async def blocking_job():
+        await release.wait()
+
+    assert queue.submit(blocking_job) is True
+    await asyncio.sleep(0)#讓 worker 先把第一個工作拿走
+    assert queue.submit(blocking_job) is True#佇列裡剩一格
+    assert queue.submit(blocking_job) is False#佇列滿了要拒絕
+    assert queue.stats()["rejected"] == 1
+
+    release.set()
+    await queue.shutdown(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_failed_job_does_not_stop_worker():
+    queue = JobQueue(name="test", worker_count=1, maxsize=10)
+    await queue.start()
+    results = []
+
+    async def bad_job():
+        raise RuntimeError("boom")
+
+    async def good_job():
+        results.append("ok")
+
+    queue.submit(bad_job)
+    queue.submit(good_job)
+    await queue.shutdown(timeout=1)
+
+    assert results == ["ok"]
+    assert queue.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_submit_rejected_when_not_running():
+    queue = JobQueue(name="test", worker_count=1, maxsize=10)
+
+    async def job():
+        pass
+
+    assert queue.submit(job) is False
+
+
+@pytest.mark.asyncio
+async def test_same_key_jobs_run_in_order_while_other_keys_run_concurrently():
+    queue = JobQueue(name="test", worker_count=4, maxsize=20)
+    await queue.start()
+    order = []
+    running = set()
+    max_running = 0
+
+    async def job(user_id, index):
+        nonlocal max_running
+        running.add(user_id)
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        order.append((user_id, index))
+        running.discard(user_id)
+
+    for index in range(3):
+        for user_id in ["u1", "u2"]:
+            queue.submit(job, user_id, index, key=user_id)
+    await queue.shutdown(timeout=2)
+
+    #同一使用者依序執行
+    assert [i for u, i in order if u == "u1"] == [0, 1, 2]
+    assert [i for u, i in order if u == "u2"] == [0, 1, 2]
+    #不同使用者會同時執行
+    assert max_running == 2
+    assert queue.stats()["active_lanes"] == 0
+
+
+@pytest.mark.asyncio
+async def test_lane_jobs_count_towards_maxsize():
+    queue = JobQueue(name="test", worker_count=1, maxsize=2)
+    await queue.start()
+    release = asyncio.Event()
+
+    async def blocking_job():
+        await release.wait()
+
+    assert queue.submit(blocking_job, key="u1") is True
+    assert queue.submit(blocking_job, key="u1") is True
+    assert queue.submit(blocking_job, key="u1") is False#車道中的工作也算在佇列深度內
+
+    release.set()
+    await queue.shutdown(timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_keys_take_turns_on_a_single_worker():
+    queue = JobQueue(name="test", worker_count=1, maxsize=20)
+    await queue.start()
+    order = []
+
+    async def job(user_id, index):
+        order.append((user_id, index))
+
+    for index in range(3):
+        queue.submit(job, "spammer", index, key="spammer")
+    queue.submit(job, "u2", 0, key="u2")
+    await queue.shutdown(timeout=2)
+
+    #同一使用者連續送出的訊息不會讓其他使用者等到全部處理完
+    assert order == [("spammer", 0), ("u2", 0), ("spammer", 1), ("spammer", 2)]
+
+
+@pytest.mark.asyncio
+async def test_pending_jobs_per_key_are_capped():
+    queue = JobQueue(name="test", worker_count=1, maxsize=10, max_pending_per_key=2)
+    await queue.start()
+    release = asyncio.Event()
+
+    async def blocking_job():
+        await release.wait()
+
+    assert queue.submit(blocking_job, key="u1") is True
+    assert queue.submit(blocking_job, key="u1") is True
+    assert queue.submit(blocking_job, key="u1") is False
+    assert queue.key_is_full("u1") is True#被拒絕是因為這個使用者，不是佇列滿了
+    assert queue.submit(blocking_job, key="u2") is True#其他使用者仍可排入
+    assert queue.key_is_full("u2") is False
+    assert queue.stats()["rejected_per_key"] == 1
+
+    release.set()
+    await queue.shutdown(timeout=1)
@@ -0,0 +1,56 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from linebot.v3.messaging import ApiException
+
+from app.services.line.loading_indicator import LoadingIndicator
+#載入動畫單元測試：背景呼叫 API、動畫進行中不重複呼叫、失敗不影響流程
+
+
+def make_indicator(**kwargs):
+    api = MagicMock()
+    api.show_loading_animation = AsyncMock()
+    client = MagicMock()
+    client.get_api = AsyncMock(return_value=api)
+    return LoadingIndicator(client=client, **kwargs), api
+
+
+@pytest.mark.asyncio
+async def test_trigger_shows_animation_once_while_active():
+    indicator, api = make_indicator(loading_seconds=23)
+
+    indicator.trigger("U1")
+    indicator.trigger("U1")#動畫還在顯示，不必再呼叫
+    await asyncio.sleep(0)
+
+    api.show_loading_animation.assert_awaited_once()
+    request = api.show_loading_animation.call_args[0][0]
+    assert request.chat_id == "U1"
+    assert request.loading_seconds == 20#只接受 5 的倍數
+
+    indicator.clear("U1")#已送出回覆，下一則訊息要重新顯示
+    indicator.trigger("U1")
+    await asyncio.sleep(0)
+    assert api.show_loading_animation.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_failure_is_swallowed_and_allows_retry():
+    indicator, api = make_indicator()
+    api.show_loading_animation.side_effect = ApiException(status=400, reason="Bad Request")
+
+    assert await indicator.show("C123") is False
+    assert "C123" not in indicator._active_until
+
+
+@pytest.mark.asyncio
+async def test_disabled_or_missing_user_does_nothing():
+    indicator, api = make_indicator(enabled=False)
+    indicator.trigger("U1")
+    enabled, enabled_api = make_indicator()
+    enabled.trigger(None)
+    await asyncio.sleep(0)
+
+    api.show_loading_animation.assert_not_called()
+    enabled_api.show_loading_animation.assert_not_called()
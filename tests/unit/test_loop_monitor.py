@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.loop_monitor import LoopMonitor
+#event loop 偵測單元測試：確認會量到延遲，並在被同步呼叫卡住時抓到卡住的那一行
+
+
+def blocking_call():
+    time.sleep(0.3)#模擬在 async 程式裡誤用同步呼叫
+
+
+@pytest.mark.asyncio
+async def test_samples_lag_while_loop_is_idle():
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.5, max_reports=5)
+    monitor.start()
+    await asyncio.sleep(0.1)
+    await monitor.stop()
+
+    stats = monitor.stats()
+    assert stats["samples"] > 0
+    assert stats["blocked"] == 0
+    assert stats["enabled"] is False#停止後不再取樣
+
+
+@pytest.mark.asyncio
+async def test_blocking_call_is_reported_with_stack():
+    monitor = LoopMonitor(interval=0.01, block_threshold=0.1, max_reports=5)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    blocking_call()
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    report = monitor.report()
+    assert report["blocked"] == 1#同一次阻塞只記錄一次
+    assert report["lag_max"] >= 0.2
+    stack = "\n".join(report["blocking_calls"][0]["stack"])
+    assert "blocking_call" in stack
@@ -0,0 +1,25 @@
+from app.services.line.message_chunker import split_message, utf16_length
+#長訊息切段單元測試：依句子邊界切開、每段不超過上限、內容不遺失
+
+
+def test_short_message_is_not_split():
+    assert split_message("你好。") == ["你好。"]
+
+
+def test_long_message_splits_on_sentence_boundaries():
+    text = "這是第一句。" * 10 + "這是第二句！" * 10
+    chunks = split_message(text, limit=40)
+
+    assert all(utf16_length(chunk) <= 40 for chunk in chunks)
+    assert all(chunk[-1] in "。！" for chunk in chunks)#不在句子中間斷開
+    assert "".join(chunks) == text
+
+
+def test_oversized_sentence_is_hard_split():
+    chunks = split_message("a" * 12001)
+    assert [len(chunk) for chunk in chunks] == [5000, 5000, 2001]
+
+
+def test_emoji_counts_as_two_characters():
+    chunks = split_message("😀" * 3, limit=4)#LINE 以 UTF-16 計算字數
+    assert chunks == ["😀😀", "😀"]
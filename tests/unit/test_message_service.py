@@ -1,8 +1,15 @@
-from unittest.mock import AsyncMock, patch
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from linebot.v3.messaging import ApiException
 
-from app.services.line.message_service import LineMessageService
+from app.services.conversation_store import ConversationStore
+from app.services.facility_index import Facility, FacilityIndex
+from app.services.intent_router import IntentRouter
+from app.services.gemini_service import GeminiUnavailableError
+from app.services.line.message_service import DEGRADED_REPLY, LineMessageService
+from app.services.user_rate_limiter import UserRateLimiter
 #patch 在跑測試時候把某個東西替換成假的，如我不替換單元測試就會去真的呼叫 geminiapi 或者 lineapi
 #patch 是檢查邏輯用的
 @patch(
@@ -10,12 +17,12 @@ from app.services.line.message_service import LineMessageService
     new_callable=AsyncMock,#原本含式是非同步所以也要用非同步
     return_value=True,#每次呼叫這個假含式是回傳True
 )
-@patch("app.services.line.message_service.GeminiService")#這邊替換geminiService類別 
+@patch("app.services.line.message_service.get_gemini_service")#這邊替換共用的 GeminiService
 @pytest.mark.asyncio
 async def test_process_success(mock_gemini, mock_send_reply):
     mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
     svc = LineMessageService()
-    ok = await svc.process_and_reply("你好", "reply_token_xxx")
+    ok = await svc.process_and_reply("頭痛要看哪一科", "reply_token_xxx")
 
     assert ok is True
     mock_send_reply.assert_called_once()
@@ -28,16 +35,223 @@ async def test_process_success(mock_gemini, mock_send_reply):
     new_callable=AsyncMock,
     return_value=True,
 )
-@patch("app.services.line.message_service.GeminiService")
+@patch("app.services.line.message_service.get_gemini_service")
 @pytest.mark.asyncio
 async def test_process_fallback_on_value_error(mock_gemini, mock_send_reply):#當ai丟出value error 時候，應該送出fallback 訊息給 LINE
     mock_gemini.return_value.generate_response = AsyncMock(
         side_effect=ValueError("API 錯誤")#假設ai 回api錯誤
     )
     svc = LineMessageService()
-    ok = await svc.process_and_reply("hi", "reply_token_xxx")
+    ok = await svc.process_and_reply("感冒要吃什麼藥", "reply_token_xxx")
 
     assert ok is True
     mock_send_reply.assert_called_once()
     message_sent = mock_send_reply.call_args[0][1]
     assert "抱歉" in message_sent and "API 錯誤" in message_sent#確定有送出fallback 訊息給 LINE
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_process_passes_conversation_history(mock_gemini, mock_send_reply):#第二輪應該帶著第一輪的對話送給 Gemini
+    mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
+    memory = ConversationStore(max_turns=10, token_budget=1000, idle_ttl=60, max_users=10)
+    svc = LineMessageService(memory=memory)
+
+    await svc.process_and_reply("我頭痛", "reply_token_1", user_id="U123")
+    await svc.process_and_reply("要看哪一科", "reply_token_2", user_id="U123")
+
+    history = mock_gemini.return_value.generate_response.call_args.kwargs["history"]
+    assert [t.text for t in history] == ["我頭痛", "AI 回覆"]
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_process_injects_local_facilities(mock_gemini, mock_send_reply):#本地查到的院所要帶進 Gemini 的 prompt
+    mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
+    facilities = FacilityIndex([
+        Facility("1", "測試大安眼科診所", address="台北市大安區復興南路1號", departments=["眼科"]),
+    ])
+    svc = LineMessageService(facilities=facilities)
+
+    await svc.process_and_reply("台北市哪裡有眼科", "reply_token_1", user_id="U123")
+
+    context = mock_gemini.return_value.generate_response.call_args.kwargs["context"]
+    assert "測試大安眼科診所" in context
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_location_replies_nearest_facilities_without_gemini(mock_gemini, mock_send_reply):#分享位置時直接回覆最近的院所
+    mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
+    facilities = FacilityIndex([
+        Facility("1", "測試遠方診所", lat=25.10, lng=121.60),
+        Facility("2", "測試附近診所", lat=25.034, lng=121.544),
+    ])
+    svc = LineMessageService(facilities=facilities)
+
+    ok = await svc.reply_nearby_facilities(25.033, 121.543, "reply_token_1", user_id="U123")
+
+    assert ok is True
+    mock_gemini.return_value.generate_response.assert_not_called()
+    message_sent = mock_send_reply.call_args[0][1]
+    assert message_sent.index("測試附近診所") < message_sent.index("測試遠方診所")
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_location_without_nearby_facilities(mock_gemini, mock_send_reply):
+    facilities = FacilityIndex([Facility("1", "測試花蓮診所", lat=23.98, lng=121.60)])
+    svc = LineMessageService(facilities=facilities)
+
+    await svc.reply_nearby_facilities(25.033, 121.543, "reply_token_1")
+
+    assert "找不到" in mock_send_reply.call_args[0][1]
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_simple_intents_skip_gemini(mock_gemini, mock_send_reply):#問候與緊急狀況不呼叫 Gemini
+    mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
+    svc = LineMessageService(router=IntentRouter())
+
+    await svc.process_and_reply("你好！", "reply_token_1", user_id="U123")
+    await svc.process_and_reply("我爸突然胸痛冒冷汗", "reply_token_2", user_id="U123")
+
+    mock_gemini.return_value.generate_response.assert_not_called()
+    assert "CARE" in mock_send_reply.call_args_list[0][0][1]
+    assert "119" in mock_send_reply.call_args_list[1][0][1]
+
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_user_over_rate_limit_gets_throttle_reply(mock_gemini, mock_send_reply):#超過速率限制時不呼叫 Gemini，緊急訊息仍正常回覆
+    mock_gemini.return_value.generate_response = AsyncMock(return_value="AI 回覆")
+    svc = LineMessageService(router=IntentRouter(), rate_limiter=UserRateLimiter(rate_per_minute=1, burst=1))
+
+    await svc.process_and_reply("頭痛要看哪一科", "reply_token_1", user_id="U123")
+    await svc.process_and_reply("感冒要吃什麼藥", "reply_token_2", user_id="U123")
+    await svc.process_and_reply("我爸突然胸痛冒冷汗", "reply_token_3", user_id="U123")
+
+    assert mock_gemini.return_value.generate_response.call_count == 1
+    assert "秒後再提問" in mock_send_reply.call_args_list[1][0][1]
+    assert "119" in mock_send_reply.call_args_list[2][0][1]
+
+
+def _mock_line_api(reply_side_effect=None):
+    api = MagicMock()
+    api.reply_message = AsyncMock(side_effect=reply_side_effect)
+    return api
+
+
+@patch("app.services.line.message_service.line_messaging_client")
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_expired_reply_token_falls_back_to_push(mock_gemini, mock_client):#reply token 失效時改用 push
+    api = _mock_line_api(ApiException(status=400, reason="Bad Request"))
+    api.reply_message.side_effect.body = '{"message":"Invalid reply token"}'
+    mock_client.get_api = AsyncMock(return_value=api)
+    batcher = MagicMock()
+    svc = LineMessageService(push_batcher=batcher)
+
+    ok = await svc._send_line_reply("expired_token", "AI 回覆", "U123")
+
+    assert ok is True
+    user_id, messages = batcher.enqueue.call_args[0]
+    assert user_id == "U123" and messages[0].text == "AI 回覆"
+
+
+@patch("app.services.line.message_service.line_messaging_client")
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_stale_event_skips_reply_and_pushes(mock_gemini, mock_client):#事件放太久就不浪費一次 reply
+    api = _mock_line_api()
+    mock_client.get_api = AsyncMock(return_value=api)
+    batcher = MagicMock()
+    svc = LineMessageService(push_batcher=batcher)
+
+    stale_timestamp = int((time.time() - 300) * 1000)
+    ok = await svc._send_line_reply("old_token", "AI 回覆", "U123", stale_timestamp)
+
+    assert ok is True
+    api.reply_message.assert_not_called()
+    batcher.enqueue.assert_called_once()
+
+
+@patch("app.services.line.message_service.line_messaging_client")
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_other_reply_errors_do_not_push(mock_gemini, mock_client):
+    api = _mock_line_api(ApiException(status=500, reason="Server Error"))
+    mock_client.get_api = AsyncMock(return_value=api)
+    batcher = MagicMock()
+    svc = LineMessageService(push_batcher=batcher)
+
+    assert await svc._send_line_reply("token", "AI 回覆", "U123") is False
+    batcher.enqueue.assert_not_called()
+
+
+@patch("app.services.line.message_service.line_messaging_client")
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_long_reply_is_split_into_one_request(mock_gemini, mock_client):#超過 5000 字的回覆切成多則，一次送出
+    api = _mock_line_api()
+    mock_client.get_api = AsyncMock(return_value=api)
+    svc = LineMessageService(push_batcher=MagicMock())
+
+    assert await svc._send_line_reply("token", "很長的回答。" * 1500, "U123") is True
+
+    api.reply_message.assert_awaited_once()
+    messages = api.reply_message.call_args[0][0].messages
+    assert len(messages) == 2
+    assert all(len(message.text) <= 5000 for message in messages)
+
+
+@patch(
+    "app.services.line.message_service.LineMessageService._send_line_reply",
+    new_callable=AsyncMock,
+    return_value=True,
+)
+@patch("app.services.line.message_service.get_gemini_service")
+@pytest.mark.asyncio
+async def test_degraded_reply_when_gemini_unavailable(mock_gemini, mock_send_reply):#斷路器開啟時回覆固定訊息
+    mock_gemini.return_value.generate_response = AsyncMock(
+        side_effect=GeminiUnavailableError("AI 服務暫時無法使用，請稍後再試", retry_after=10)
+    )
+    memory = ConversationStore(max_turns=10, token_budget=1000, idle_ttl=60, max_users=10)
+    svc = LineMessageService(memory=memory, facilities=FacilityIndex())
+
+    await svc.process_and_reply("糖尿病要注意什麼", "reply_token_1", user_id="U123")
+
+    assert mock_send_reply.call_args[0][1] == DEGRADED_REPLY
+    assert memory.get_history("U123") == []#降級回覆不寫入對話記憶
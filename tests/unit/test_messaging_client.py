@@ -0,0 +1,34 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.services.line.messaging_client import LineMessagingClient
+#LINE Messaging API 客戶端單元測試：確認 client 會被重用，token 換發時才重建
+
+
+@pytest.mark.asyncio
+async def test_get_api_reuses_client_for_same_token():
+    token_manager = MagicMock()
+    token_manager.get_token_async = AsyncMock(return_value="token_a")
+    client = LineMessagingClient(token_manager=token_manager)
+
+    first = await client.get_api()
+    second = await client.get_api()
+
+    assert first is second#同一個 token 不應該重建 client
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_get_api_rebuilds_client_when_token_rotates():
+    token_manager = MagicMock()
+    token_manager.get_token_async = AsyncMock(return_value="token_a")
+    client = LineMessagingClient(token_manager=token_manager)
+
+    first = await client.get_api()
+    token_manager.get_token_async.return_value = "token_b"#模擬 token 被換發
+    second = await client.get_api()
+
+    assert first is not second
+    assert second.api_client.default_headers["Authorization"] == "Bearer token_b"
+    await client.close()
@@ -0,0 +1,34 @@
+from app.core.metrics import MetricsRegistry, render_gauges
+#指標單元測試：直方圖 bucket 累計、counter 與 Prometheus 文字格式
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    latency = registry.histogram("test_seconds", "test", ("stage",), buckets=(0.1, 1.0))
+    latency.labels("gemini").observe(0.05)
+    latency.labels("gemini").observe(0.5)
+    latency.labels("gemini").observe(5)
+
+    text = registry.render()
+    assert 'test_seconds_bucket{stage="gemini",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="gemini",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="gemini",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="gemini"} 3' in text
+
+
+def test_counter_increments_per_label_set():
+    registry = MetricsRegistry()
+    errors = registry.counter("test_errors_total", "test", ("component", "status_code"))
+    errors.inc("gemini", "429")
+    errors.inc("gemini", "429")
+    errors.inc("line_reply", "400")
+
+    assert errors.get("gemini", "429") == 2
+    assert 'test_errors_total{component="line_reply",status_code="400"} 1' in registry.render()
+
+
+def test_render_gauges_skips_non_numeric_values():
+    text = render_gauges("care_cache", "test", {"hits": 3, "backend": "memory", "enabled": True})
+    assert "care_cache_hits 3" in text
+    assert "backend" not in text
+    assert "enabled" not in text
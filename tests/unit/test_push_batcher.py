@@ -0,0 +1,105 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from linebot.v3.messaging import ApiException, TextMessage
+
+from app.services.line.push_batcher import PushBatcher
+#push 批次合併單元測試：同一使用者的訊息合併成最多五則一個請求，且保持順序
+
+
+def make_batcher(window=0.05):
+    api = MagicMock()
+    api.push_message = AsyncMock()
+    client = MagicMock()
+    client.get_api = AsyncMock(return_value=api)
+    return PushBatcher(client=client, window=window), api
+
+
+def pushed_texts(api):
+    return [
+        [message.text for message in call.args[0].messages]
+        for call in api.push_message.call_args_list
+    ]
+
+
+@pytest.mark.asyncio
+async def test_messages_within_window_are_coalesced():
+    batcher, api = make_batcher()
+
+    first = batcher.enqueue("U1", [TextMessage(text="a")])
+    second = batcher.enqueue("U1", [TextMessage(text="b"), TextMessage(text="c")])
+    other = batcher.enqueue("U2", [TextMessage(text="x")])
+
+    assert await first is True
+    assert await second is True
+    assert await other is True
+    assert sorted(pushed_texts(api)) == [["a", "b", "c"], ["x"]]#同一使用者只送一次
+    assert api.push_message.call_args_list[0].kwargs["x_line_retry_key"]
+
+
+@pytest.mark.asyncio
+async def test_full_batch_is_sent_immediately_and_split_at_five():
+    batcher, api = make_batcher(window=10)#窗口很長，湊滿五則就要立刻送出
+
+    done = batcher.enqueue("U1", [TextMessage(text=str(i)) for i in range(7)])
+    assert await asyncio.wait_for(done, timeout=1) is True
+    assert pushed_texts(api) == [["0", "1", "2", "3", "4"], ["5", "6"]]
+    assert batcher.stats()["requests"] == 2
+
+
+@pytest.mark.asyncio
+async def test_failed_push_is_reported():
+    batcher, api = make_batcher()
+    api.push_message.side_effect = ApiException(status=429, reason="Too Many Requests")
+
+    assert await batcher.enqueue("U1", [TextMessage(text="a")]) is False
+    assert batcher.stats()["failed_requests"] == 1
+
+
+@pytest.mark.asyncio
+async def test_close_flushes_pending_messages():
+    batcher, api = make_batcher(window=10)
+
+    batcher.enqueue("U1", [TextMessage(text="a")])
+    await batcher.close()
+
+    assert pushed_texts(api) == [["a"]]
+    assert batcher.stats()["pending_users"] == 0
+
+
+
+@pytest.mark.asyncio
+async def test_flushes_for_same_user_never_overlap():
+    batcher, api = make_batcher(window=10)
+    active, overlaps = 0, []
+
+    async def slow_push(*args, **kwargs):
+        nonlocal active
+        active += 1
+        overlaps.append(active)
+        await asyncio.sleep(0.01)
+        active -= 1
+
+    api.push_message.side_effect = slow_push
+
+    def batch(start):
+        return [TextMessage(text=str(i)) for i in range(start, start + 5)]
+
+    batcher.enqueue("U1", batch(0))
+    await asyncio.sleep(0)
+    # 兩個 flush 一起等鎖：前一個把兩批都送出，後一個被喚醒時已經沒有訊息
+    batcher.enqueue("U1", batch(5))
+    third = batcher.enqueue("U1", batch(10))
+    await third
+    # 這時鎖還有等待者，不能被移除，否則之後的批次會拿到新的鎖而與等待者同時送出
+    fourth = batcher.enqueue("U1", batch(15))
+    await asyncio.sleep(0.005)
+    fifth = batcher.enqueue("U1", batch(20))
+    assert await fourth is True
+    assert await fifth is True
+    await asyncio.gather(*batcher._flushing)
+
+    assert max(overlaps) == 1
+    assert [texts[0] for texts in pushed_texts(api)] == ["0", "5", "10", "15", "20"]
+    assert batcher._locks == {} and batcher._lock_users == {}#用完的鎖要移除
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+from app.services.rate_control import AdaptiveConcurrencyLimiter, RateController, TokenBucket
+#流量控制單元測試：併發上限、429 時縮小視窗、成功時放大、token bucket 限速
+
+
+@pytest.mark.asyncio
+async def test_limiter_blocks_beyond_limit():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=2)
+    await limiter.acquire()
+    await limiter.acquire()
+
+    third = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0.01)
+    assert not third.done()#視窗已滿，第三個要等
+
+    await limiter.release(succeeded=True)
+    await asyncio.wait_for(third, timeout=1)
+    assert limiter.in_flight == 2
+
+
+@pytest.mark.asyncio
+async def test_controller_shrinks_on_429_and_grows_on_success():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, min_limit=1, cooldown=0)
+    controller = RateController(limiter)
+
+    await controller.acquire()
+    await controller.release(429)
+    assert limiter.limit == 4#乘法減少
+
+    for _ in range(4):#累積 4 次成功才 +1
+        await controller.acquire()
+        await controller.release(200)
+    assert limiter.limit == 5
+    assert controller.stats()["overloaded_responses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_controller_ignores_repeated_overload_within_cooldown():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, cooldown=60)
+    controller = RateController(limiter)
+    for _ in range(3):
+        await controller.acquire()
+        await controller.release(500)
+    assert limiter.limit == 4#同一波過載只縮小一次
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    started_at = time.monotonic()
+    for _ in range(3):
+        await bucket.acquire()
+    #第一個立即通過，之後每個約 20ms
+    assert time.monotonic() - started_at >= 0.035
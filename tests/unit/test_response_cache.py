@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from app.services.response_cache import (
+    MemoryCacheBackend,
+    ResponseCache,
+    SQLiteCacheBackend,
+    normalize_text,
+)
+#回應快取單元測試：正規化、TTL 過期、LRU 淘汰與命中統計
+
+
+def test_normalize_text_ignores_spacing_width_and_trailing_punctuation():
+    assert normalize_text(" 台北市有哪些醫院？ ") == normalize_text("台北市有哪些醫院")
+    assert normalize_text("ＡＢＣ  clinic") == "abc clinic"#全形轉半形、多個空白合併
+
+
+def test_make_key_depends_on_model_and_system_instruction():
+    key = ResponseCache.make_key("你好", "model-a", "instruction")
+    assert key == ResponseCache.make_key("你好！", "model-a", "instruction")
+    assert key != ResponseCache.make_key("你好", "model-b", "instruction")
+    assert key != ResponseCache.make_key("你好", "model-a", "other instruction")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryCacheBackend(max_entries=2)
+    return SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=2)
+
+
+def test_hit_miss_and_lru_eviction(backend):
+    cache = ResponseCache(backend, ttl=60)
+    cache.set("a", "A")
+    cache.set("b", "B")
+    time.sleep(0.01)#SQLite 後端用時間記錄最近使用
+    assert cache.get("a") == "A"#a 變成最近使用
+    cache.set("c", "C")#容量 2，最久沒用的 b 被淘汰
+
+    assert cache.get("b") is None
+    assert cache.get("c") == "C"
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_expired_entry_is_a_miss(backend):
+    cache = ResponseCache(backend, ttl=0)#TTL 0 代表寫入後立刻過期
+    cache.set("a", "A")
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disabled_cache_never_hits():
+    cache = ResponseCache(MemoryCacheBackend(max_entries=10), ttl=60, enabled=False)
+    cache.set("a", "A")
+    assert cache.get("a") is None
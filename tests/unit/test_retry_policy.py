@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.services.gemini_service import GeminiAPIError
+from app.services.retry_policy import Hedger, LatencyTracker, RetryPolicy
+#重試與對沖單元測試：可重試錯誤會重試、不可重試直接拋出、期限、慢請求觸發對沖
+
+
+def _policy(**kwargs):
+    options = {
+        "max_attempts": 3,
+        "base_delay": 0.001,
+        "max_delay": 0.01,
+        "retryable_statuses": frozenset({429, 500}),
+        "deadline": 5,
+    }
+    options.update(kwargs)
+    return RetryPolicy(**options)
+
+
+@pytest.mark.asyncio
+async def test_retries_transient_errors_until_success():
+    policy = _policy()
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls < 3:
+            raise GeminiAPIError("AI 服務暫時無法使用", 500)
+        return "ok"
+
+    assert await policy.run(attempt) == "ok"
+    assert calls == 3
+    assert policy.stats()["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_non_retryable_error_is_raised_immediately():
+    policy = _policy()
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        raise GeminiAPIError("API 金鑰無效或已過期", 401)
+
+    with pytest.raises(GeminiAPIError):
+        await policy.run(attempt)
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_stops_slow_attempt():
+    policy = _policy(deadline=0.05)
+
+    async def attempt():
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await policy.run(attempt)
+
+
+@pytest.mark.asyncio
+async def test_hedger_uses_faster_second_request():
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.01)
+    hedger = Hedger(enabled=True, min_delay=0.01, tracker=tracker)
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.sleep(1)#第一個請求卡住
+            return "slow"
+        return "fast"
+
+    assert await hedger.run(attempt) == "fast"
+    stats = hedger.stats()
+    assert stats["hedged_requests"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_hedger_does_not_hedge_without_samples():
+    hedger = Hedger(enabled=True, min_delay=0.01)
+    assert hedger.hedge_delay() is None
@@ -0,0 +1,83 @@
+"""跨 worker 共用狀態單元測試"""
+import sqlite3
+import time
+
+import pytest
+
+from app.services.shared_state import MemoryStateStore, SQLiteStateStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    # 兩種後端跑同一組測試；sqlite 每次呼叫都開新連線，模擬另一個 worker
+    path = str(tmp_path / "state.sqlite3")
+    if request.param == "memory":
+        store = MemoryStateStore()
+        return lambda: store
+    return lambda: SQLiteStateStore(path)
+
+
+def test_get_set_delete(make_store):
+    store = make_store()
+    assert store.get("k") is None
+    store.set("k", "v")
+    assert make_store().get("k") == "v"
+    store.delete("k")
+    assert make_store().get("k") is None
+
+
+def test_value_expires(make_store):
+    store = make_store()
+    store.set("k", "v", ttl=0.01)
+    time.sleep(0.02)
+    assert store.get("k") is None
+
+
+def test_lock_is_exclusive_until_released(make_store):
+    worker_a, worker_b = make_store(), make_store()
+    assert worker_a.acquire("refresh", "a", ttl=10)
+    # 同一個持有者可以重新取得（延長期限），其他人不行
+    assert worker_a.acquire("refresh", "a", ttl=10)
+    assert not worker_b.acquire("refresh", "b", ttl=10)
+    # 只有持有者能釋放
+    worker_b.release("refresh", "b")
+    assert not worker_b.acquire("refresh", "b", ttl=10)
+    worker_a.release("refresh", "a")
+    assert worker_b.acquire("refresh", "b", ttl=10)
+
+
+def test_expired_lock_can_be_taken_over(make_store):
+    # 持有者當掉沒有釋放，期限過後其他 worker 可以接手
+    worker_a, worker_b = make_store(), make_store()
+    assert worker_a.acquire("refresh", "a", ttl=0.01)
+    time.sleep(0.02)
+    assert worker_b.acquire("refresh", "b", ttl=10)
+    assert worker_b.stats()["lock_acquired"] >= 1
+
+
+def test_sqlite_file_is_opened_on_first_use(tmp_path):
+    # 建立 store（import 時的 singleton）不應產生檔案
+    path = tmp_path / "state.sqlite3"
+    store = SQLiteStateStore(str(path))
+    assert not path.exists()
+    store.set("k", "v")
+    assert path.exists()
+
+
+def test_busy_sqlite_falls_back_to_memory(tmp_path):
+    path = str(tmp_path / "state.sqlite3")
+    store = SQLiteStateStore(path, busy_timeout_ms=0)
+    store.set("k", "v")
+    # 模擬其他 worker 長時間持有寫入鎖
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN EXCLUSIVE")
+    try:
+        started = time.monotonic()
+        # 寫不進去時不會卡住，改寫到程序內的記憶體；WAL 下其他人寫入時仍可讀取
+        store.set("k2", "v2")
+        assert time.monotonic() - started < 1
+        assert store._fallback.get("k2") == "v2"
+        assert store.get("k") == "v"
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
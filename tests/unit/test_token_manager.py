@@ -1,15 +1,19 @@
 """LINE Token Manager 單元測試：mock 外部依賴，不打真實 LINE API."""
+import asyncio
 import pytest
 from unittest.mock import patch
 
 from app.services.line.token_manager import LineTokenManager
+from app.services.shared_state import MemoryStateStore, SQLiteStateStore
 
 #如果line憑證沒設定，get_token 應拋出 ValueError
 def test_get_token_raises_when_credentials_missing():
     with patch("app.services.line.token_manager.settings") as mock_settings:
         mock_settings.LINE_CHANNEL_ID = None
         mock_settings.LINE_CHANNEL_SECRET = None#沒設定憑證
-        manager = LineTokenManager()
+        mock_settings.LINE_TOKEN_RENEW_BEFORE = 3600
+        mock_settings.LINE_TOKEN_REFRESH_LOCK_TIMEOUT = 1
+        manager = LineTokenManager(state=MemoryStateStore())
     with pytest.raises(ValueError) as exc_info:
         manager.get_token()#建立完line token manager 物件後，get_token 會去呼叫_fetch_new_token
     assert "LINE_CHANNEL_ID" in str(exc_info.value) or "LINE_CHANNEL_SECRET" in str(exc_info.value)#確定有拋出錯誤訊息
@@ -20,7 +24,67 @@ def test_get_token_raises_when_empty_string_credentials():
     with patch("app.services.line.token_manager.settings") as mock_settings:
         mock_settings.LINE_CHANNEL_ID = ""
         mock_settings.LINE_CHANNEL_SECRET = ""
-        manager = LineTokenManager()
+        mock_settings.LINE_TOKEN_RENEW_BEFORE = 3600
+        mock_settings.LINE_TOKEN_REFRESH_LOCK_TIMEOUT = 1
+        manager = LineTokenManager(state=MemoryStateStore())
 
     with pytest.raises(ValueError):#確定有拋出錯誤訊息
         manager.get_token()
+
+
+def _make_manager(state=None):
+    with patch("app.services.line.token_manager.settings") as mock_settings:
+        mock_settings.LINE_CHANNEL_ID = "channel_id"
+        mock_settings.LINE_CHANNEL_SECRET = "channel_secret"
+        mock_settings.LINE_TOKEN_RENEW_BEFORE = 3600
+        mock_settings.LINE_TOKEN_REFRESH_LOCK_TIMEOUT = 1
+        return LineTokenManager(state=state or MemoryStateStore())
+
+
+@pytest.mark.asyncio
+async def test_get_token_async_single_flight():
+    #多個同時呼叫 get_token_async 時，只應該打一次 LINE OAuth API
+    manager = _make_manager()
+    calls = 0
+
+    async def fake_fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return manager._apply_token_response({"access_token": "new_token", "expires_in": 86400})
+
+    with patch.object(manager, "_fetch_new_token_async", side_effect=fake_fetch):
+        tokens = await asyncio.gather(*[manager.get_token_async() for _ in range(5)])
+
+    assert tokens == ["new_token"] * 5
+    assert calls == 1
+
+
+def test_token_shared_between_workers(tmp_path):
+    #token 寫入共用狀態後，新的 manager（例如重啟或另一個 worker）應該直接讀到
+    path = str(tmp_path / "state.sqlite3")
+    manager = _make_manager(SQLiteStateStore(path))
+    manager._apply_token_response({"access_token": "cached_token", "expires_in": 86400})
+
+    other_worker = _make_manager(SQLiteStateStore(path))
+    assert other_worker.get_token() == "cached_token"
+
+
+@pytest.mark.asyncio
+async def test_waits_for_other_worker_refresh():
+    #另一個 worker 持有換發鎖時不打 OAuth API，等它寫入新的 token 後直接使用
+    state = MemoryStateStore()
+    manager = _make_manager(state)
+    other_worker = _make_manager(state)
+    assert state.acquire("line:token_refresh", "other-worker", ttl=10)
+
+    async def other_worker_finishes():
+        await asyncio.sleep(0.05)
+        other_worker._apply_token_response({"access_token": "from_other_worker", "expires_in": 86400})
+        state.release("line:token_refresh", "other-worker")
+
+    with patch("app.services.line.token_manager.httpx.AsyncClient") as mock_client:
+        token, _ = await asyncio.gather(manager.get_token_async(), other_worker_finishes())
+
+    assert token == "from_other_worker"
+    mock_client.assert_not_called()
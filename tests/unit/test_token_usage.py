@@ -0,0 +1,44 @@
+from app.services.conversation_store import estimate_tokens
+from app.services.token_usage import TRUNCATION_MARKER, PromptBudget, TokenUsageTracker, truncate_to_tokens
+
+
+def test_truncate_to_tokens_respects_budget():
+    text = "請問高血壓的病人平常飲食要注意什麼" * 50
+    truncated = truncate_to_tokens(text, 100)
+    assert truncated.endswith(TRUNCATION_MARKER)
+    assert estimate_tokens(truncated) <= 100
+    assert truncate_to_tokens("短訊息", 100) == "短訊息"
+    assert truncate_to_tokens(text, 0) == text#0 代表不限制
+
+
+def test_tracker_accumulates_per_user_and_evicts_oldest():
+    tracker = TokenUsageTracker(max_users=2)
+    tracker.record({"promptTokenCount": 100, "candidatesTokenCount": 20, "cachedContentTokenCount": 80}, "U1")
+    tracker.record({"promptTokenCount": 50, "candidatesTokenCount": 10}, "U1")
+    tracker.record({"promptTokenCount": 10, "candidatesTokenCount": 5}, "U2")
+    tracker.record(None, "U3")#沒有 usageMetadata 的回應只計次
+
+    assert tracker.usage_for("U1") == {
+        "requests": 2,
+        "prompt_tokens": 150,
+        "candidates_tokens": 30,
+        "cached_tokens": 80,
+        "thoughts_tokens": 0,
+        "total_tokens": 180,
+    }
+    stats = tracker.stats()
+    assert stats["requests"] == 4 and stats["requests_without_usage"] == 1
+    assert stats["prompt_tokens"] == 160
+    assert stats["cached_token_ratio"] == 0.5
+
+    tracker.record({"promptTokenCount": 1}, "U4")#超過 max_users 時淘汰最久沒有使用的使用者
+    assert tracker.usage_for("U1") == {}
+    assert [user["user_id"] for user in tracker.top_users()] == ["U2", "U4"]
+
+
+def test_prompt_budget_limits_context_and_output():
+    budget = PromptBudget(max_context_tokens=20)
+    assert budget.limit_context(None) is None
+    assert budget.limit_context("診所" * 100).endswith(TRUNCATION_MARKER)
+    assert budget.generation_config() is None
+    assert budget.stats()["truncated_contexts"] == 1
@@ -0,0 +1,55 @@
+from app.services.user_rate_limiter import UserRateLimiter, throttle_reply
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_burst_then_throttled_until_refilled():
+    clock = FakeClock()
+    limiter = UserRateLimiter(rate_per_minute=6, burst=2, clock=clock)
+
+    assert limiter.acquire("U1") == 0
+    assert limiter.acquire("U1") == 0
+    assert limiter.acquire("U1") == 10.0#每 10 秒補一個 token
+    assert limiter.acquire("U2") == 0#其他使用者不受影響
+
+    clock.now += 10
+    assert limiter.acquire("U1") == 0
+    stats = limiter.stats()
+    assert stats["allowed"] == 4 and stats["throttled"] == 1
+
+
+def test_idle_buckets_expire_once_refilled():
+    clock = FakeClock()
+    limiter = UserRateLimiter(rate_per_minute=60, burst=5, clock=clock)
+    limiter.acquire("U1")
+    limiter.acquire("U2")
+
+    clock.now += 5#5 秒後 bucket 已補滿，移除與重新建立沒有差別
+    limiter.acquire("U3")
+    assert limiter.stats()["tracked_users"] == 1
+    assert limiter.stats()["expired_buckets"] == 2
+
+
+def test_max_users_evicts_least_recent():
+    limiter = UserRateLimiter(rate_per_minute=1, burst=1, max_users=2, clock=FakeClock())
+    for user_id in ["U1", "U2", "U3"]:
+        limiter.acquire(user_id)
+    assert limiter.stats()["tracked_users"] == 2
+    assert limiter.acquire("U1") == 0#被淘汰的使用者重新取得完整的 bucket
+
+
+def test_disabled_or_anonymous_always_allowed():
+    limiter = UserRateLimiter(rate_per_minute=6, burst=1, enabled=False)
+    assert all(limiter.acquire("U1") == 0 for _ in range(10))
+    limiter = UserRateLimiter(rate_per_minute=6, burst=1)
+    assert all(limiter.acquire(None) == 0 for _ in range(10))
+
+
+def test_throttle_reply_mentions_wait_time():
+    assert "8 秒" in throttle_reply(7.2)